@@ -6,9 +6,10 @@ import json
 import uuid
 from utils.database import (
     get_all_cleaning_services, add_cleaning_service, get_default_cleaning_service,
-    get_all_cleaning_tasks, schedule_cleaning, get_upcoming_cleaning_tasks,
+    get_all_cleaning_tasks, get_upcoming_cleaning_tasks,
     get_all_properties, get_property, update_property
 )
+from utils.repository import get_repository
 from utils.ai_assistant import virtual_co_host
 from utils.message_service import send_message
 
@@ -20,10 +21,7 @@ def show_cleaning_management():
 def show_cleaning_calendar():
     st.subheader("Calendario Pulizie")
     
-    # Get all cleaning tasks
-    tasks = get_all_cleaning_tasks()
-    
-    if not tasks:
+    if not get_repository().has_cleaning_tasks():
         st.info("Nessun task di pulizia programmato. Vai alla scheda 'Programmazione' per programmare nuove pulizie.")
         return
     
@@ -50,43 +48,30 @@ def show_cleaning_calendar():
         default=["Programmata"]
     )
     
-    # Filter tasks
+    # Date and status filters run in SQL, property and service come with the same query
+    tasks = get_repository().list_cleaning_tasks(start_date, end_date, status_filter)
+    
     filtered_tasks = []
     
     for task in tasks:
-        # Convert scheduled_date string to datetime
-        scheduled_date = datetime.fromisoformat(task.get("scheduled_date")).date() if task.get("scheduled_date") else None
-        
-        # Apply date filter
-        if scheduled_date and (scheduled_date < start_date or scheduled_date > end_date):
-            continue
-        
-        # Apply status filter
-        if status_filter and task.get("status") not in status_filter:
-            continue
-        
-        # Get property info
-        property_data = get_property(task.get("property_id"))
-        property_name = property_data.get("name") if property_data else "Sconosciuto"
+        scheduled_at = datetime.fromisoformat(task.get("scheduled_date")) if task.get("scheduled_date") else None
         
         filtered_tasks.append({
             "id": task.get("id"),
-            "Data": scheduled_date.strftime("%d/%m/%Y") if scheduled_date else "N/A",
-            "Ora": datetime.fromisoformat(task.get("scheduled_date")).strftime("%H:%M") if task.get("scheduled_date") else "N/A",
-            "Immobile": property_name,
+            "Data": scheduled_at.strftime("%d/%m/%Y") if scheduled_at else "N/A",
+            "Ora": scheduled_at.strftime("%H:%M") if scheduled_at else "N/A",
+            "Immobile": task.get("property_name"),
             "Stato": task.get("status"),
             "Note": task.get("notes", ""),
             "booking_id": task.get("booking_id"),
-            "cleaning_service_id": task.get("cleaning_service_id")
+            "cleaning_service_id": task.get("cleaning_service_id"),
+            "cleaning_service": task.get("cleaning_service")
         })
     
     if filtered_tasks:
-        # Sort by date
-        filtered_tasks.sort(key=lambda x: x["Data"] + x["Ora"])
-        
-        # Create a dataframe
+        # Create a dataframe (tasks are already sorted by date)
         task_df = pd.DataFrame(filtered_tasks)
-        displayed_cols = [col for col in task_df.columns if col not in ["id", "booking_id", "cleaning_service_id"]]
+        displayed_cols = [col for col in task_df.columns if col not in ["id", "booking_id", "cleaning_service_id", "cleaning_service"]]
         st.dataframe(task_df[displayed_cols], use_container_width=True)
         
         # Task details and actions
@@ -110,9 +95,8 @@ def show_cleaning_calendar():
                     st.markdown(f"**Data:** {selected_task['Data']}")
                     st.markdown(f"**Ora:** {selected_task['Ora']}")
                     
-                    # Get service info
-                    all_services = get_all_cleaning_services()
-                    service = next((s for s in all_services if s["id"] == selected_task["cleaning_service_id"]), None)
+                    # Service info is loaded together with the task
+                    service = selected_task["cleaning_service"]
                     
                     if service:
                         st.markdown(f"**Servizio di Pulizia:** {service['name']}")
@@ -461,7 +445,7 @@ def show_scheduling():
             scheduled_datetime = datetime.combine(cleaning_date, cleaning_time)
             
             # Schedule cleaning
-            new_task = schedule_cleaning(
+            new_task = get_repository().schedule_cleaning(
                 property_id=selected_property_id,
                 scheduled_date=scheduled_datetime,
                 service_id=selected_service_id
@@ -5,11 +5,18 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import calendar
+import copy
 import random
 import json
 import os
 from utils.database import get_all_properties, get_property, update_property
 from utils.ai_assistant import dynamic_pricing_recommendation
+from utils import price_calendar
+from utils.price_calendar import get_price_calendar
+from utils import write_behind
+from utils.json_writer import atomic_write_json
+
+PRICING_SEASONS_FILE = os.path.join('data', 'pricing_seasons.json')
 
 def show_dynamic_pricing():
     st.markdown("<h1 class='main-header'>Dynamic Pricing</h1>", unsafe_allow_html=True)
@@ -141,31 +148,8 @@ def show_pricing_overview():
                 apply_button = st.form_submit_button("Applica Modifica")
                 
                 if apply_button:
-                    # Update pricing data
-                    current_date = start_date
-                    while current_date <= end_date:
-                        date_str = current_date.isoformat()
-                        
-                        # Check if date exists in pricing data
-                        date_exists = False
-                        for i, data in enumerate(pricing_data):
-                            if data['date'] == date_str:
-                                pricing_data[i]['price'] = price_adjustment
-                                date_exists = True
-                                break
-                        
-                        # If date doesn't exist, add it
-                        if not date_exists:
-                            pricing_data.append({
-                                'date': date_str,
-                                'price': price_adjustment,
-                                'status': 'available'
-                            })
-                        
-                        current_date += timedelta(days=1)
-                    
-                    # Save updated pricing data
-                    save_pricing_data(selected_property_id, pricing_data)
+                    # Write only the prices of the selected days: booked and blocked days keep their status
+                    get_price_calendar().set_range(selected_property_id, start_date, end_date, price_adjustment)
                     
                     # Update current price in property data
                     updated_property = property_data.copy()
@@ -209,9 +193,9 @@ def show_season_management():
     # Initialize season data if not exists
     if 'pricing_seasons' not in st.session_state:
         # Check if season data exists
-        if os.path.exists('data/pricing_seasons.json'):
+        if os.path.exists(PRICING_SEASONS_FILE):
             try:
-                with open('data/pricing_seasons.json', 'r', encoding='utf-8') as f:
+                with open(PRICING_SEASONS_FILE, 'r', encoding='utf-8') as f:
                     st.session_state.pricing_seasons = json.load(f)
             except:
                 st.session_state.pricing_seasons = create_default_seasons()
@@ -1254,27 +1238,12 @@ def get_occupancy_rate(property_id):
 
 def load_pricing_data(property_id):
     """Load pricing data for a property"""
-    # Check if pricing data exists
-    filename = f"data/pricing_{property_id}.json"
-    
-    if os.path.exists(filename):
-        try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return None
-    
-    return None
+    # Stored in the shared memory-mapped price calendar (utils/price_calendar.py)
+    return price_calendar.load_pricing_data(property_id)
 
 def save_pricing_data(property_id, pricing_data):
     """Save pricing data for a property"""
-    # Ensure data directory exists
-    os.makedirs('data', exist_ok=True)
-    
-    filename = f"data/pricing_{property_id}.json"
-    
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(pricing_data, f, ensure_ascii=False, indent=2)
+    price_calendar.save_pricing_data(property_id, pricing_data)
 
 def generate_sample_pricing(property_data, date_range):
     """Generate sample pricing data for demo purposes"""
@@ -1451,8 +1420,12 @@ def save_pricing_seasons():
     # Ensure data directory exists
     os.makedirs('data', exist_ok=True)
     
-    with open('data/pricing_seasons.json', 'w', encoding='utf-8') as f:
-        json.dump(st.session_state.pricing_seasons, f, ensure_ascii=False, indent=2)
+    # Written by the background writer; consecutive edits are coalesced
+    seasons = copy.deepcopy(st.session_state.pricing_seasons)
+    return write_behind.submit(
+        PRICING_SEASONS_FILE,
+        lambda: atomic_write_json(PRICING_SEASONS_FILE, seasons, ensure_ascii=False, indent=2)
+    )
 
 def get_date_season(date_str, seasons):
     """Determine which season a date falls into"""
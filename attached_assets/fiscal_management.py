@@ -5,10 +5,14 @@ import io
 from utils.database import (
     get_all_invoices, get_invoice, add_booking, update_booking, 
     get_booking, get_property, get_all_properties,
-    create_invoice_for_booking
+    get_uninvoiced_bookings
 )
+from utils.repository import get_repository
 from utils.pdf_export import create_invoice_pdf
 
+# Number of invoices shown per page in the invoice list
+INVOICES_PAGE_SIZE = 50
+
 def show_fiscal_management():
     import streamlit as st
     st.header("Fiscal Management")
@@ -17,10 +21,8 @@ def show_fiscal_management():
 def show_invoices():
     st.subheader("Elenco Fatture")
     
-    # Get all invoices
-    invoices = get_all_invoices()
-    
-    if not invoices:
+    # Check if there is at least one invoice
+    if not get_repository().count_invoices():
         st.info("Nessuna fattura presente nel sistema. Vai alla scheda 'Generazione Fatture' per creare nuove fatture.")
         return
     
@@ -50,46 +52,39 @@ def show_invoices():
     with col3:
         search_query = st.text_input("Cerca", placeholder="Numero fattura o nome ospite")
     
+    # Filters, sorting and paging are applied by the database in a single joined query
+    # (results are cached by the repository until the invoices change)
+    filters = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "statuses": status_filter,
+        "search": search_query,
+    }
+    total_invoices = get_repository().count_invoices(**filters)
+    total_pages = max((total_invoices + INVOICES_PAGE_SIZE - 1) // INVOICES_PAGE_SIZE, 1)
+    
+    page = 1
+    if total_pages > 1:
+        page = st.number_input("Pagina", min_value=1, max_value=total_pages, value=1, step=1, key="invoice_page")
+    
+    invoices = get_repository().list_invoices(
+        **filters,
+        limit=INVOICES_PAGE_SIZE,
+        offset=(page - 1) * INVOICES_PAGE_SIZE
+    )
+    
     # Create dataframe from invoices
     invoices_data = []
     
     for invoice in invoices:
-        # Get booking data
-        booking = get_booking(invoice.get("booking_id"))
-        if not booking:
-            continue
-        
-        # Get property data
-        property_data = get_property(booking.get("property_id"))
-        property_name = property_data.get("name") if property_data else "Sconosciuto"
-        
-        # Convert date string to date object
         invoice_date = datetime.fromisoformat(invoice.get("date")).date() if invoice.get("date") else None
         
-        # Apply date filter
-        if invoice_date and (invoice_date < start_date or invoice_date > end_date):
-            continue
-        
-        # Apply status filter
-        if status_filter and invoice.get("status") not in status_filter:
-            continue
-        
-        # Apply search query
-        if search_query:
-            search_terms = [
-                invoice.get("invoice_number", ""),
-                booking.get("guest_name", ""),
-                property_name
-            ]
-            if not any(search_query.lower() in term.lower() for term in search_terms if term):
-                continue
-        
         invoices_data.append({
             "id": invoice.get("id"),
             "Numero": invoice.get("invoice_number"),
             "Data": invoice_date.strftime("%d/%m/%Y") if invoice_date else "N/A",
-            "Ospite": booking.get("guest_name"),
-            "Immobile": property_name,
+            "Ospite": invoice.get("guest_name"),
+            "Immobile": invoice.get("property_name"),
             "Importo": f"€{invoice.get('amount'):.2f}",
             "IVA": f"€{invoice.get('tax_amount'):.2f}",
             "Stato": invoice.get("status"),
@@ -100,6 +95,7 @@ def show_invoices():
         # Convert to dataframe
         df = pd.DataFrame(invoices_data)
         st.dataframe(df, use_container_width=True)
+        st.caption(f"Pagina {page} di {total_pages} - {total_invoices} fatture")
         
         # View invoice details
         st.subheader("Dettagli Fattura")
@@ -188,25 +184,18 @@ def show_invoices():
 def generate_invoices():
     st.subheader("Generazione Fatture")
     
-    # Get bookings without invoices
-    all_invoices = get_all_invoices()
-    invoiced_booking_ids = [inv.get("booking_id") for inv in all_invoices]
-    
+    # Get bookings without invoices (anti-join on the invoices table)
     bookings_data = []
-    for booking in st.session_state.bookings:
-        if booking.get("id") not in invoiced_booking_ids and booking.get("status") in ["confermata", "attiva", "completata"]:
-            property_data = get_property(booking.get("property_id"))
-            property_name = property_data.get("name") if property_data else "Sconosciuto"
-            
-            bookings_data.append({
-                "id": booking.get("id"),
-                "Ospite": booking.get("guest_name"),
-                "Immobile": property_name,
-                "Check-in": booking.get("checkin_date"),
-                "Check-out": booking.get("checkout_date"),
-                "Totale": f"€{booking.get('total_price'):.2f}",
-                "Stato": booking.get("status")
-            })
+    for booking in get_uninvoiced_bookings():
+        bookings_data.append({
+            "id": booking.get("id"),
+            "Ospite": booking.get("guest_name"),
+            "Immobile": booking.get("property_name"),
+            "Check-in": booking.get("checkin_date"),
+            "Check-out": booking.get("checkout_date"),
+            "Totale": f"€{booking.get('total_price'):.2f}",
+            "Stato": booking.get("status")
+        })
     
     if bookings_data:
         st.write("Seleziona le prenotazioni per cui generare fatture:")
@@ -223,8 +212,8 @@ def generate_invoices():
         if selected_booking_ids:
             if st.button("Genera Fatture"):
                 with st.spinner("Generazione fatture in corso..."):
-                    for booking_id in selected_booking_ids:
-                        create_invoice_for_booking(booking_id)
+                    # Tutte le fatture in una sola transazione
+                    get_repository().create_invoices_for_bookings(selected_booking_ids)
                     
                     st.success(f"Generate {len(selected_booking_ids)} fatture con successo!")
                     st.rerun()
@@ -234,10 +223,11 @@ def generate_invoices():
     # Generate invoice for specific booking
     st.subheader("Genera Fattura per Prenotazione Specifica")
     
+    property_names = {prop["id"]: prop["name"] for prop in get_all_properties()}
+    
     all_bookings = []
     for booking in st.session_state.bookings:
-        property_data = get_property(booking.get("property_id"))
-        property_name = property_data.get("name") if property_data else "Sconosciuto"
+        property_name = property_names.get(booking.get("property_id"), "Sconosciuto")
         
         all_bookings.append({
             "id": booking.get("id"),
@@ -253,7 +243,7 @@ def generate_invoices():
     if selected_booking_id:
         if st.button("Genera Fattura"):
             with st.spinner("Generazione fattura in corso..."):
-                result = create_invoice_for_booking(selected_booking_id)
+                result = get_repository().create_invoice_for_booking(selected_booking_id)
                 if result:
                     st.success("Fattura generata con successo!")
                 else:
@@ -7,6 +7,7 @@ import os
 import plotly.express as px
 import plotly.graph_objects as go
 from utils.database import get_all_properties, get_property, get_all_bookings, get_all_invoices, get_booking
+from utils.repository import get_repository
 from utils.pdf_export import create_property_report_pdf, create_financial_report_pdf
 from utils.report_generator import generate_report_template, add_section_to_report, render_report_in_streamlit, generate_pdf_report, download_report, generate_ai_report
 
@@ -114,23 +115,21 @@ def main():
     # Forza sempre la modalità chiara
     st.markdown('<div class="light-mode">', unsafe_allow_html=True)
     
-    # Carica i dati direttamente dal file JSON
+    # Carica gli immobili dal repository condiviso
     try:
-        # Percorso del file JSON
-        json_file_path = "c:/Users/DEADSHOT/Desktop/ciaohostreale/ciaohostluss/DatabaseCiaoHostProprieta.json"
-        
-        # Leggi il file JSON
-        with open(json_file_path, 'r') as file:
-            data = json.load(file)
-        
-        # Estrai le proprietà
-        properties_dict = data.get('properties', {})
-        
-        # Converti le proprietà in una lista di dizionari
-        properties_list = []
-        for prop_id, prop_data in properties_dict.items():
-            prop_data['id'] = prop_id  # Aggiungi l'ID come campo
-            properties_list.append(prop_data)
+        # Converti le proprietà in una lista di dizionari (stesse colonne dei dati di esempio)
+        properties_list = [
+            {
+                'id': prop['id'],
+                'name': prop['name'],
+                'location': prop['city'],
+                'bedrooms': prop['bedrooms'],
+                'bathrooms': prop['bathrooms'],
+                'max_guests': prop['max_guests'],
+                'price': prop['base_price']
+            }
+            for prop in get_repository().list_properties()
+        ]
         
         # Crea il dataframe delle proprietà
         df_properties = pd.DataFrame(properties_list)
@@ -4,6 +4,10 @@ import json
 import os
 from datetime import datetime
 import re
+from utils.backup import BACKUP_CATEGORIES, BACKUP_DIR, create_backup, list_backups, restore_backup
+
+# Largest backup archive offered as a browser download
+BACKUP_DOWNLOAD_MAX_BYTES = 200 * 1024 * 1024
 
 def show_settings():
     st.markdown("<h1 class='main-header' style='color: #4F46E5; font-size: 2.5rem; padding: 10px 0; border-bottom: 2px solid #4F46E5; margin-bottom: 20px;'>⚙️ Impostazioni</h1>", unsafe_allow_html=True)
@@ -618,54 +622,87 @@ def show_backup_restore():
         # Backup options
         backup_options = st.multiselect(
             "Elementi da includere nel backup",
-            ["Immobili", "Prenotazioni", "Chat e Comunicazioni", "Impostazioni", "Prezzi"],
-            default=["Immobili", "Prenotazioni", "Impostazioni"]
+            ["Immobili", "Prenotazioni", "Chat e Comunicazioni", "Impostazioni", "Prezzi", "Database"],
+            default=["Immobili", "Prenotazioni", "Impostazioni", "Database"]
         )
         
         # Include media files
         include_media = st.checkbox("Includi file multimediali", value=False)
         
-        # Backup format
-        backup_format = st.selectbox(
-            "Formato Backup",
-            ["JSON", "CSV", "Excel"],
-            index=0
-        )
+        # Incremental by default: unchanged files point to the previous archives
+        full_backup = st.checkbox("Backup completo (ripristinabile senza i backup precedenti)", value=False)
         
         # Create backup button
         if st.button("Crea Backup"):
+            categories = backup_options + (["Foto"] if include_media else [])
             with st.spinner("Creazione backup in corso..."):
-                # In a real app, would actually create a backup file
-                # For demo, just show success message
-                import time
-                time.sleep(1)
-                st.success("Backup creato con successo!")
+                try:
+                    result = create_backup(categories, full=full_backup)
+                except Exception as e:
+                    st.error(f"Errore durante la creazione del backup: {e}")
+                    result = None
+            
+            if result:
+                archive_size = os.path.getsize(result["path"])
+                st.success(f"Backup creato con successo! File salvati: {result['stored']}, invariati dal backup precedente: {result['reused']}")
+                st.caption(f"Archivio: {result['path']} ({archive_size / (1024 * 1024):.1f} MB)")
                 
-                # Create a placeholder download button
-                st.download_button(
-                    "Scarica Backup",
-                    data=json.dumps({
-                        "timestamp": datetime.now().isoformat(),
-                        "backup_options": backup_options,
-                        "include_media": include_media,
-                        "properties_count": len(st.session_state.get("properties", [])),
-                        "bookings_count": len(st.session_state.get("bookings", []))
-                    }),
-                    file_name=f"ciao_host_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                    mime="application/json"
-                )
+                if result["reused"] and not full_backup:
+                    st.info("Il backup è incrementale: per ripristinarlo servono anche gli archivi precedenti nella cartella dei backup.")
+                
+                # The browser download reads the whole archive, large ones stay on the server
+                if archive_size <= BACKUP_DOWNLOAD_MAX_BYTES:
+                    with open(result["path"], "rb") as f:
+                        st.download_button(
+                            "Scarica Backup",
+                            data=f,
+                            file_name=os.path.basename(result["path"]),
+                            mime="application/gzip"
+                        )
+                else:
+                    st.info("L'archivio è troppo grande per il download dal browser: copialo direttamente dal server.")
+        
+        # Existing backups
+        backups = list_backups()
+        if backups:
+            st.markdown("#### Backup disponibili")
+            st.dataframe(pd.DataFrame([
+                {
+                    "Archivio": backup["name"],
+                    "Data": datetime.fromisoformat(backup["created_at"]).strftime("%d/%m/%Y %H:%M"),
+                    "Elementi": ", ".join(backup["categories"]),
+                    "File": len(backup["files"]),
+                    "Incrementale": "Sì" if backup.get("parent") else "No"
+                }
+                for backup in backups
+            ]), use_container_width=True)
     
     with backup_tabs[1]:
         st.markdown("### Ripristino Dati")
         st.write("Ripristina i dati da un backup precedente.")
         
-        # Upload backup file
-        uploaded_backup = st.file_uploader("Carica file di backup", type=["json", "csv", "xlsx"])
+        backups = list_backups()
+        restore_source = st.radio(
+            "Origine del backup",
+            ["Backup sul server", "Carica file"],
+            index=0 if backups else 1
+        )
+        
+        backup_source = None
+        if restore_source == "Backup sul server":
+            if backups:
+                selected_backup = st.selectbox("Backup", [backup["name"] for backup in backups])
+                backup_source = os.path.join(BACKUP_DIR, selected_backup)
+            else:
+                st.info("Nessun backup disponibile sul server.")
+        else:
+            # Upload backup file
+            backup_source = st.file_uploader("Carica file di backup", type=["gz"])
         
         # Restore options
         restore_options = st.multiselect(
             "Elementi da ripristinare",
-            ["Immobili", "Prenotazioni", "Chat e Comunicazioni", "Impostazioni", "Prezzi"],
+            list(BACKUP_CATEGORIES),
             default=["Immobili", "Prenotazioni", "Impostazioni"]
         )
         
@@ -676,23 +713,22 @@ def show_backup_restore():
             index=0
         )
         
+        st.warning("⚠️ Questa operazione potrebbe sovrascrivere i dati esistenti.")
+        confirm_restore = st.checkbox("Confermo di voler procedere con il ripristino")
+        
         # Restore button
-        if uploaded_backup is not None and st.button("Ripristina Dati"):
-            # In a real app, would actually restore from the backup file
-            # For demo, just show success message
-            st.warning("⚠️ Questa operazione potrebbe sovrascrivere i dati esistenti. Sei sicuro di voler procedere?")
-            
-            # Confirmation buttons
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("Sì, Procedi con il Ripristino"):
-                    with st.spinner("Ripristino in corso..."):
-                        import time
-                        time.sleep(2)
-                        st.success("Dati ripristinati con successo!")
-            with col2:
-                if st.button("No, Annulla"):
-                    st.info("Ripristino annullato.")
+        if backup_source is not None and st.button("Ripristina Dati", disabled=not confirm_restore):
+            with st.spinner("Ripristino in corso..."):
+                try:
+                    result = restore_backup(
+                        backup_source,
+                        restore_options,
+                        mode="merge" if restore_behavior == "Unisci con dati esistenti" else "replace"
+                    )
+                except Exception as e:
+                    st.error(f"Errore durante il ripristino: {e}")
+                else:
+                    st.success(f"Dati ripristinati con successo! File ripristinati: {result['restored']}, saltati: {result['skipped']}")
     
     with backup_tabs[2]:
         st.markdown("### Importazione/Esportazione")
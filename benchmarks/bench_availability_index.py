@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Benchmark: controllo disponibilità con l'indice per immobile contro la scansione di tutte le prenotazioni.
+
+Uso:
+    python benchmarks/bench_availability_index.py [--bookings 100000] [--properties 500] [--queries 20000]
+
+Le prenotazioni sono generate in memoria nel formato di DatabaseCiaoHostPrenotazioni.json,
+nessun file viene letto o scritto.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.availability_index import AvailabilityIndex
+from utils.booking_records import parse_booking_date
+
+START = date(2024, 1, 1)
+HORIZON_DAYS = 730
+
+# Obiettivi con 100k prenotazioni: tempo per query dell'indice e vantaggio sulla scansione
+INDEX_TARGET_US = 100
+SPEEDUP_TARGET = 100
+
+def generate_bookings(count, property_ids):
+    bookings = {}
+    for _ in range(count):
+        check_in = START + timedelta(days=random.randrange(HORIZON_DAYS))
+        check_out = check_in + timedelta(days=random.randint(1, 10))
+        bookings[str(uuid.uuid4())] = {
+            "property_id": random.choice(property_ids),
+            "check_in_date": check_in.strftime("%d/%m/%Y"),
+            "check_out_date": check_out.strftime("%d/%m/%Y"),
+            "status": "Confermata",
+        }
+    return bookings
+
+def generate_queries(count, property_ids):
+    queries = []
+    for _ in range(count):
+        check_in = START + timedelta(days=random.randrange(HORIZON_DAYS))
+        queries.append((random.choice(property_ids), check_in, check_in + timedelta(days=random.randint(1, 7))))
+    return queries
+
+def scan_is_free(bookings, property_id, check_in, check_out):
+    """Quello che farebbe il flusso di prenotazione senza indice"""
+    for booking in bookings.values():
+        if booking["property_id"] != property_id:
+            continue
+        if parse_booking_date(booking["check_in_date"]) < check_out and parse_booking_date(booking["check_out_date"]) > check_in:
+            return False
+    return True
+
+def timed(action):
+    start = time.perf_counter()
+    result = action()
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bookings", type=int, default=100000)
+    parser.add_argument("--properties", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--scan-queries", type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(42)
+    property_ids = [str(uuid.uuid4()) for _ in range(args.properties)]
+    bookings = generate_bookings(args.bookings, property_ids)
+    queries = generate_queries(args.queries, property_ids)
+
+    index, build_time = timed(lambda: AvailabilityIndex.from_bookings(bookings))
+    print(f"Prenotazioni: {args.bookings}, immobili: {args.properties}")
+    print(f"Costruzione indice: {build_time * 1000:.0f} ms")
+
+    results, index_time = timed(lambda: [index.is_free(*query) for query in queries])
+    print(f"is_free con indice: {index_time / len(queries) * 1e6:.2f} µs/query")
+
+    scan_sample = queries[:args.scan_queries]
+    scan_results, scan_time = timed(lambda: [scan_is_free(bookings, *query) for query in scan_sample])
+    assert scan_results == results[:len(scan_sample)], "L'indice e la scansione non concordano"
+    index_us = index_time / len(queries) * 1e6
+    speedup = scan_time / len(scan_sample) / (index_time / len(queries))
+    print(f"is_free con scansione: {scan_time / len(scan_sample) * 1e6:.0f} µs/query")
+    print(f"Speedup: {speedup:.0f}x")
+    if index_us > INDEX_TARGET_US or speedup < SPEEDUP_TARGET:
+        print(f"⚠️ Obiettivo mancato: is_free sotto {INDEX_TARGET_US} µs/query e almeno {SPEEDUP_TARGET}x più veloce della scansione")
+
+    _, window_time = timed(lambda: [index.next_free_window(property_id, 7, check_in) for property_id, check_in, _ in queries])
+    print(f"next_free_window: {window_time / len(queries) * 1e6:.2f} µs/query")
+
+    new_bookings = generate_bookings(1000, property_ids)
+    _, add_time = timed(lambda: [index.apply_booking(booking_id, booking) for booking_id, booking in new_bookings.items()])
+    print(f"Aggiornamento incrementale: {add_time / len(new_bookings) * 1e6:.2f} µs/prenotazione")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Benchmark: risoluzione del nome di un immobile (/prenota) con l'indice a trigrammi contro il confronto con ogni nome.
+
+Uso:
+    python benchmarks/bench_property_names.py [--properties 5000] [--queries 100]
+
+Il catalogo è generato in memoria nel formato di DatabaseCiaoHostProprieta.json,
+nessun file viene letto o scritto.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.property_names import MIN_SIMILARITY, PropertyNameIndex, name_key, property_names, trigrams
+
+WORDS = ["casa", "casetta", "villa", "villetta", "baita", "rosa", "viola", "mare", "monte", "lago", "città"]
+
+QUERIES = ["casetta viola", "vila rosa r42", "baita monte", "lago mare r4999"]
+
+# Obiettivo con 5000 immobili: tempo per ricerca dell'indice
+SEARCH_TARGET_MS = 5
+
+def generate_catalogue(count):
+    return {
+        f"r{i}": {"name": " ".join(random.sample(WORDS, 2)) + f" r{i}"}
+        for i in range(count)
+    }
+
+def scan_search(properties, query):
+    """Quello che farebbe /prenota senza indice: somiglianza con ogni nome"""
+    key = name_key(query)
+    query_grams = trigrams(key)
+    result = {}
+    for property_id, prop in properties.items():
+        for name in property_names(prop):
+            grams = trigrams(name_key(name))
+            similarity = 2 * len(query_grams & grams) / (len(query_grams) + len(grams))
+            if similarity >= MIN_SIMILARITY:
+                result[property_id] = max(result.get(property_id, 0), similarity)
+    return sorted(result.items(), key=lambda item: -item[1])[:5]
+
+def timed(action):
+    start = time.perf_counter()
+    result = action()
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--properties", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--scan-queries", type=int, default=8)
+    args = parser.parse_args()
+
+    random.seed(53)
+    properties = generate_catalogue(args.properties)
+    queries = (QUERIES * (args.queries // len(QUERIES) + 1))[:args.queries]
+
+    index, build_time = timed(lambda: PropertyNameIndex.from_properties(properties))
+    print(f"Immobili: {args.properties}")
+    print(f"Costruzione indice: {build_time * 1000:.0f} ms")
+
+    _, index_time = timed(lambda: [index.search(query) for query in queries])
+    search_ms = index_time / len(queries) * 1000
+    print(f"search con indice: {search_ms:.3f} ms/query")
+
+    scan_sample = queries[:args.scan_queries]
+    _, scan_time = timed(lambda: [scan_search(properties, query) for query in scan_sample])
+    print(f"search con scansione: {scan_time / len(scan_sample) * 1000:.1f} ms/query")
+    print(f"Speedup: {scan_time / len(scan_sample) / (index_time / len(queries)):.0f}x")
+    if search_ms > SEARCH_TARGET_MS:
+        print(f"⚠️ Obiettivo mancato: search sotto {SEARCH_TARGET_MS} ms/query")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Benchmark: letture/scritture concorrenti su SQLite con il profilo "default" e "production".
+
+Uso:
+    python benchmarks/bench_sqlite_profile.py [--threads 8] [--seconds 5] [--bookings 20000]
+
+Ogni thread esegue per la durata indicata un mix di letture (prenotazioni di un
+immobile) e scritture (nuova prenotazione), aprendo e chiudendo una sessione ad
+ogni operazione come fanno gli helper di utils/database.py.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Il modulo crea il suo motore all'import: lo puntiamo su un file temporaneo
+BENCH_DIR = tempfile.mkdtemp(prefix="ciaohost_bench_")
+os.environ.setdefault("CIAOHOST_DATABASE_URL", f"sqlite:///{os.path.join(BENCH_DIR, 'import.db')}")
+
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from utils.database import Base, Booking, Property, create_database_engine
+
+PROPERTY_COUNT = 200
+
+def seed(engine, bookings):
+    Base.metadata.create_all(engine)
+    property_ids = [str(uuid.uuid4()) for _ in range(PROPERTY_COUNT)]
+    with engine.begin() as connection:
+        connection.execute(insert(Property.__table__), [
+            {"id": property_id, "name": f"Immobile {i}", "base_price": 80.0}
+            for i, property_id in enumerate(property_ids)
+        ])
+        start = date(2024, 1, 1)
+        rows = []
+        for _ in range(bookings):
+            checkin = start + timedelta(days=random.randrange(700))
+            rows.append({
+                "id": str(uuid.uuid4()),
+                "property_id": random.choice(property_ids),
+                "guest_name": "Ospite",
+                "checkin_date": checkin,
+                "checkout_date": checkin + timedelta(days=random.randint(1, 10)),
+                "price_per_night": 80.0,
+                "total_price": 400.0,
+            })
+        connection.execute(insert(Booking.__table__), rows)
+    return property_ids
+
+def run_profile(profile, threads, seconds, bookings, write_ratio):
+    url = f"sqlite:///{os.path.join(BENCH_DIR, profile + '.db')}"
+    engine = create_database_engine(url, profile)
+    property_ids = seed(engine, bookings)
+    Session = sessionmaker(bind=engine)
+
+    counters = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        reads = writes = errors = 0
+        while time.perf_counter() < deadline:
+            session = Session()
+            try:
+                property_id = random.choice(property_ids)
+                if random.random() < write_ratio:
+                    checkin = date(2026, 1, 1) + timedelta(days=random.randrange(365))
+                    session.add(Booking(
+                        property_id=property_id,
+                        guest_name="Bench",
+                        checkin_date=checkin,
+                        checkout_date=checkin + timedelta(days=3),
+                        price_per_night=80.0,
+                        total_price=240.0,
+                    ))
+                    session.commit()
+                    writes += 1
+                else:
+                    session.query(Booking).filter(Booking.property_id == property_id).all()
+                    reads += 1
+            except OperationalError:
+                # "database is locked": con il profilo default succede spesso
+                session.rollback()
+                errors += 1
+            finally:
+                session.close()
+        with lock:
+            counters["reads"] += reads
+            counters["writes"] += writes
+            counters["errors"] += errors
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    engine.dispose()
+
+    return {key: value / seconds for key, value in counters.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--bookings", type=int, default=20000)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(f"Thread: {args.threads}, durata: {args.seconds}s, prenotazioni iniziali: {args.bookings}, scritture: {args.write_ratio:.0%}")
+    print(f"{'profilo':<12}{'letture/s':>12}{'scritture/s':>14}{'errori/s':>12}")
+    for profile in ("default", "production"):
+        result = run_profile(profile, args.threads, args.seconds, args.bookings, args.write_ratio)
+        print(f"{profile:<12}{result['reads']:>12.0f}{result['writes']:>14.0f}{result['errors']:>12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -33,7 +33,10 @@ def detect_booking_intent(message):
 
 def handle_booking(message_text):
     """Gestisce il processo di prenotazione attraverso la chat"""
-    from utils.booking_database import save_bookings_database
+    from utils.booking_database import BookingConflictError, add_booking
+    from utils.availability_index import is_available, next_free_window
+    from utils.booking_records import parse_booking_date
+    from utils.property_names import resolve_property_name
     
     booking_state = st.session_state.get('booking_state', {})
     
@@ -48,33 +51,37 @@ def handle_booking(message_text):
         }
         booking_state = st.session_state.booking_state
     
+    def start_booking(property_id, property_name):
+        # Inizia il processo di prenotazione
+        booking_state['active'] = True
+        booking_state['step'] = 'check_in_date'
+        booking_state['property_id'] = property_id
+        booking_state['property_name'] = property_name
+        booking_state['data'] = {
+            'property_id': property_id,
+            'property_name': property_name
+        }
+        
+        return f"🏠 Hai selezionato: **{property_name}**\n\nPer completare la prenotazione, ho bisogno di alcune informazioni.\n\nPer prima cosa, quando vorresti fare il check-in? (formato: GG/MM/AAAA)"
+    
     # Controlla se il messaggio è un comando di prenotazione
     if message_text.lower().startswith("/prenota "):
         property_name = message_text[9:].strip()
         
-        # Cerca la proprietà nel database
-        property_found = False
-        property_id = None
-        
-        for pid, prop in st.session_state.properties.items():
-            if prop.get('name', '').lower() == property_name.lower():
-                property_found = True
-                property_id = pid
-                property_name = prop.get('name')
-                break
+        # Cerca la proprietà per somiglianza del nome (o di un alias) nell'indice a trigrammi
+        property_id, candidates = resolve_property_name(property_name)
+        candidates = [(pid, name) for pid, name, _ in candidates if pid in st.session_state.properties]
         
-        if property_found:
-            # Inizia il processo di prenotazione
+        if property_id in st.session_state.properties:
+            return start_booking(property_id, st.session_state.properties[property_id].get('name'))
+        elif candidates:
+            # Nome non univoco o scritto in modo diverso: proponi gli immobili più simili
             booking_state['active'] = True
-            booking_state['step'] = 'check_in_date'
-            booking_state['property_id'] = property_id
-            booking_state['property_name'] = property_name
-            booking_state['data'] = {
-                'property_id': property_id,
-                'property_name': property_name
-            }
+            booking_state['step'] = 'choose_property'
+            booking_state['data'] = {'candidates': candidates}
             
-            return f"🏠 Hai selezionato: **{property_name}**\n\nPer completare la prenotazione, ho bisogno di alcune informazioni.\n\nPer prima cosa, quando vorresti fare il check-in? (formato: GG/MM/AAAA)"
+            choices = "\n".join(f"{i}. {name}" for i, (_, name) in enumerate(candidates, 1))
+            return f"🤔 Non ho trovato esattamente '{property_name}'. Forse intendevi:\n\n{choices}\n\nRispondi con il numero dell'immobile oppure 'no' per annullare."
         else:
             return f"❌ Mi dispiace, non ho trovato nessun immobile con il nome '{property_name}'. Puoi verificare il nome e riprovare."
     
@@ -106,11 +113,34 @@ Esempio: `/prenota Villa Bella`
     if booking_state.get('active', False):
         current_step = booking_state.get('step')
         
-        if current_step == 'check_in_date':
+        if current_step == 'choose_property':
+            # Scelta tra gli immobili proposti da /prenota
+            candidates = booking_state['data']['candidates']
+            answer = message_text.strip().lower()
+            if answer.isdigit() and 1 <= int(answer) <= len(candidates):
+                return start_booking(*candidates[int(answer) - 1])
+            
+            for pid, name in candidates:
+                if answer == name.lower():
+                    return start_booking(pid, name)
+            
+            if answer in ('no', 'annulla'):
+                st.session_state.booking_state = {
+                    'active': False,
+                    'step': None,
+                    'property_id': None,
+                    'property_name': None,
+                    'data': {}
+                }
+                return "❌ Prenotazione annullata. Se desideri prenotare un altro immobile, usa il comando /prenota seguito dal nome dell'immobile."
+            
+            return f"❓ Rispondi con un numero da 1 a {len(candidates)} oppure 'no' per annullare."
+        
+        elif current_step == 'check_in_date':
             # Salva la data di check-in
             try:
                 # Semplice validazione del formato data
-                if len(message_text.split('/')) != 3:
+                if len(message_text.split('/')) != 3 or parse_booking_date(message_text) is None:
                     return "❌ Formato data non valido. Usa il formato GG/MM/AAAA."
                 
                 booking_state['data']['check_in_date'] = message_text
@@ -126,6 +156,25 @@ Esempio: `/prenota Villa Bella`
                 if len(message_text.split('/')) != 3:
                     return "❌ Formato data non valido. Usa il formato GG/MM/AAAA."
                 
+                check_in = parse_booking_date(booking_state['data']['check_in_date'])
+                check_out = parse_booking_date(message_text)
+                if check_in is None or check_out is None:
+                    return "❌ Formato data non valido. Usa il formato GG/MM/AAAA."
+                if check_out <= check_in:
+                    return "❌ La data di check-out deve essere successiva a quella di check-in."
+                
+                # Controlla che le date non si sovrappongano ad altre prenotazioni
+                property_id = booking_state['data']['property_id']
+                if not is_available(property_id, check_in, check_out):
+                    nights = (check_out - check_in).days
+                    free_in, free_out = next_free_window(property_id, nights, check_in)
+                    booking_state['step'] = 'check_in_date'
+                    return (
+                        f"❌ L'immobile non è disponibile dal {check_in.strftime('%d/%m/%Y')} al {check_out.strftime('%d/%m/%Y')}.\n\n"
+                        f"La prima disponibilità per {nights} notti è dal {free_in.strftime('%d/%m/%Y')} al {free_out.strftime('%d/%m/%Y')}.\n\n"
+                        "Quando vorresti fare il check-in? (formato: GG/MM/AAAA)"
+                    )
+                
                 booking_state['data']['check_out_date'] = message_text
                 booking_state['step'] = 'guests'
                 return "👥 Quante persone soggiorneranno? (inserisci un numero)"
@@ -181,24 +230,29 @@ Confermi la prenotazione? (sì/no)
             if message_text.lower() in ['sì', 'si', 'yes', 'y', 's']:
                 # Salva la prenotazione nel database
                 booking_data = booking_state['data']
+                
                 booking_data['status'] = 'Confermata'
-                booking_data['created_at'] = datetime.now().isoformat()
                 
-                # Aggiungi la prenotazione al database
+                # Aggiungi solo questa prenotazione al database, senza riscrivere
+                # quelle salvate nel frattempo da altre sessioni. La scrittura è
+                # diretta (non passa dalla coda in background): confermiamo solo
+                # quando la prenotazione è su disco. Le date vengono ricontrollate
+                # sotto il lock del file: nel frattempo potrebbero essere state
+                # prenotate da un'altra sessione
+                try:
+                    booking_id = add_booking(booking_data, reject_overlaps=True)
+                except BookingConflictError:
+                    booking_state['step'] = 'check_in_date'
+                    return "❌ Nel frattempo le date scelte sono state prenotate. Quando vorresti fare il check-in? (formato: GG/MM/AAAA)"
+                except Exception as e:
+                    return f"❌ Errore durante il salvataggio della prenotazione: {e}. Rispondi 'sì' per riprovare."
+                if booking_id is None:
+                    return "❌ Errore durante il salvataggio della prenotazione. Rispondi 'sì' per riprovare."
+                
                 if 'bookings' not in st.session_state:
                     st.session_state.bookings = {}
-                
-                booking_id = str(uuid.uuid4())
                 st.session_state.bookings[booking_id] = booking_data
                 
-                # Salva il database delle prenotazioni
-                try:
-                    save_bookings_database({
-                        'bookings': st.session_state.bookings
-                    })
-                except Exception as e:
-                    st.error(f"Errore durante il salvataggio delle prenotazioni: {e}")
-                
                 # Resetta lo stato di prenotazione
                 st.session_state.booking_state = {
                     'active': False,
@@ -2,6 +2,7 @@
 import streamlit as st
 import google.generativeai as genai
 import os
+import copy
 import json
 import pandas as pd
 from dotenv import load_dotenv
@@ -250,33 +251,69 @@ if 'saved_dashboards' not in st.session_state:
 if 'subscription_purchased' not in st.session_state:
     st.session_state.subscription_purchased = False
 
-from utils.json_database import load_database as load_json_db, save_database as save_json_db, get_all_properties
+from utils.json_database import DATABASE_FILE, get_database_view, save_changes as save_json_changes, get_all_properties, get_database_version
+from utils import json_cache, write_behind
 
 def load_database():
+    report_database_write_errors()
     try:
-        data = load_json_db()
+        # Il database è in cache a livello di processo: copiamo i dati nella sessione
+        # solo se il file è cambiato dall'ultima volta che li abbiamo caricati
+        version = get_database_version()
+        if st.session_state.get('database_version') == version and 'properties' in st.session_state:
+            return
+
+        # The shared read-only view is kept as the base of the next save: only
+        # the records the session changed since this load get written
+        view = get_database_view()
+        data = json_cache.thaw(view)
         st.session_state.properties = data.get('properties', {})
         st.session_state.users = data.get('users', {})
+        st.session_state.database_base = view
+        st.session_state.database_version = version
     except Exception as e:
         st.error(f"Errore durante il caricamento del database: {e}")
         st.session_state.properties = {}
         st.session_state.users = {}
-        save_database()
+        st.session_state.database_base = {}
 
 def save_database():
+    report_database_write_errors()
     try:
-        save_json_db({
+        # Snapshot of the session data: the page can keep changing it while the
+        # background writer compares the copy with the base it was loaded from
+        base = st.session_state.get('database_base', {})
+        data = copy.deepcopy({
             'properties': st.session_state.properties,
             'users': st.session_state.users
         })
+        # Saves still queued from this session are merged (the last copy contains
+        # the earlier changes); other sessions have their own queue entry
+        if 'database_write_key' not in st.session_state:
+            import uuid
+            st.session_state.database_write_key = f"{DATABASE_FILE}#{uuid.uuid4()}"
+        ack = write_behind.submit(st.session_state.database_write_key, lambda: save_json_changes(base, data))
+        st.session_state.database_write = ack
+        return ack
     except Exception as e:
         st.error(f"Errore durante il salvataggio del database: {e}")
 
+def report_database_write_errors():
+    """Mostra l'errore dell'ultimo salvataggio in background della sessione, se fallito"""
+    ack = st.session_state.get('database_write')
+    if ack is not None and ack.done():
+        st.session_state.database_write = None
+        if ack.error is not None:
+            st.error(f"Errore durante il salvataggio del database: {ack.error}. Le ultime modifiche potrebbero non essere state salvate.")
+
 def handle_booking(message_text):
     """Gestisce il processo di prenotazione attraverso la chat"""
     from datetime import datetime
     import uuid
-    from utils.booking_database import save_bookings_database
+    from utils.booking_database import BookingConflictError, add_booking
+    from utils.availability_index import is_available, next_free_window
+    from utils.booking_records import parse_booking_date
+    from utils.property_names import resolve_property_name
     
     booking_state = st.session_state.get('booking_state', {})
     
@@ -291,33 +328,37 @@ def handle_booking(message_text):
         }
         booking_state = st.session_state.booking_state
     
+    def start_booking(property_id, property_name):
+        # Inizia il processo di prenotazione
+        booking_state['active'] = True
+        booking_state['step'] = 'check_in_date'
+        booking_state['property_id'] = property_id
+        booking_state['property_name'] = property_name
+        booking_state['data'] = {
+            'property_id': property_id,
+            'property_name': property_name
+        }
+        
+        return f"🏠 Hai selezionato: **{property_name}**\n\nPer completare la prenotazione, ho bisogno di alcune informazioni.\n\nPer prima cosa, quando vorresti fare il check-in? (formato: GG/MM/AAAA)"
+    
     # Controlla se il messaggio è un comando di prenotazione
     if message_text.lower().startswith("/prenota "):
         property_name = message_text[9:].strip()
         
-        # Cerca la proprietà nel database
-        property_found = False
-        property_id = None
-        
-        for pid, prop in st.session_state.properties.items():
-            if prop.get('name', '').lower() == property_name.lower():
-                property_found = True
-                property_id = pid
-                property_name = prop.get('name')
-                break
+        # Cerca la proprietà per somiglianza del nome (o di un alias) nell'indice a trigrammi
+        property_id, candidates = resolve_property_name(property_name)
+        candidates = [(pid, name) for pid, name, _ in candidates if pid in st.session_state.properties]
         
-        if property_found:
-            # Inizia il processo di prenotazione
+        if property_id in st.session_state.properties:
+            return start_booking(property_id, st.session_state.properties[property_id].get('name'))
+        elif candidates:
+            # Nome non univoco o scritto in modo diverso: proponi gli immobili più simili
             booking_state['active'] = True
-            booking_state['step'] = 'check_in_date'
-            booking_state['property_id'] = property_id
-            booking_state['property_name'] = property_name
-            booking_state['data'] = {
-                'property_id': property_id,
-                'property_name': property_name
-            }
+            booking_state['step'] = 'choose_property'
+            booking_state['data'] = {'candidates': candidates}
             
-            return f"🏠 Hai selezionato: **{property_name}**\n\nPer completare la prenotazione, ho bisogno di alcune informazioni.\n\nPer prima cosa, quando vorresti fare il check-in? (formato: GG/MM/AAAA)"
+            choices = "\n".join(f"{i}. {name}" for i, (_, name) in enumerate(candidates, 1))
+            return f"🤔 Non ho trovato esattamente '{property_name}'. Forse intendevi:\n\n{choices}\n\nRispondi con il numero dell'immobile oppure 'no' per annullare."
         else:
             return f"❌ Mi dispiace, non ho trovato nessun immobile con il nome '{property_name}'. Puoi verificare il nome e riprovare."
     
@@ -325,11 +366,34 @@ def handle_booking(message_text):
     if booking_state.get('active', False):
         current_step = booking_state.get('step')
         
-        if current_step == 'check_in_date':
+        if current_step == 'choose_property':
+            # Scelta tra gli immobili proposti da /prenota
+            candidates = booking_state['data']['candidates']
+            answer = message_text.strip().lower()
+            if answer.isdigit() and 1 <= int(answer) <= len(candidates):
+                return start_booking(*candidates[int(answer) - 1])
+            
+            for pid, name in candidates:
+                if answer == name.lower():
+                    return start_booking(pid, name)
+            
+            if answer in ('no', 'annulla'):
+                st.session_state.booking_state = {
+                    'active': False,
+                    'step': None,
+                    'property_id': None,
+                    'property_name': None,
+                    'data': {}
+                }
+                return "❌ Prenotazione annullata. Se desideri prenotare un altro immobile, usa il comando /prenota seguito dal nome dell'immobile."
+            
+            return f"❓ Rispondi con un numero da 1 a {len(candidates)} oppure 'no' per annullare."
+        
+        elif current_step == 'check_in_date':
             # Salva la data di check-in
             try:
                 # Semplice validazione del formato data
-                if len(message_text.split('/')) != 3:
+                if len(message_text.split('/')) != 3 or parse_booking_date(message_text) is None:
                     return "❌ Formato data non valido. Usa il formato GG/MM/AAAA."
                 
                 booking_state['data']['check_in_date'] = message_text
@@ -345,6 +409,25 @@ def handle_booking(message_text):
                 if len(message_text.split('/')) != 3:
                     return "❌ Formato data non valido. Usa il formato GG/MM/AAAA."
                 
+                check_in = parse_booking_date(booking_state['data']['check_in_date'])
+                check_out = parse_booking_date(message_text)
+                if check_in is None or check_out is None:
+                    return "❌ Formato data non valido. Usa il formato GG/MM/AAAA."
+                if check_out <= check_in:
+                    return "❌ La data di check-out deve essere successiva a quella di check-in."
+                
+                # Controlla che le date non si sovrappongano ad altre prenotazioni
+                property_id = booking_state['data']['property_id']
+                if not is_available(property_id, check_in, check_out):
+                    nights = (check_out - check_in).days
+                    free_in, free_out = next_free_window(property_id, nights, check_in)
+                    booking_state['step'] = 'check_in_date'
+                    return (
+                        f"❌ L'immobile non è disponibile dal {check_in.strftime('%d/%m/%Y')} al {check_out.strftime('%d/%m/%Y')}.\n\n"
+                        f"La prima disponibilità per {nights} notti è dal {free_in.strftime('%d/%m/%Y')} al {free_out.strftime('%d/%m/%Y')}.\n\n"
+                        "Quando vorresti fare il check-in? (formato: GG/MM/AAAA)"
+                    )
+                
                 booking_state['data']['check_out_date'] = message_text
                 booking_state['step'] = 'guests'
                 return "👥 Quante persone soggiorneranno? (inserisci un numero)"
@@ -400,24 +483,29 @@ Confermi la prenotazione? (sì/no)
             if message_text.lower() in ['sì', 'si', 'yes', 'y', 's']:
                 # Salva la prenotazione nel database
                 booking_data = booking_state['data']
+                
                 booking_data['status'] = 'Confermata'
-                booking_data['created_at'] = datetime.now().isoformat()
                 
-                # Aggiungi la prenotazione al database
+                # Aggiungi solo questa prenotazione al database, senza riscrivere
+                # quelle salvate nel frattempo da altre sessioni. La scrittura è
+                # diretta (non passa dalla coda in background): confermiamo solo
+                # quando la prenotazione è su disco. Le date vengono ricontrollate
+                # sotto il lock del file: nel frattempo potrebbero essere state
+                # prenotate da un'altra sessione
+                try:
+                    booking_id = add_booking(booking_data, reject_overlaps=True)
+                except BookingConflictError:
+                    booking_state['step'] = 'check_in_date'
+                    return "❌ Nel frattempo le date scelte sono state prenotate. Quando vorresti fare il check-in? (formato: GG/MM/AAAA)"
+                except Exception as e:
+                    return f"❌ Errore durante il salvataggio della prenotazione: {e}. Rispondi 'sì' per riprovare."
+                if booking_id is None:
+                    return "❌ Errore durante il salvataggio della prenotazione. Rispondi 'sì' per riprovare."
+                
                 if 'bookings' not in st.session_state:
                     st.session_state.bookings = {}
-                
-                booking_id = str(uuid.uuid4())
                 st.session_state.bookings[booking_id] = booking_data
                 
-                # Salva il database delle prenotazioni
-                try:
-                    save_bookings_database({
-                        'bookings': st.session_state.bookings
-                    })
-                except Exception as e:
-                    st.error(f"Errore durante il salvataggio delle prenotazioni: {e}")
-                
                 # Resetta lo stato di prenotazione
                 st.session_state.booking_state = {
                     'active': False,
@@ -605,6 +693,9 @@ Nota: Il nome della proprietà deve essere tra virgolette."""
 
     return None
 
+# Property cards rendered per page of search results
+SEARCH_PAGE_SIZE = 12
+
 def show_property_search():
     # Mostra un'animazione di caricamento
     from loading_animations import show_loading_animation
@@ -687,17 +778,24 @@ def show_property_search():
             <div class="search-icon">🔍</div>
         </div>
         """, unsafe_allow_html=True)
-        search_term = st.text_input("", placeholder="Nome, tipo o località...", key="prop_search_term").lower()
+        search_term = st.text_input("", placeholder="Nome, tipo, località o servizi...", key="prop_search_term").lower()
+    
+    # Facet values, counts and price bounds come precomputed from the facet index
+    from utils.property_facets import get_facets
+    facets = get_facets()
+    
+    def with_count(facet):
+        return lambda value: f"{value} ({facets[facet][value]})" if value in facets[facet] else value
     
     with col2:
-        # Extract unique property types
-        property_types = list(set([prop.get('type', 'Non specificato') for prop in available_properties.values()]))
+        # Property types, most common first
+        property_types = sorted(facets['type'], key=lambda value: (-facets['type'][value], value))
         property_types.insert(0, "Tutti i tipi")
-        selected_type = st.selectbox("Tipo di Alloggio", property_types)
+        selected_type = st.selectbox("Tipo di Alloggio", property_types, format_func=with_count('type'))
     
     with col3:
-        # Extract unique locations
-        locations = list(set([prop.get('location', 'Non specificato') for prop in available_properties.values()]))
+        # Locations, most common first
+        locations = sorted(facets['location'], key=lambda value: (-facets['location'][value], value))
         locations.insert(0, "Tutte le località")
         
         # Se c'è una destinazione selezionata, la impostiamo come default
@@ -708,7 +806,7 @@ def show_property_search():
             # Rimuoviamo la destinazione selezionata per evitare problemi in futuro
             st.session_state.pop('destination_selected', None)
         
-        selected_location = st.selectbox("Destinazione", locations, index=default_index)
+        selected_location = st.selectbox("Destinazione", locations, index=default_index, format_func=with_count('location'))
     
     # Additional filter options in collapsible section
     with st.expander("Filtri avanzati"):
@@ -716,8 +814,7 @@ def show_property_search():
         
         with col_adv1:
             # Price range slider
-            prices = [prop.get('price', 0) for prop in available_properties.values()]
-            min_price, max_price = min(prices), max(prices)
+            min_price, max_price = facets['price']
             
             # Assicuriamoci che min_price e max_price siano diversi
             if min_price == max_price:
@@ -740,10 +837,7 @@ def show_property_search():
         
         with col_adv2:
             # Services filter with multiselect
-            all_services = set()
-            for prop in available_properties.values():
-                services = prop.get('services', [])
-                all_services.update(services)
+            all_services = set(facets['services'])
             
             if not all_services:
                 all_services = {"Wi-Fi", "Parcheggio", "Aria condizionata", "Piscina", "Vista panoramica", 
@@ -752,7 +846,8 @@ def show_property_search():
             selected_services = st.multiselect(
                 "Servizi Desiderati",
                 options=sorted(list(all_services)),
-                default=[]
+                default=[],
+                format_func=with_count('services')
             )
             
             # Property rating
@@ -769,48 +864,60 @@ def show_property_search():
     
     st.markdown("</div>", unsafe_allow_html=True)
     
+    if check_in and check_out and check_out <= check_in:
+        st.warning("La data di check-out deve essere successiva a quella di check-in.")
+    
+    # Text, facet and date filters are set intersections on the indexes (smallest set
+    # first), cached per filter combination and catalogue version across reruns
+    from utils.search_cache import search_property_ids
+    matching_ids = search_property_ids(
+        search_term,
+        property_type=None if selected_type == "Tutti i tipi" else selected_type,
+        location=None if selected_location == "Tutte le località" else selected_location,
+        services=selected_services,
+        # The full slider range is not a filter
+        price_range=None if price_range == (int(min_price), int(max_price)) else price_range,
+        check_in=check_in,
+        check_out=check_out
+    )
+    if matching_ids is None:
+        matching_ids = available_properties.keys()
+    
     # Apply filters
-    filtered_properties = {}
-    for pid, prop in available_properties.items():
-        # Text search filter
-        text_match = True
-        if search_term:
-            text_match = (search_term in prop.get('name', '').lower() or
-                         search_term in prop.get('type', '').lower() or
-                         search_term in prop.get('location', '').lower())
-        
-        # Property type filter
-        type_match = True
-        if selected_type != "Tutti i tipi":
-            type_match = prop.get('type', '') == selected_type
-        
-        # Location filter
-        location_match = True
-        if selected_location != "Tutte le località":
-            location_match = prop.get('location', '') == selected_location
-        
-        # Price range filter
-        price = prop.get('price', 0)
-        price_match = price_range[0] <= price <= price_range[1]
-        
-        # Services filter
-        services_match = True
-        if selected_services:
-            prop_services = set(prop.get('services', []))
-            services_match = all(service in prop_services for service in selected_services)
-        
-        # Add to filtered properties if all conditions match
-        if text_match and type_match and location_match and price_match and services_match:
-            filtered_properties[pid] = prop
-    
-    # Display results count without sorting options
-    st.markdown(f"""
-        <div style="margin-bottom: 1rem;">
-            <p style="font-size: 1.1rem; font-weight: 600; color: var(--primary-color);">
-                <span style="color: var(--primary-color); font-weight: 700;">{len(filtered_properties)}</span> immobili trovati
-            </p>
-        </div>
-    """, unsafe_allow_html=True)
+    filtered_properties = {pid: available_properties[pid] for pid in matching_ids if pid in available_properties}
+    
+    # Display results count with sorting options
+    col_count, col_sort = st.columns([3, 1])
+    with col_count:
+        st.markdown(f"""
+            <div style="margin-bottom: 1rem;">
+                <p style="font-size: 1.1rem; font-weight: 600; color: var(--primary-color);">
+                    <span style="color: var(--primary-color); font-weight: 700;">{len(filtered_properties)}</span> immobili trovati
+                </p>
+            </div>
+        """, unsafe_allow_html=True)
+    with col_sort:
+        from utils.property_search import SORT_MODES, top_properties
+        sort_mode = st.selectbox("Ordina per", list(SORT_MODES), key="prop_search_sort")
+    
+    # Pagination: start again from the first page whenever filters or sorting change
+    search_key = (search_term, selected_type, selected_location, price_range, guests,
+                  tuple(selected_services), check_in, check_out, sort_mode)
+    if st.session_state.get('search_results_key') != search_key:
+        st.session_state.search_results_key = search_key
+        st.session_state.search_visible_count = SEARCH_PAGE_SIZE
+    visible_count = min(st.session_state.search_visible_count, len(filtered_properties))
+    
+    # Facet counts of the current result, computed on the matching ids only
+    if filtered_properties and len(filtered_properties) < len(available_properties):
+        result_facets = get_facets(filtered_properties.keys())
+        summary = [
+            f"**{label}:** " + ", ".join(f"{value} ({count})" for value, count in sorted(result_facets[facet].items(), key=lambda item: -item[1])[:5])
+            for facet, label in (('type', 'Tipi'), ('location', 'Località'))
+            if result_facets[facet]
+        ]
+        if summary:
+            st.caption(" · ".join(summary))
     
     # No results message
     if not filtered_properties:
@@ -841,11 +948,15 @@ def show_property_search():
         </style>
         """, unsafe_allow_html=True)
         
+        # Only the visible page is sorted (heap top-k selection) and rendered
+        visible_ids = top_properties(filtered_properties.keys(), filtered_properties, sort_mode, visible_count, search_term)
+        
         # Organizziamo le proprietà in righe di 3 elementi ciascuna
         property_rows = []
         current_row = []
         
-        for prop_id, prop in filtered_properties.items():
+        for prop_id in visible_ids:
+            prop = filtered_properties[prop_id]
             current_row.append((prop_id, prop))
             if len(current_row) == 3:
                 property_rows.append(current_row)
@@ -1426,6 +1537,15 @@ def show_property_search():
                                 if st.button("✖️ Chiudi dettagli", key=f"close_details_{prop_id}", use_container_width=True):
                                     st.session_state[f"show_details_{prop_id}"] = False
                                     st.rerun()
+        
+        # Load the next page of results
+        if visible_count < len(filtered_properties):
+            st.caption(f"Mostrati {visible_count} di {len(filtered_properties)} immobili")
+            col1, col2, col3 = st.columns([1, 1, 1])
+            with col2:
+                if st.button("Mostra altri immobili", key="search_load_more", use_container_width=True):
+                    st.session_state.search_visible_count = visible_count + SEARCH_PAGE_SIZE
+                    st.rerun()
 
 # Funzione per mostrare la schermata di benvenuto con animazioni e presentazione dell'azienda
 def show_welcome_screen():
@@ -8,6 +8,7 @@ from datetime import datetime
 from utils.json_database import (
     get_all_properties, get_property, add_property, update_property, delete_property
 )
+from utils.analytics_frames import get_properties_frame
 
 def show_property_management():
     st.markdown("<h1 class='main-header'>Gestione Immobili</h1>", unsafe_allow_html=True)
@@ -484,31 +485,25 @@ def show_property_statistics():
     """Display statistics about properties"""
     st.subheader("Statistiche Proprietà")
     
-    # Get all properties
-    properties = get_all_properties()
+    # Shared columnar table, materialised once per process
+    properties_df = get_properties_frame()
     
-    if not properties:
+    if properties_df.empty:
         st.info("Non ci sono proprietà registrate. Aggiungi proprietà per visualizzare le statistiche.")
         return
     
     # Calculate statistics
-    total_properties = len(properties)
-    total_bedrooms = sum(prop.get("bedrooms", 0) for prop in properties)
-    total_bathrooms = sum(prop.get("bathrooms", 0) for prop in properties)
-    total_capacity = sum(prop.get("max_guests", 0) for prop in properties)
-    avg_price = sum(prop.get("base_price", 0) for prop in properties) / total_properties if total_properties > 0 else 0
-    
-    # Property types
-    property_types = {}
-    for prop in properties:
-        prop_type = prop.get("type", "Non specificato")
-        property_types[prop_type] = property_types.get(prop_type, 0) + 1
-    
-    # Cities
-    cities = {}
-    for prop in properties:
-        city = prop.get("city", "Non specificata")
-        cities[city] = cities.get(city, 0) + 1
+    total_properties = len(properties_df)
+    total_bedrooms = int(properties_df["bedrooms"].sum())
+    total_bathrooms = float(properties_df["bathrooms"].sum())
+    total_capacity = int(properties_df["max_guests"].sum())
+    avg_price = float(properties_df["base_price"].mean())
+    
+    # Property types and cities (categorical columns: counts without string comparisons)
+    property_types = properties_df["type"].value_counts(sort=False)
+    property_types = property_types[property_types > 0]
+    cities = properties_df["city"].value_counts(sort=False)
+    cities = cities[cities > 0]
     
     # Display statistics
     col1, col2, col3 = st.columns(3)
@@ -525,32 +520,22 @@ def show_property_statistics():
         st.metric("Prezzo Medio", f"€{avg_price:.2f}")
     
     # Display property types chart
-    if property_types:
+    if not property_types.empty:
         st.subheader("Tipi di Proprietà")
-        property_types_df = pd.DataFrame({
-            "Tipo": list(property_types.keys()),
-            "Numero": list(property_types.values())
-        })
-        st.bar_chart(property_types_df.set_index("Tipo"))
+        st.bar_chart(property_types.rename_axis("Tipo").rename("Numero"))
     
     # Display cities chart
-    if cities:
+    if not cities.empty:
         st.subheader("Proprietà per Città")
-        cities_df = pd.DataFrame({
-            "Città": list(cities.keys()),
-            "Numero": list(cities.values())
-        })
-        st.bar_chart(cities_df.set_index("Città"))
+        st.bar_chart(cities.rename_axis("Città").rename("Numero"))
     
     # Property list by price
     st.subheader("Proprietà per Prezzo")
-    price_data = [{
-        "Nome": prop.get("name"),
-        "Tipo": prop.get("type", ""),
-        "Città": prop.get("city", ""),
-        "Prezzo Base": prop.get("base_price", 0)
-    } for prop in properties]
-    
-    price_df = pd.DataFrame(price_data)
+    price_df = properties_df[["name", "type", "city", "base_price"]].rename(columns={
+        "name": "Nome",
+        "type": "Tipo",
+        "city": "Città",
+        "base_price": "Prezzo Base"
+    })
     price_df = price_df.sort_values("Prezzo Base", ascending=False)
     st.dataframe(price_df, use_container_width=True)
\ No newline at end of file
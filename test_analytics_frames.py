@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Verifica la tabella colonnare degli immobili di utils/analytics_frames.py."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Evitiamo di toccare data/ciao_host.db
+os.environ.setdefault("CIAOHOST_DATABASE_URL", "sqlite://")
+
+from utils import analytics_frames, json_cache, json_database
+from utils.analytics_frames import PROPERTY_COLUMNS, get_properties_frame
+
+
+@pytest.fixture
+def database_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "proprieta.json")
+    monkeypatch.setattr(json_database, "DATABASE_FILE", path)
+    monkeypatch.setattr(json_database, "STORAGE_MODE", "journal")
+    monkeypatch.setattr(json_database, "STORAGE_BACKEND", "json")
+    monkeypatch.setattr(analytics_frames, "_properties", (None, None))
+    yield path
+    json_cache.invalidate(path)
+
+
+def test_empty_database_gives_typed_empty_frame(database_file):
+    frame = get_properties_frame()
+
+    assert frame.empty
+    assert list(frame.columns) == list(PROPERTY_COLUMNS)
+    assert {column: str(dtype) for column, dtype in frame.dtypes.items()} == PROPERTY_COLUMNS
+
+
+def test_frame_is_shared_until_the_database_changes(database_file):
+    json_database.save_database({"properties": {
+        "p1": {"name": "Casetta Viola", "type": "Appartamento"},
+        "p2": {"name": "Villa Rosa", "type": "Villa"},
+    }, "users": {}})
+
+    frame = get_properties_frame()
+    assert get_properties_frame() is frame, "Senza modifiche la tabella non va ricostruita né copiata"
+    assert list(frame["id"]) == ["p1", "p2"]
+    assert frame["type"].dtype == "category"
+    assert sorted(frame["type"].cat.categories) == ["Appartamento", "Villa"]
+
+    json_database.add_property({"id": "p3", "name": "Baita", "type": "Chalet"})
+
+    updated = get_properties_frame()
+    assert updated is not frame
+    assert list(updated["id"]) == ["p1", "p2", "p3"]
+    assert list(frame["id"]) == ["p1", "p2"], "La tabella già restituita non va modificata"
+
+
+def test_missing_fields_get_defaults(database_file):
+    json_database.save_database({"properties": {"p1": {"name": "Casetta Viola"}}, "users": {}})
+
+    [row] = get_properties_frame().to_dict("records")
+
+    assert row["type"] == "Non specificato"
+    assert row["city"] == "Non specificata"
+    assert row["status"] == "Attivo"
+    assert row["cleaning_fee"] == 30
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""Verifica l'indice delle disponibilità (utils/availability_index.py) e la matrice giornaliera (utils/availability_matrix.py) contro la scansione di tutte le prenotazioni."""
+
+import os
+import random
+import sys
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Evitiamo di toccare data/ciao_host.db
+os.environ.setdefault("CIAOHOST_DATABASE_URL", "sqlite://")
+
+import booking_handler
+from benchmarks.bench_availability_index import generate_bookings, generate_queries, scan_is_free
+from utils import availability_index, availability_matrix, booking_database
+from utils.availability_index import AvailabilityIndex
+from utils.availability_matrix import AvailabilityMatrix
+
+
+def booking(property_id, check_in, check_out, status="Confermata"):
+    return {
+        "property_id": property_id,
+        "check_in_date": check_in.strftime("%d/%m/%Y"),
+        "check_out_date": check_out.strftime("%d/%m/%Y"),
+        "status": status,
+    }
+
+
+@pytest.fixture
+def bookings_file(tmp_path, monkeypatch):
+    path = tmp_path / "prenotazioni.json"
+    monkeypatch.setattr(booking_database, "BOOKINGS_DB_FILE", str(path))
+    monkeypatch.setattr(booking_database, "STORAGE_BACKEND", "json")
+    monkeypatch.setattr(availability_index, "_index", None)
+    monkeypatch.setattr(availability_index, "_signature", None)
+    monkeypatch.setattr(availability_matrix, "_matrix", None)
+    monkeypatch.setattr(availability_matrix, "_signature", None)
+    return path
+
+
+def test_check_out_day_is_free_for_next_check_in():
+    index = AvailabilityIndex.from_bookings({
+        "b1": booking("p1", date(2025, 7, 1), date(2025, 7, 5)),
+    })
+
+    assert index.is_free("p1", date(2025, 7, 5), date(2025, 7, 8)), "Il giorno di check-out deve essere prenotabile"
+    assert index.is_free("p1", date(2025, 6, 28), date(2025, 7, 1)), "Il check-out può coincidere con il check-in altrui"
+    assert not index.is_free("p1", date(2025, 7, 4), date(2025, 7, 6))
+    assert not index.is_free("p1", date(2025, 6, 30), date(2025, 7, 2))
+    assert not index.is_free("p1", date(2025, 6, 1), date(2025, 8, 1)), "Un periodo che contiene il soggiorno non è libero"
+    assert index.is_free("p2", date(2025, 7, 1), date(2025, 7, 5)), "Un immobile senza prenotazioni è libero"
+
+
+def test_cancelled_and_invalid_bookings_do_not_occupy():
+    index = AvailabilityIndex.from_bookings({
+        "b1": booking("p1", date(2025, 7, 1), date(2025, 7, 5), status="Annullata"),
+        "b2": booking("p1", date(2025, 7, 1), date(2025, 7, 5), status="cancelled"),
+        "b3": {"property_id": "p1", "check_in_date": "non valida", "check_out_date": "05/07/2025"},
+    })
+
+    assert len(index) == 0
+    assert index.is_free("p1", date(2025, 7, 1), date(2025, 7, 5))
+
+
+def test_overlapping_stays_are_merged_and_split_on_remove():
+    index = AvailabilityIndex.from_bookings({
+        "b1": booking("p1", date(2025, 7, 1), date(2025, 7, 5)),
+        "b2": booking("p1", date(2025, 7, 5), date(2025, 7, 8)),
+        "b3": booking("p1", date(2025, 7, 3), date(2025, 7, 10)),
+    })
+    assert not index.is_free("p1", date(2025, 7, 8), date(2025, 7, 9))
+
+    index.remove_booking("b3")
+    assert index.is_free("p1", date(2025, 7, 8), date(2025, 7, 9)), "Il soggiorno tolto deve liberare le sue notti"
+    assert not index.is_free("p1", date(2025, 7, 4), date(2025, 7, 6))
+
+    # Spostare una prenotazione libera il vecchio periodo
+    index.apply_booking("b1", booking("p1", date(2025, 8, 1), date(2025, 8, 3)))
+    assert index.is_free("p1", date(2025, 7, 1), date(2025, 7, 5))
+    assert not index.is_free("p1", date(2025, 8, 2), date(2025, 8, 4))
+
+    # Annullarla la libera del tutto
+    index.apply_booking("b1", booking("p1", date(2025, 8, 1), date(2025, 8, 3), status="Cancellata"))
+    assert index.is_free("p1", date(2025, 8, 1), date(2025, 8, 3))
+
+
+def test_next_free_window_skips_occupied_blocks():
+    index = AvailabilityIndex.from_bookings({
+        "b1": booking("p1", date(2025, 7, 1), date(2025, 7, 5)),
+        "b2": booking("p1", date(2025, 7, 7), date(2025, 7, 10)),
+    })
+
+    assert index.next_free_window("p1", 2, date(2025, 7, 1)) == (date(2025, 7, 5), date(2025, 7, 7))
+    assert index.next_free_window("p1", 3, date(2025, 7, 1)) == (date(2025, 7, 10), date(2025, 7, 13))
+    assert index.next_free_window("p1", 3, date(2025, 6, 20)) == (date(2025, 6, 20), date(2025, 6, 23))
+    assert index.next_free_window("p2", 4, date(2025, 7, 1)) == (date(2025, 7, 1), date(2025, 7, 5))
+
+
+def test_index_matches_scan_after_random_updates():
+    random.seed(7)
+    property_ids = [f"p{i}" for i in range(5)]
+    bookings = generate_bookings(300, property_ids)
+    index = AvailabilityIndex.from_bookings(bookings)
+
+    booking_ids = list(bookings)
+    for booking_id in random.sample(booking_ids, 100):
+        if random.random() < 0.5:
+            index.remove_booking(booking_id)
+            del bookings[booking_id]
+        else:
+            moved = generate_bookings(1, property_ids).popitem()[1]
+            index.apply_booking(booking_id, moved)
+            bookings[booking_id] = moved
+
+    for query in generate_queries(2000, property_ids):
+        assert index.is_free(*query) == scan_is_free(bookings, *query), f"Risultato diverso dalla scansione per {query}"
+
+    # La finestra proposta è libera e nessun giorno prima di essa lo è
+    for property_id in property_ids:
+        start = date(2024, 3, 1)
+        check_in, check_out = index.next_free_window(property_id, 3, start)
+        assert scan_is_free(bookings, property_id, check_in, check_out)
+        day = start
+        while day < check_in:
+            assert not scan_is_free(bookings, property_id, day, day + timedelta(days=3))
+            day += timedelta(days=1)
+
+
+def test_index_matches_scan_on_a_large_dataset():
+    # I tempi sono misurati da benchmarks/bench_availability_index.py
+    random.seed(42)
+    property_ids = [f"p{i}" for i in range(500)]
+    bookings = generate_bookings(100000, property_ids)
+    queries = generate_queries(200, property_ids)
+    index = AvailabilityIndex.from_bookings(bookings)
+
+    results = [index.is_free(*query) for query in queries]
+
+    assert results == [scan_is_free(bookings, *query) for query in queries]
+    assert any(results) and not all(results), "Le query devono trovare periodi sia liberi sia occupati"
+
+
+def test_process_index_follows_add_booking_and_external_writes(bookings_file):
+    booking_database.save_bookings_database({"bookings": {
+        "b1": booking("p1", date(2025, 7, 1), date(2025, 7, 5)),
+    }})
+    assert not availability_index.is_available("p1", date(2025, 7, 2), date(2025, 7, 3))
+
+    # Scrittura di questo processo: l'indice viene aggiornato senza ricostruirlo
+    index = availability_index.get_availability_index()
+    booking_id = booking_database.add_booking(booking("p1", date(2025, 7, 10), date(2025, 7, 12)))
+    assert booking_id is not None
+    assert availability_index.get_availability_index() is index
+    assert not availability_index.is_available("p1", date(2025, 7, 11), date(2025, 7, 12))
+
+    # Scrittura esterna (altro processo): il file cambia e l'indice viene ricostruito
+    data = booking_database.load_bookings_database()
+    del data["bookings"]["b1"]
+    booking_database.save_bookings_database(data)
+    assert availability_index.is_available("p1", date(2025, 7, 2), date(2025, 7, 3))
+    assert availability_index.next_free_window("p1", 3, date(2025, 7, 9)) == (date(2025, 7, 12), date(2025, 7, 15))
+
+
+def test_add_booking_rejects_overlaps_under_the_file_lock(bookings_file):
+    booking_database.save_bookings_database({"bookings": {
+        "b1": booking("p1", date(2025, 7, 1), date(2025, 7, 5)),
+        "b2": booking("p1", date(2025, 7, 10), date(2025, 7, 12), status="Annullata"),
+    }})
+
+    with pytest.raises(booking_database.BookingConflictError):
+        booking_database.add_booking(booking("p1", date(2025, 7, 4), date(2025, 7, 6)), reject_overlaps=True)
+    assert set(booking_database.load_bookings_database()["bookings"]) == {"b1", "b2"}
+
+    assert booking_database.add_booking(booking("p1", date(2025, 7, 5), date(2025, 7, 7)), reject_overlaps=True)
+    assert booking_database.add_booking(booking("p1", date(2025, 7, 10), date(2025, 7, 12)), reject_overlaps=True), (
+        "Le prenotazioni annullate non occupano l'immobile"
+    )
+    assert booking_database.add_booking(booking("p2", date(2025, 7, 1), date(2025, 7, 5)), reject_overlaps=True)
+
+
+class SessionState(dict):
+    """Sostituto di st.session_state (accesso sia per chiave sia per attributo)"""
+
+    __getattr__ = dict.__getitem__
+    __setattr__ = dict.__setitem__
+
+
+class ThreadSessions(threading.local):
+    """Sostituto di streamlit con una sessione distinta per ogni thread"""
+
+    def __init__(self):
+        self.session_state = SessionState()
+
+
+def test_concurrent_chat_confirmations_book_the_dates_once(bookings_file, monkeypatch):
+    monkeypatch.setattr(booking_handler, "st", ThreadSessions())
+    check_in = date.today() + timedelta(days=30)
+    barrier = threading.Barrier(2)
+    replies = []
+
+    def confirm():
+        booking_handler.st.session_state.booking_state = {
+            "active": True,
+            "step": "confirmation",
+            "property_id": "p1",
+            "property_name": "Casetta Viola",
+            "data": {
+                **booking("p1", check_in, check_in + timedelta(days=3)),
+                "property_name": "Casetta Viola",
+                "guests": 2,
+            },
+        }
+        barrier.wait(5)
+        replies.append(booking_handler.handle_booking("sì"))
+
+    threads = [threading.Thread(target=confirm) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert len(replies) == 2
+    assert sum("Prenotazione confermata" in reply for reply in replies) == 1, replies
+    assert sum("Nel frattempo le date scelte sono state prenotate" in reply for reply in replies) == 1, replies
+    assert len(booking_database.load_bookings_database()["bookings"]) == 1, "Le stesse date non vanno prenotate due volte"
+
+
+def free_by_scan(bookings, property_ids, check_in, check_out):
+    return [property_id for property_id in property_ids if scan_is_free(bookings, property_id, check_in, check_out)]
+
+
+def test_matrix_matches_scan_and_rebuild_after_random_updates():
+    random.seed(13)
+    origin = date(2024, 1, 1)
+    property_ids = [f"p{i}" for i in range(8)]
+    bookings = generate_bookings(400, property_ids)
+    matrix = AvailabilityMatrix.from_bookings(bookings, property_ids, origin=origin, horizon_days=800)
+
+    for booking_id in random.sample(list(bookings), 150):
+        if random.random() < 0.5:
+            matrix.remove_booking(booking_id)
+            del bookings[booking_id]
+        else:
+            moved = generate_bookings(1, property_ids).popitem()[1]
+            matrix.apply_booking(booking_id, moved)
+            bookings[booking_id] = moved
+
+    rebuilt = AvailabilityMatrix.from_bookings(bookings, property_ids, origin=origin, horizon_days=800)
+    assert (matrix._occupied[:len(property_ids)] == rebuilt._occupied[:len(property_ids)]).all(), (
+        "La matrice aggiornata deve coincidere con quella ricostruita"
+    )
+    for _, check_in, check_out in generate_queries(300, property_ids):
+        assert matrix.free_properties(check_in, check_out, property_ids) == free_by_scan(
+            bookings, property_ids, check_in, check_out
+        ), f"Risultato diverso dalla scansione per {check_in} - {check_out}"
+
+
+def test_remove_booking_keeps_overlapping_stays_of_same_property():
+    origin = date(2025, 7, 1)
+    matrix = AvailabilityMatrix.from_bookings({
+        "b1": booking("p1", date(2025, 7, 1), date(2025, 7, 5)),
+        "b2": booking("p1", date(2025, 7, 3), date(2025, 7, 8)),
+        "b3": booking("p2", date(2025, 7, 1), date(2025, 7, 8)),
+    }, origin=origin, horizon_days=30)
+
+    matrix.remove_booking("b2")
+
+    assert matrix.free_properties(date(2025, 7, 5), date(2025, 7, 8), ["p1", "p2"]) == ["p1"]
+    assert matrix.free_properties(date(2025, 7, 4), date(2025, 7, 5), ["p1", "p2"]) == [], (
+        "Le notti ancora occupate da b1 e b3 non devono essere liberate"
+    )
+
+
+def test_advance_marks_stays_entering_the_horizon():
+    stays = {
+        "b1": booking("p1", date(2025, 7, 2), date(2025, 7, 4)),
+        "b2": booking("p1", date(2025, 7, 12), date(2025, 7, 15)),
+    }
+    matrix = AvailabilityMatrix.from_bookings(stays, origin=date(2025, 7, 1), horizon_days=10)
+
+    matrix.advance(date(2025, 7, 6))
+
+    expected = AvailabilityMatrix.from_bookings(stays, origin=date(2025, 7, 6), horizon_days=10)
+    assert (matrix._occupied == expected._occupied).all()
+    assert matrix.free_properties(date(2025, 7, 13), date(2025, 7, 14), ["p1"]) == []
+    assert matrix.free_properties(date(2025, 7, 8), date(2025, 7, 12), ["p1"]) == ["p1"]
+
+
+def test_find_free_properties_follows_add_booking_and_falls_back_beyond_horizon(bookings_file):
+    today = date.today()
+    booking_database.save_bookings_database({"bookings": {
+        "b1": booking("p1", today + timedelta(days=3), today + timedelta(days=6)),
+        "b2": booking("p2", today + timedelta(days=2000), today + timedelta(days=2005)),
+    }})
+    property_ids = ["p1", "p2"]
+
+    assert availability_matrix.find_free_properties(property_ids, today + timedelta(days=4), today + timedelta(days=5)) == ["p2"]
+
+    matrix = availability_matrix.get_availability_matrix()
+    booking_database.add_booking(booking("p2", today + timedelta(days=4), today + timedelta(days=5)))
+    assert availability_matrix.get_availability_matrix() is matrix, "add_booking non deve ricostruire la matrice"
+    assert availability_matrix.find_free_properties(property_ids, today + timedelta(days=4), today + timedelta(days=5)) == []
+
+    # Periodo oltre l'orizzonte: risponde l'indice per intervalli
+    far = today + timedelta(days=2001)
+    assert availability_matrix.find_free_properties(property_ids, far, far + timedelta(days=1)) == ["p1"]
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Verifica backup incrementale e ripristino di utils/backup.py."""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Evitiamo di toccare data/ciao_host.db
+os.environ.setdefault("CIAOHOST_DATABASE_URL", "sqlite://")
+
+from utils import backup, booking_database, json_cache, json_database, json_writer, message_service, price_calendar
+
+CATEGORIES = ("Immobili", "Prenotazioni", "Chat e Comunicazioni")
+
+
+@pytest.fixture
+def app_dirs(tmp_path, monkeypatch):
+    """Progetto con il database degli immobili accanto ai moduli e dati relativi alla cartella di lavoro"""
+    project = tmp_path / "progetto"
+    workdir = tmp_path / "lavoro"
+    project.mkdir()
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)
+    monkeypatch.setattr(backup, "PROJECT_ROOT", str(project))
+    monkeypatch.setattr(json_database, "DATABASE_FILE", str(project / "proprieta.json"))
+    monkeypatch.setattr(json_database, "STORAGE_MODE", "journal")
+    monkeypatch.setattr(json_database, "STORAGE_BACKEND", "json")
+    monkeypatch.setattr(booking_database, "BOOKINGS_DB_FILE", "prenotazioni.json")
+    monkeypatch.setattr(booking_database, "STORAGE_BACKEND", "json")
+    monkeypatch.setattr(message_service, "MESSAGE_LOG_DIR", "data")
+    monkeypatch.setattr(message_service, "MESSAGE_LOG_FILE", os.path.join("data", "message_logs.jsonl"))
+    monkeypatch.setattr(message_service, "_message_indexes", {})
+    yield {"project": project, "workdir": workdir, "backups": str(tmp_path / "backups")}
+    json_cache.invalidate()
+
+
+def write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def read_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def create_app_data():
+    write_json(json_database.DATABASE_FILE, {"properties": {"p1": {"name": "Casetta Viola"}}, "users": {}})
+    write_json(booking_database.BOOKINGS_DB_FILE, {"bookings": {"b1": {"property_id": "p1"}}})
+    os.makedirs("data", exist_ok=True)
+    with open(message_service.MESSAGE_LOG_FILE, "w", encoding="utf-8") as f:
+        f.write('{"id": "msg_1", "type": "notification"}\n')
+
+
+def test_backup_and_replace_restore_round_trip(app_dirs):
+    create_app_data()
+    created = backup.create_backup(CATEGORIES, backup_dir=app_dirs["backups"])
+    assert created["stored"] == 3 and created["reused"] == 0
+    assert {(entry["path"], entry["base"]) for entry in created["files"]} == {
+        ("proprieta.json", "root"), ("prenotazioni.json", "cwd"), ("data/message_logs.jsonl", "cwd"),
+    }, "Il database accanto ai moduli va salvato relativo al progetto"
+
+    json_database.add_property({"id": "p2", "name": "Villa Rosa"})
+    write_json(booking_database.BOOKINGS_DB_FILE, {"bookings": {}})
+    os.remove(message_service.MESSAGE_LOG_FILE)
+
+    result = backup.restore_backup(created["path"], backup_dir=app_dirs["backups"])
+
+    assert result == {"restored": 3, "skipped": 0}
+    assert not os.path.exists(json_database.get_journal_file()), "Il journal locale non va riapplicato sul backup"
+    assert list(json_database.get_database_view()["properties"]) == ["p1"]
+    assert list(booking_database.get_all_bookings()) == ["b1"]
+    assert [log["id"] for log in message_service.get_message_logs()] == ["msg_1"]
+
+
+def test_incremental_backup_reuses_unchanged_files(app_dirs):
+    create_app_data()
+    first = backup.create_backup(CATEGORIES, backup_dir=app_dirs["backups"])
+    write_json(booking_database.BOOKINGS_DB_FILE, {"bookings": {"b1": {"property_id": "p1"}, "b2": {"property_id": "p1"}}})
+
+    second = backup.create_backup(CATEGORIES, backup_dir=app_dirs["backups"])
+
+    assert second["parent"] == first["name"]
+    assert (second["stored"], second["reused"]) == (1, 2)
+    assert [manifest["name"] for manifest in backup.list_backups(app_dirs["backups"])] == [second["name"], first["name"]]
+
+    # Il ripristino del secondo backup legge i file invariati dal primo archivio
+    write_json(json_database.DATABASE_FILE, {"properties": {}, "users": {}})
+    with open(second["path"], "rb") as uploaded:
+        backup.restore_backup(uploaded, backup_dir=app_dirs["backups"])
+    assert read_json(json_database.DATABASE_FILE)["properties"] == {"p1": {"name": "Casetta Viola"}}
+    assert set(read_json(booking_database.BOOKINGS_DB_FILE)["bookings"]) == {"b1", "b2"}
+
+    os.remove(first["path"])
+    with pytest.raises(ValueError, match="Backup precedente non trovato"):
+        backup.restore_backup(second["path"], backup_dir=app_dirs["backups"])
+
+
+def test_restore_from_another_working_directory(app_dirs, tmp_path, monkeypatch):
+    create_app_data()
+    created = backup.create_backup(CATEGORIES, backup_dir=app_dirs["backups"])
+    os.remove(json_database.DATABASE_FILE)
+
+    other = tmp_path / "altra_cartella"
+    other.mkdir()
+    monkeypatch.chdir(other)
+    backup.restore_backup(created["path"], backup_dir=app_dirs["backups"])
+
+    assert read_json(json_database.DATABASE_FILE)["properties"] == {"p1": {"name": "Casetta Viola"}}, (
+        "Il database del progetto va ripristinato al suo posto qualunque sia la cartella di lavoro"
+    )
+    assert read_json(other / "prenotazioni.json")["bookings"] == {"b1": {"property_id": "p1"}}
+
+
+def test_manifest_paths_cannot_leave_their_base():
+    assert backup._local_path({"path": "data/message_logs.jsonl"}) == os.path.join("data", "message_logs.jsonl")
+    for path in ("../fuori.json", "/etc/passwd"):
+        with pytest.raises(ValueError, match="Percorso non valido"):
+            backup._local_path({"path": path, "base": "cwd"})
+
+
+def test_merge_restore_keeps_existing_records(app_dirs):
+    create_app_data()
+    created = backup.create_backup(("Immobili", "Prenotazioni"), backup_dir=app_dirs["backups"])
+    write_json(json_database.DATABASE_FILE, {"properties": {"p1": {"name": "Nome nuovo"}, "p3": {"name": "Baita"}}, "users": {}})
+    write_json(booking_database.BOOKINGS_DB_FILE, {"bookings": {"b9": {"property_id": "p3"}}})
+
+    backup.restore_backup(created["path"], mode="merge", backup_dir=app_dirs["backups"])
+
+    properties = json_database.load_database()["properties"]
+    assert properties == {"p1": {"name": "Nome nuovo"}, "p3": {"name": "Baita"}}, "I record esistenti prevalgono"
+    assert set(booking_database.get_all_bookings()) == {"b1", "b9"}
+
+
+def test_merge_restore_applies_the_backup_journal(app_dirs):
+    create_app_data()
+    # Modifiche ancora nel journal al momento del backup
+    json_database.add_property({"id": "p2", "name": "Villa Rosa"})
+    json_database.delete_property("p1")
+    created = backup.create_backup(("Immobili",), backup_dir=app_dirs["backups"])
+    assert os.path.exists(json_database.get_journal_file())
+    write_json(json_database.DATABASE_FILE, {"properties": {"p3": {"name": "Baita"}}, "users": {}})
+    os.remove(json_database.get_journal_file())
+
+    backup.restore_backup(created["path"], mode="merge", backup_dir=app_dirs["backups"])
+
+    properties = json_database.load_database()["properties"]
+    assert set(properties) == {"p2", "p3"}, "Il journal del backup va applicato allo snapshot prima dell'unione"
+    assert not os.path.exists(json_database.get_journal_file())
+
+
+def test_price_calendar_is_archived_under_its_lock(app_dirs, monkeypatch):
+    calendar_dir = os.path.join("data", "price_calendar")
+    monkeypatch.setattr(price_calendar, "PRICE_CALENDAR_DIR", calendar_dir)
+    price_calendar.PriceCalendar(calendar_dir).write_property("p1", [{"date": "2026-01-01", "price": 100, "status": "available"}])
+    lock = os.path.abspath(os.path.join(calendar_dir, "meta.json")) + ".lock"
+    copied = {}
+    backup_file = backup._backup_file
+
+    def record_lock(tar, name, category, path, read_path, *args):
+        copied[os.path.basename(path)] = lock in json_writer._held_locks.paths
+        return backup_file(tar, name, category, path, read_path, *args)
+
+    monkeypatch.setattr(backup, "_backup_file", record_lock)
+    backup.create_backup(("Prezzi",), backup_dir=app_dirs["backups"])
+
+    assert copied == {"meta.json": True, "prices.f32": True, "status.u8": True}
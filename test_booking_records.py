@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Verifica i record tipizzati di utils/booking_records.py e la conversione delle date in formati vecchi."""
+
+import json
+import os
+import sys
+from datetime import date, datetime
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Evitiamo di toccare data/ciao_host.db
+os.environ.setdefault("CIAOHOST_DATABASE_URL", "sqlite://")
+
+from utils import booking_database
+from utils.booking_records import BookingRecord, parse_booking_date, parse_date, to_records
+
+
+@pytest.fixture
+def bookings_file(tmp_path, monkeypatch):
+    path = tmp_path / "prenotazioni.json"
+    monkeypatch.setattr(booking_database, "BOOKINGS_DB_FILE", str(path))
+    monkeypatch.setattr(booking_database, "STORAGE_BACKEND", "json")
+    return path
+
+
+def test_parse_booking_date_accepts_every_stored_format():
+    expected = date(2025, 7, 1)
+    for value in ("01/07/2025", "2025-07-01", "01-07-2025", " 01/07/2025 ", expected, datetime(2025, 7, 1, 15, 30)):
+        assert parse_booking_date(value) == expected, value
+
+
+def test_parse_booking_date_returns_none_for_invalid_values():
+    for value in (None, "", "31/02/2025", "domani", 20250701, ["01/07/2025"], {"data": "01/07/2025"}):
+        assert parse_booking_date(value) is None, value
+
+
+def test_parse_date_also_accepts_iso_timestamps():
+    assert parse_date("2025-07-01T10:30:00") == date(2025, 7, 1)
+    assert parse_date("2025-07-01 10:30") == date(2025, 7, 1)
+    assert parse_date("   ") is None
+
+
+def test_record_from_json_and_sql_formats():
+    json_record = BookingRecord.from_dict("b1", {
+        "property_id": "p1",
+        "check_in_date": "01/07/2025",
+        "check_out_date": "05/07/2025",
+        "guests": "3",
+        "user_email": "mario.rossi@example.com",
+        "total_price": "480.5",
+    })
+    sql_record = BookingRecord.from_dict(None, {
+        "id": "b2",
+        "property_id": "p1",
+        "checkin_date": "2025-07-01",
+        "checkout_date": "2025-07-05",
+        "guest_name": "Anna",
+        "guests": None,
+        "total_price": None,
+    })
+
+    assert (json_record.check_in, json_record.check_out) == (date(2025, 7, 1), date(2025, 7, 5))
+    assert (json_record.guests, json_record.total_price, json_record.nights) == (3, 480.5, 4)
+    assert json_record.guest_name == "mario.rossi", "Senza nome l'ospite si ricava dall'email"
+    assert (sql_record.id, sql_record.check_in, sql_record.guest_name) == ("b2", date(2025, 7, 1), "Anna")
+    assert (sql_record.guests, sql_record.total_price) == (1, 0.0)
+    with pytest.raises(AttributeError):
+        json_record.status = "Annullata"
+
+
+def test_record_with_invalid_dates_has_no_nights_and_no_overlap():
+    record = BookingRecord.from_dict("b1", {"check_in_date": "05/07/2025", "check_out_date": "non valida"})
+
+    assert record.check_out is None
+    assert record.nights == 0
+    assert not record.overlaps(date(2025, 1, 1), date(2025, 12, 31))
+
+
+def test_overlaps_is_inclusive_of_both_ends():
+    record = BookingRecord.from_dict("b1", {"check_in_date": "01/07/2025", "check_out_date": "05/07/2025"})
+
+    assert record.overlaps(date(2025, 7, 5), date(2025, 7, 9))
+    assert record.overlaps(date(2025, 6, 20), date(2025, 7, 1))
+    assert not record.overlaps(date(2025, 7, 6), date(2025, 7, 9))
+
+
+def test_to_records_keeps_the_order_of_dicts_and_lists():
+    bookings = {"b2": {"property_id": "p2"}, "b1": {"property_id": "p1"}}
+
+    assert [record.id for record in to_records(bookings)] == ["b2", "b1"]
+    assert [record.id for record in to_records([{"id": "b3"}, {"id": "b4"}])] == ["b3", "b4"]
+
+
+def test_legacy_dates_are_rewritten_once_on_load(bookings_file):
+    with open(bookings_file, "w", encoding="utf-8") as f:
+        json.dump({"bookings": {
+            "b1": {"property_id": "p1", "check_in_date": "2025-07-01", "check_out_date": "05-07-2025"},
+            "b2": {"property_id": "p1", "check_in_date": "10/07/2025", "check_out_date": "12/07/2025"},
+            "b3": {"property_id": "p1", "check_in_date": "non valida", "check_out_date": "12/07/2025"},
+        }}, f)
+
+    records = booking_database.get_booking_records()
+
+    assert (records["b1"].check_in, records["b1"].check_out) == (date(2025, 7, 1), date(2025, 7, 5))
+    with open(bookings_file, encoding="utf-8") as f:
+        saved = json.load(f)["bookings"]
+    assert (saved["b1"]["check_in_date"], saved["b1"]["check_out_date"]) == ("01/07/2025", "05/07/2025")
+    assert saved["b2"]["check_in_date"] == "10/07/2025"
+    assert saved["b3"]["check_in_date"] == "non valida", "Le date non valide restano come sono"
+
+    mtime = os.stat(bookings_file).st_mtime_ns
+    booking_database.get_booking_records()
+    assert os.stat(bookings_file).st_mtime_ns == mtime, "Con le date già convertite il file non va riscritto"
+    assert booking_database.normalize_booking_dates() == 0
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Verifica la unit of work (session_scope) e le scritture in blocco di utils/database.py, compreso il rollback."""
+
+import os
+import sys
+from datetime import date, datetime
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Il modulo crea il suo motore all'import: evitiamo di toccare data/ciao_host.db
+os.environ.setdefault("CIAOHOST_DATABASE_URL", "sqlite://")
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from utils import database
+from utils.database import (
+    Booking, CleaningService, CleaningTask, Invoice, Property, add_bookings_bulk, create_database_engine,
+    create_invoices_for_bookings, migrate_schema, schedule_cleanings_bulk, session_scope,
+)
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    test_engine = create_database_engine(f"sqlite:///{tmp_path / 'bulk.db'}", "production")
+    migrate_schema(test_engine)
+    monkeypatch.setattr(database, "Session", sessionmaker(bind=test_engine))
+    with session_scope() as session:
+        session.add(Property(id="p1", name="Casetta Viola", base_price=100.0))
+    yield test_engine
+    test_engine.dispose()
+
+
+def booking_data(i, **changes):
+    data = {
+        "property_id": "p1",
+        "guest_name": f"Ospite {i}",
+        "checkin_date": "2025-07-01",
+        "checkout_date": date(2025, 7, 5),
+        "price_per_night": 100.0,
+        "total_price": 400.0,
+    }
+    data.update(changes)
+    return data
+
+
+def count(model):
+    session = database.get_db_session()
+    try:
+        return session.query(model).count()
+    finally:
+        session.close()
+
+
+def test_session_scope_commits_on_success_and_rolls_back_on_error(engine):
+    with session_scope() as session:
+        session.add(Property(id="p2", name="Villa Rosa", base_price=150.0))
+
+    with pytest.raises(RuntimeError):
+        with session_scope() as session:
+            session.add(Property(id="p3", name="Baita", base_price=90.0))
+            session.flush()
+            raise RuntimeError("errore a metà")
+
+    assert count(Property) == 2, "La proprietà aggiunta prima dell'errore va annullata"
+
+
+def test_bulk_bookings_get_model_defaults_and_invoices(engine):
+    bookings = add_bookings_bulk([booking_data(0), booking_data(1, status="Completata", guests=3)])
+
+    assert [booking["guest_name"] for booking in bookings] == ["Ospite 0", "Ospite 1"]
+    assert bookings[0]["checkin_date"] == bookings[1]["checkin_date"] == "2025-07-01"
+    assert (bookings[0]["guests"], bookings[0]["status"], bookings[0]["payment_status"]) == (1, "confermata", "In attesa")
+    assert (bookings[1]["guests"], bookings[1]["status"]) == (3, "Completata")
+    assert bookings[0]["id"] != bookings[1]["id"] and bookings[0]["created_at"]
+    assert count(Booking) == 2 and count(Invoice) == 2
+
+    assert add_bookings_bulk([booking_data(2)], create_invoices=False)
+    assert count(Booking) == 3 and count(Invoice) == 2
+    assert add_bookings_bulk([]) == []
+
+
+def test_bulk_bookings_reject_unknown_keys_like_add_booking(engine):
+    with pytest.raises(TypeError, match="ospite"):
+        add_bookings_bulk([booking_data(0), booking_data(1, ospite="Anna")])
+    with pytest.raises(TypeError, match="ospite"):
+        database.add_booking(booking_data(2, ospite="Anna"))
+
+    assert count(Booking) == 0
+
+
+def test_failure_mid_batch_rolls_back_every_booking(engine):
+    with pytest.raises(IntegrityError):
+        add_bookings_bulk([booking_data(0), booking_data(1, guest_name=None), booking_data(2)])
+
+    assert count(Booking) == 0 and count(Invoice) == 0
+
+
+def test_invoice_failure_rolls_back_the_bookings_too(engine, monkeypatch):
+    invoice_values = database._invoice_values
+    calls = []
+
+    def failing_invoice_values(booking, invoice_number):
+        calls.append(booking.id)
+        if len(calls) == 2:
+            raise ValueError("totale non valido")
+        return invoice_values(booking, invoice_number)
+
+    monkeypatch.setattr(database, "_invoice_values", failing_invoice_values)
+
+    with pytest.raises(ValueError):
+        add_bookings_bulk([booking_data(i) for i in range(3)])
+
+    assert count(Booking) == 0 and count(Invoice) == 0
+    with session_scope() as session:
+        assert database.allocate_invoice_numbers(session, year=datetime.now().year) == [f"INV-{datetime.now().year}-0001"], (
+            "Anche i numeri di fattura riservati vanno annullati"
+        )
+
+
+def test_create_invoices_for_bookings_skips_existing_and_missing(engine):
+    bookings = add_bookings_bulk([booking_data(i) for i in range(2)], create_invoices=False)
+    first = database.create_invoice_for_booking(bookings[0]["id"])
+
+    invoices = create_invoices_for_bookings([bookings[0]["id"], "inesistente", bookings[1]["id"], bookings[1]["id"]])
+
+    assert [invoice["booking_id"] for invoice in invoices] == [bookings[0]["id"], bookings[1]["id"]]
+    assert invoices[0]["invoice_number"] == first["invoice_number"], "La fattura esistente va restituita, non duplicata"
+    assert count(Invoice) == 2
+
+
+def test_create_invoices_shares_the_callers_transaction(engine):
+    [booking] = add_bookings_bulk([booking_data(0)], create_invoices=False)
+
+    with pytest.raises(RuntimeError):
+        with session_scope() as session:
+            assert len(create_invoices_for_bookings([booking["id"]], session)) == 1
+            raise RuntimeError("errore dopo le fatture")
+
+    assert count(Invoice) == 0
+
+
+def test_bulk_cleanings_use_the_default_service(engine):
+    with session_scope() as session:
+        session.add(CleaningService(id="s1", name="Pulizie Rapide", default=True))
+
+    tasks = schedule_cleanings_bulk([
+        {"property_id": "p1", "scheduled_date": datetime(2025, 7, 5, 11)},
+        {"property_id": "p1", "scheduled_date": datetime(2025, 7, 6, 11), "service_id": None, "notes": "Cambio biancheria"},
+    ])
+
+    assert [task["cleaning_service_id"] for task in tasks] == ["s1", "s1"]
+    assert [task["status"] for task in tasks] == ["Programmata", "Programmata"]
+    assert [task["notes"] for task in tasks] == ["Pulizia programmata manualmente", "Cambio biancheria"]
+    assert count(CleaningTask) == 2
+    assert schedule_cleanings_bulk([]) == []
+
+
+def test_failed_cleaning_batch_inserts_nothing(engine):
+    with pytest.raises(IntegrityError):
+        schedule_cleanings_bulk([
+            {"property_id": "p1", "scheduled_date": datetime(2025, 7, 5, 11)},
+            {"property_id": "p1", "scheduled_date": None},
+        ])
+
+    assert count(CleaningTask) == 0
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Verifica la numerazione delle fatture con il contatore per anno di utils/database.py."""
+
+import os
+import sys
+import threading
+from datetime import date, datetime
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Il modulo crea il suo motore all'import: evitiamo di toccare data/ciao_host.db
+os.environ.setdefault("CIAOHOST_DATABASE_URL", "sqlite://")
+
+from sqlalchemy.orm import sessionmaker
+
+from utils import database
+from utils.database import Booking, Invoice, allocate_invoice_numbers, create_database_engine, migrate_schema
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    test_engine = create_database_engine(f"sqlite:///{tmp_path / 'invoices.db'}", "production")
+    migrate_schema(test_engine)
+    monkeypatch.setattr(database, "Session", sessionmaker(bind=test_engine))
+    yield test_engine
+    test_engine.dispose()
+
+
+def add_bookings(count, prefix="b"):
+    session = database.get_db_session()
+    for i in range(count):
+        session.add(Booking(
+            id=f"{prefix}{i}", property_id="p1", guest_name=f"Ospite {i}",
+            checkin_date=date(2025, 7, 1), checkout_date=date(2025, 7, 5),
+            price_per_night=100.0, total_price=400.0,
+        ))
+    session.commit()
+    session.close()
+    return [f"{prefix}{i}" for i in range(count)]
+
+
+def test_numbers_are_consecutive_per_year(engine):
+    with database.session_scope() as session:
+        assert allocate_invoice_numbers(session, year=2025) == ["INV-2025-0001"]
+        assert allocate_invoice_numbers(session, 3, year=2025) == ["INV-2025-0002", "INV-2025-0003", "INV-2025-0004"]
+        assert allocate_invoice_numbers(session, year=2026) == ["INV-2026-0001"], "Ogni anno ha il suo contatore"
+        assert allocate_invoice_numbers(session, 0, year=2025) == []
+
+
+def test_first_allocation_continues_after_legacy_numbers(engine):
+    add_bookings(2)
+    session = database.get_db_session()
+    session.add(Invoice(booking_id="b0", invoice_number="INV-2025-0007", date=date(2025, 7, 1), amount=400.0))
+    session.add(Invoice(booking_id="b1", invoice_number="INV-2024-0042", date=date(2024, 7, 1), amount=400.0))
+    session.commit()
+    session.close()
+
+    with database.session_scope() as session:
+        assert allocate_invoice_numbers(session, year=2025) == ["INV-2025-0008"]
+
+
+def test_rollback_returns_the_reserved_numbers(engine):
+    session = database.get_db_session()
+    allocate_invoice_numbers(session, 5, year=2025)
+    session.rollback()
+    session.close()
+
+    with database.session_scope() as session:
+        assert allocate_invoice_numbers(session, year=2025) == ["INV-2025-0001"]
+
+
+def test_create_invoice_is_idempotent_and_skips_missing_bookings(engine):
+    add_bookings(1)
+    year = datetime.now().year
+
+    invoice = database.create_invoice_for_booking("b0")
+    assert invoice["invoice_number"] == f"INV-{year}-0001"
+    assert database.create_invoice_for_booking("b0")["invoice_number"] == invoice["invoice_number"]
+    assert database.create_invoice_for_booking("inesistente") is None
+
+    add_bookings(1, prefix="c")
+    assert database.create_invoice_for_booking("c0")["invoice_number"] == f"INV-{year}-0002", (
+        "I tentativi senza fattura non devono consumare numeri"
+    )
+
+
+def test_batch_reserves_one_block_and_keeps_existing_invoices(engine):
+    booking_ids = add_bookings(4)
+    year = datetime.now().year
+    first = database.create_invoice_for_booking("b2")
+
+    invoices = database.create_invoices_for_bookings(booking_ids + ["inesistente"])
+
+    assert [invoice["booking_id"] for invoice in invoices] == booking_ids
+    assert invoices[2]["invoice_number"] == first["invoice_number"]
+    assert sorted(invoice["invoice_number"] for invoice in invoices) == [f"INV-{year}-{i:04d}" for i in range(1, 5)]
+
+
+def test_concurrent_invoices_get_distinct_numbers(engine):
+    booking_ids = add_bookings(40)
+    errors = []
+
+    def create(chunk):
+        try:
+            for booking_id in chunk:
+                database.create_invoice_for_booking(booking_id)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=create, args=(booking_ids[i::4],)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors, errors
+    session = database.get_db_session()
+    numbers = [number for (number,) in session.query(Invoice.invoice_number)]
+    session.close()
+    assert len(numbers) == 40
+    assert len(set(numbers)) == 40, "Due fatture hanno lo stesso numero"
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""Verifica il journal di utils/json_database.py, la cache di utils/json_cache.py e le scritture di utils/json_writer.py."""
+
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Evitiamo di toccare data/ciao_host.db
+os.environ.setdefault("CIAOHOST_DATABASE_URL", "sqlite://")
+
+from utils import json_cache, json_database, json_writer
+from utils.json_writer import atomic_write_json, file_lock, update_json
+
+
+@pytest.fixture
+def database_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "proprieta.json")
+    monkeypatch.setattr(json_database, "DATABASE_FILE", path)
+    monkeypatch.setattr(json_database, "STORAGE_MODE", "journal")
+    monkeypatch.setattr(json_database, "STORAGE_BACKEND", "json")
+    yield path
+    json_cache.invalidate(path)
+
+
+def read_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def journal_entries(path):
+    with open(path + ".journal", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_journal_appends_single_records_without_rewriting_snapshot(database_file):
+    json_database.save_database({"properties": {"p0": {"name": "Esistente"}}, "users": {}})
+
+    json_database.add_property({"id": "p1", "name": "Casetta Viola", "city": "Roma"})
+    json_database.update_property("p1", {"name": "Casetta Viola 2", "city": "Roma"})
+    json_database.delete_property("p0")
+
+    assert read_json(database_file)["properties"] == {"p0": {"name": "Esistente"}}, "Lo snapshot non deve essere riscritto"
+    assert [(entry["op"], entry["id"]) for entry in journal_entries(database_file)] == [
+        ("put", "p1"), ("put", "p1"), ("delete", "p0"),
+    ]
+    assert json_database.get_property("p1")["name"] == "Casetta Viola 2"
+    assert json_database.get_property("p0") is None
+
+
+def test_journal_is_replayed_on_a_fresh_load(database_file):
+    json_database.save_database({"properties": {}, "users": {"u1": {"email": "a@b.it"}}})
+    json_database.add_property({"id": "p1", "name": "Casetta Viola"})
+    json_database.add_property({"id": "p2", "name": "Villa Rosa"})
+    json_database.delete_property("p2")
+
+    # Un nuovo processo non ha la cache: rilegge snapshot e journal
+    json_cache.invalidate(database_file)
+    db = json_database.load_database()
+
+    assert list(db["properties"]) == ["p1"]
+    assert db["users"] == {"u1": {"email": "a@b.it"}}
+
+
+def test_torn_last_journal_line_is_ignored(database_file):
+    json_database.save_database({"properties": {}, "users": {}})
+    json_database.add_property({"id": "p1", "name": "Casetta Viola"})
+    with open(database_file + ".journal", "a", encoding="utf-8") as f:
+        f.write('{"op":"put","id":"p2","data":{"na')
+
+    json_cache.invalidate(database_file)
+
+    assert list(json_database.get_database_view()["properties"]) == ["p1"]
+
+
+def test_append_after_torn_line_starts_a_new_line(database_file):
+    json_database.save_database({"properties": {}, "users": {}})
+    json_database.add_property({"id": "p1", "name": "Casetta Viola"})
+    with open(database_file + ".journal", "a", encoding="utf-8") as f:
+        f.write('{"op":"put","id":"p2","data":{"na')
+
+    json_database.add_property({"id": "p3", "name": "Baita"})
+    json_cache.invalidate(database_file)
+
+    assert list(json_database.get_database_view()["properties"]) == ["p1", "p3"], (
+        "La voce scritta dopo una riga troncata non deve andare persa"
+    )
+
+
+def test_journal_is_compacted_into_snapshot(database_file, monkeypatch):
+    monkeypatch.setattr(json_database, "JOURNAL_COMPACT_BYTES", 600)
+    json_database.save_database({"properties": {}, "users": {}})
+
+    for i in range(5):
+        json_database.add_property({"id": f"p{i}", "name": f"Immobile {i}"})
+
+    journal_file = database_file + ".journal"
+    assert not os.path.exists(journal_file) or os.path.getsize(journal_file) < 600, "Il journal non deve superare la soglia"
+    assert {"p0", "p1"} <= set(read_json(database_file)["properties"]), "Il journal oltre la soglia deve finire nello snapshot"
+    assert set(json_database.get_database_view()["properties"]) == {f"p{i}" for i in range(5)}
+
+    json_database.compact_database()
+    assert not os.path.exists(database_file + ".journal")
+    assert set(read_json(database_file)["properties"]) == {f"p{i}" for i in range(5)}
+
+
+def test_snapshot_mode_rewrites_file_without_journal(database_file, monkeypatch):
+    monkeypatch.setattr(json_database, "STORAGE_MODE", "snapshot")
+    json_database.save_database({"properties": {}, "users": {}})
+
+    json_database.add_property({"id": "p1", "name": "Casetta Viola"})
+    assert json_database.delete_property("p1")
+    json_database.add_property({"id": "p2", "name": "Villa Rosa"})
+
+    assert not os.path.exists(database_file + ".journal")
+    assert list(read_json(database_file)["properties"]) == ["p2"]
+
+
+def test_save_changes_writes_only_the_records_changed_by_the_session(database_file):
+    json_database.save_database({
+        "properties": {"p1": {"name": "Casetta Viola", "services": ["WiFi"]}, "p2": {"name": "Villa Rosa"}},
+        "users": {"a@b.it": "segreta"},
+    })
+    base = json_database.get_database_view()
+    session = json_database.load_database()
+
+    # Nel frattempo un'altra pagina salva un immobile e un utente
+    json_database.add_property({"id": "p3", "name": "Baita"})
+    json_database.save_changes(json_database.get_database_view(), {
+        "properties": json_database.load_database()["properties"],
+        "users": {"a@b.it": "segreta", "c@d.it": "altra"},
+    })
+
+    session["properties"]["p1"]["services"].append("Piscina")
+    del session["properties"]["p2"]
+    session["users"]["e@f.it"] = "nuova"
+    assert json_database.save_changes(base, session) == 3
+
+    db = json_database.load_database()
+    assert set(db["properties"]) == {"p1", "p3"}, "L'immobile salvato da un'altra pagina non va perso"
+    assert db["properties"]["p1"]["services"] == ["WiFi", "Piscina"]
+    assert db["users"] == {"a@b.it": "segreta", "c@d.it": "altra", "e@f.it": "nuova"}
+    assert [entry["id"] for entry in journal_entries(database_file)] == ["p3", "p1", "p2"], (
+        "Gli immobili vanno salvati con una voce di journal ciascuno"
+    )
+    assert json_database.save_changes(json_database.get_database_view(), json_database.load_database()) == 0
+
+
+def test_cached_view_is_shared_until_the_file_changes(tmp_path):
+    path = str(tmp_path / "documento.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"a": 1}, f)
+    loads = []
+
+    def loader():
+        loads.append(path)
+        return read_json(path)
+
+    view = json_cache.load_cached(path, [path], loader)
+    version = json_cache.get_version(path)
+    assert json_cache.load_cached(path, [path], loader) is view
+    assert len(loads) == 1, "Un file invariato non deve essere riletto"
+
+    # Stessa dimensione, mtime diverso: la firma cambia comunque
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"a": 2}, f)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    new_view = json_cache.load_cached(path, [path], loader)
+    assert new_view["a"] == 2
+    assert json_cache.get_version(path) > version
+    assert len(loads) == 2
+
+    json_cache.invalidate(path)
+    assert json_cache.get_version(path) == 0
+
+
+def test_cached_view_is_read_only_and_thaw_returns_a_copy(database_file):
+    json_database.save_database({"properties": {"p1": {"name": "Casetta Viola", "services": ["WiFi"]}}, "users": {}})
+    view = json_database.get_database_view()
+
+    with pytest.raises(TypeError):
+        view["properties"]["p2"] = {}
+    assert view["properties"]["p1"]["services"] == ("WiFi",)
+
+    db = json_database.load_database()
+    db["properties"]["p1"]["services"].append("Piscina")
+    assert json_database.get_database_view() is view, "Modificare la copia non deve toccare la cache"
+    assert view["properties"]["p1"]["services"] == ("WiFi",)
+
+
+def test_journal_append_invalidates_cached_view(database_file):
+    json_database.save_database({"properties": {}, "users": {}})
+    view = json_database.get_database_view()
+    version = json_database.get_database_version()
+
+    json_database.add_property({"id": "p1", "name": "Casetta Viola"})
+
+    assert json_database.get_database_view() is not view
+    assert json_database.get_database_version() > version
+    assert "p1" in json_database.get_database_view()["properties"]
+
+
+def test_concurrent_updates_are_all_applied(tmp_path):
+    path = str(tmp_path / "contatore.json")
+    atomic_write_json(path, {"count": 0, "writers": []})
+
+    def increment(document):
+        document["count"] += 1
+        document["writers"].append(threading.current_thread().name)
+        return document["count"]
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(update_json(path, increment, lambda: read_json(path), window=0.01)))
+        for _ in range(50)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    document = read_json(path)
+    assert document["count"] == 50, "Nessun aggiornamento concorrente deve andare perso"
+    assert len(document["writers"]) == 50
+    assert sorted(results) == list(range(1, 51))
+
+
+def test_idle_update_does_not_wait_for_the_window(tmp_path):
+    path = str(tmp_path / "documento.json")
+    atomic_write_json(path, {"count": 0})
+
+    start = time.perf_counter()
+    _, before, after = update_json(
+        path, lambda document: document.update(count=1), lambda: read_json(path), window=1.0, with_signatures=True
+    )
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.5, f"Una scrittura senza concorrenza non deve attendere: {elapsed:.2f} s"
+    assert before != after
+    assert after == json_cache.file_signature(path)
+
+
+def test_failed_mutation_is_not_persisted(tmp_path):
+    path = str(tmp_path / "documento.json")
+    atomic_write_json(path, {"count": 0})
+    signature = json_cache.file_signature(path)
+
+    def broken(document):
+        document["count"] = 99
+        raise ValueError("modifica non valida")
+
+    with pytest.raises(ValueError):
+        update_json(path, broken, lambda: read_json(path))
+
+    assert read_json(path) == {"count": 0}
+    assert json_cache.file_signature(path) == signature, "Senza modifiche riuscite il file non va riscritto"
+
+
+def test_failed_mutation_in_a_batch_keeps_only_the_others(tmp_path):
+    path = str(tmp_path / "documento.json")
+    atomic_write_json(path, {"items": []})
+
+    def add(item):
+        def mutate(document):
+            document["items"].append(item)
+            if item == "rotto":
+                raise ValueError(item)
+            return item
+        return mutate
+
+    batch = {"mutations": [add("a"), add("rotto"), add("b")]}
+    document, changed = json_writer._apply_mutations(batch, lambda: read_json(path))
+
+    assert changed
+    assert document == {"items": ["a", "b"]}, "Le modifiche parziali di quella fallita non devono restare"
+    assert [succeeded for succeeded, _ in batch["results"]] == [True, False, True]
+
+
+def test_atomic_write_keeps_previous_file_on_error(tmp_path):
+    path = str(tmp_path / "documento.json")
+    atomic_write_json(path, {"count": 1})
+
+    with pytest.raises(TypeError):
+        atomic_write_json(path, {"count": object()})
+
+    assert read_json(path) == {"count": 1}
+    assert sorted(os.listdir(tmp_path)) == ["documento.json"], "Il file temporaneo va rimosso"
+
+
+def test_file_lock_is_reentrant(tmp_path):
+    path = str(tmp_path / "documento.json")
+    with file_lock(path):
+        with file_lock(path):
+            atomic_write_json(path, {"count": 1})
+    assert read_json(path) == {"count": 1}
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Verifica la migrazione JSON → SQLite di utils/json_to_sqlite.py e le letture con il backend sqlite."""
+
+import json
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Il modulo crea il suo motore all'import: evitiamo di toccare data/ciao_host.db
+os.environ.setdefault("CIAOHOST_DATABASE_URL", "sqlite://")
+
+from sqlalchemy.orm import sessionmaker
+
+from utils import availability_index, booking_database, database, json_cache, json_database
+from utils.database import Booking, Invoice, Property, create_database_engine, migrate_schema
+from utils.json_to_sqlite import iter_json_section, migrate
+
+PROPERTIES = {
+    "p1": {"name": "Casetta Viola", "location": "Roma", "price": 100, "cleaning_fee": 40, "services": ["WiFi"]},
+    "p2": {"name": "Villa Rosa", "location": "Firenze", "price": 200},
+}
+
+BOOKINGS = {
+    "b1": {"property_id": "p1", "check_in_date": "01/07/2025", "check_out_date": "05/07/2025",
+           "status": "Confermata", "user_email": "anna@example.com", "guests": 2},
+    "b2": {"property_id": "p2", "check_in_date": "2025-08-10", "check_out_date": "12-08-2025", "status": "Confermata"},
+    "b3": {"property_id": "p1", "check_in_date": "non valida", "check_out_date": "05/07/2025"},
+}
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'ciao_host.db'}", "production")
+    migrate_schema(engine)
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "Session", sessionmaker(bind=engine))
+    monkeypatch.setattr(json_database, "DATABASE_FILE", str(tmp_path / "proprieta.json"))
+    monkeypatch.setattr(json_database, "STORAGE_MODE", "journal")
+    monkeypatch.setattr(json_database, "STORAGE_BACKEND", "json")
+    monkeypatch.setattr(booking_database, "BOOKINGS_DB_FILE", str(tmp_path / "prenotazioni.json"))
+    monkeypatch.setattr(booking_database, "STORAGE_BACKEND", "json")
+    monkeypatch.setattr(availability_index, "_index", None)
+    monkeypatch.setattr(availability_index, "_signature", None)
+    json_database.save_database({"properties": PROPERTIES, "users": {}})
+    with open(booking_database.BOOKINGS_DB_FILE, "w", encoding="utf-8") as f:
+        json.dump({"bookings": BOOKINGS}, f)
+    yield engine
+    json_cache.invalidate()
+    engine.dispose()
+
+
+def rows(model):
+    session = database.get_db_session()
+    try:
+        return {row.id: row for row in session.query(model)}
+    finally:
+        session.close()
+
+
+def use_sqlite_backend(monkeypatch):
+    monkeypatch.setattr(json_database, "STORAGE_BACKEND", "sqlite")
+    monkeypatch.setattr(booking_database, "STORAGE_BACKEND", "sqlite")
+
+
+def test_streaming_reader_matches_json_load(tmp_path):
+    path = tmp_path / "documento.json"
+    document = {"altro": [1, 2.5, {"x": "}"}], "bookings": BOOKINGS, "coda": 12345}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+
+    for chunk_size in (1, 7, 1024):
+        assert dict(iter_json_section(str(path), "bookings", chunk_size)) == BOOKINGS, chunk_size
+    assert list(iter_json_section(str(path), "mancante")) == []
+
+
+def test_migration_copies_properties_and_valid_bookings(stores):
+    result = migrate(bind=stores)
+
+    assert (result["properties"], result["bookings"], result["skipped_bookings"]) == (2, 2, ["b3"])
+    properties = rows(Property)
+    assert (properties["p1"].city, properties["p1"].base_price, json.loads(properties["p1"].amenities)) == ("Roma", 100, ["WiFi"])
+    bookings = rows(Booking)
+    assert (bookings["b1"].checkin_date, bookings["b1"].guest_name, bookings["b1"].total_price) == (date(2025, 7, 1), "anna", 440)
+    assert (bookings["b2"].checkin_date, bookings["b2"].checkout_date) == (date(2025, 8, 10), date(2025, 8, 12))
+
+
+def test_migration_is_idempotent_and_keeps_sql_only_columns(stores):
+    migrate(bind=stores)
+    session = database.get_db_session()
+    session.query(Booking).filter(Booking.id == "b1").update({"payment_status": "Pagato"})
+    session.commit()
+    session.close()
+    assert database.create_invoice_for_booking("b1")
+
+    data = booking_database.load_bookings_database()
+    data["bookings"]["b1"]["guests"] = 4
+    booking_database.save_bookings_database(data)
+    result = migrate(bind=stores)
+
+    assert (result["properties"], result["bookings"]) == (2, 2)
+    bookings = rows(Booking)
+    assert len(bookings) == 2 and len(rows(Property)) == 2, "Rilanciare la migrazione non deve duplicare righe"
+    assert bookings["b1"].guests == 4, "Le colonne che arrivano dal JSON vanno aggiornate"
+    assert bookings["b1"].payment_status == "Pagato", "Le colonne gestite solo in SQL restano invariate"
+    assert [invoice.booking_id for invoice in rows(Invoice).values()] == ["b1"]
+
+
+def test_sqlite_backend_reads_the_migrated_rows(stores, monkeypatch):
+    migrate(bind=stores)
+    json_bookings = booking_database.get_all_bookings()
+    use_sqlite_backend(monkeypatch)
+
+    sql_bookings = booking_database.get_all_bookings()
+
+    assert set(sql_bookings) == {"b1", "b2"}
+    for field in ("property_id", "check_in_date", "status", "guests", "user_email"):
+        assert sql_bookings["b1"][field] == json_bookings["b1"][field], field
+    assert sql_bookings["b2"]["check_out_date"] == "12/08/2025"
+    assert set(booking_database.get_bookings_for_property("p2")) == {"b2"}
+    assert booking_database.get_booking_records()["b1"].nights == 4
+    assert {prop["id"]: prop["name"] for prop in json_database.get_all_properties()} == {
+        "p1": "Casetta Viola", "p2": "Villa Rosa",
+    }
+
+
+def test_writes_keep_both_backends_aligned(stores, monkeypatch):
+    migrate(bind=stores)
+    use_sqlite_backend(monkeypatch)
+
+    json_database.add_property({"id": "p3", "name": "Baita", "city": "Aosta", "base_price": 90})
+    booking_id = booking_database.add_booking({
+        "property_id": "p3", "check_in_date": "01/09/2025", "check_out_date": "03/09/2025", "status": "Confermata",
+    })
+    assert booking_database.update_booking("b2", {"status": "Annullata"})
+    json_database.delete_property("p2")
+
+    assert set(rows(Property)) == {"p1", "p3"}
+    assert booking_database.get_all_bookings()[booking_id]["property_name"] == "Baita"
+    assert booking_database.get_all_bookings()["b2"]["status"] == "Annullata"
+
+    # Gli indici in memoria leggono il file JSON, che resta la fonte dei dati
+    assert not availability_index.is_available("p3", date(2025, 9, 2), date(2025, 9, 4))
+    assert availability_index.is_available("p2", date(2025, 8, 10), date(2025, 8, 12))
+    assert set(json_database.get_database_view()["properties"]) == {"p1", "p3"}
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Verifica il log dei messaggi in JSON Lines di utils/message_service.py: segmenti, indici degli offset e migrazione."""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Evitiamo di toccare data/ciao_host.db
+os.environ.setdefault("CIAOHOST_DATABASE_URL", "sqlite://")
+
+from utils import message_service
+from utils.message_service import append_message_log, get_message_logs, load_message_logs
+
+
+@pytest.fixture
+def log_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(message_service, "MESSAGE_LOG_DIR", str(tmp_path))
+    monkeypatch.setattr(message_service, "MESSAGE_LOG_FILE", str(tmp_path / "message_logs.jsonl"))
+    monkeypatch.setattr(message_service, "LEGACY_MESSAGE_LOG_FILE", str(tmp_path / "message_logs.json"))
+    monkeypatch.setattr(message_service, "_message_indexes", {})
+    return tmp_path
+
+
+def message(i, property_id=None, message_type="notification"):
+    return {
+        "id": f"msg_{i}",
+        "timestamp": f"2025-07-01 10:{i // 60:02d}:{i % 60:02d}",
+        "message": f"Messaggio {i}",
+        "type": message_type,
+        "status": "simulated",
+        "property_id": property_id,
+    }
+
+
+def ids(logs):
+    return [log["id"] for log in logs]
+
+
+def test_messages_are_appended_and_read_newest_first(log_dir):
+    for i in range(6):
+        append_message_log(message(i, property_id=f"p{i % 2}", message_type="cleaning" if i % 3 == 0 else "notification"))
+
+    assert ids(get_message_logs(limit=3)) == ["msg_5", "msg_4", "msg_3"]
+    assert ids(get_message_logs(property_id="p0")) == ["msg_4", "msg_2", "msg_0"]
+    assert ids(get_message_logs(message_type="cleaning")) == ["msg_3", "msg_0"]
+    assert ids(get_message_logs(property_id="p1", message_type="cleaning")) == ["msg_3"]
+    assert get_message_logs(property_id="p9") == []
+
+    with open(log_dir / "message_logs.jsonl", encoding="utf-8") as f:
+        assert len(f.readlines()) == 6, "Ogni messaggio è una riga aggiunta in coda"
+
+
+def test_send_message_logs_a_simulated_message(log_dir):
+    result = message_service.send_message("3331234567", "Benvenuto!", property_data={"id": "p1"})
+
+    assert result["status"] == "simulated"
+    [log] = get_message_logs()
+    assert log["to"] == "+393331234567"
+    assert log["property_id"] == "p1"
+
+
+def test_index_reads_only_new_lines_and_waits_for_partial_ones(log_dir):
+    path = str(log_dir / "message_logs.jsonl")
+    append_message_log(message(0, property_id="p1"))
+    get_message_logs()
+    index = message_service._message_indexes[path]
+    indexed_size = index["size"]
+
+    append_message_log(message(1, property_id="p1"))
+    with open(path, "ab") as f:
+        f.write(b'{"id": "msg_in_scrittura", "type": "noti')
+
+    assert ids(get_message_logs(property_id="p1")) == ["msg_1", "msg_0"]
+    assert message_service._message_indexes[path] is index, "L'indice del file corrente va esteso, non ricostruito"
+    assert index["offsets"][0] == 0 and index["offsets"][1] == indexed_size
+    assert index["size"] < os.path.getsize(path), "La riga incompleta non va indicizzata"
+
+
+def test_rotation_archives_segments_with_persistent_indexes(log_dir, monkeypatch):
+    monkeypatch.setattr(message_service, "MESSAGE_LOG_MAX_BYTES", 400)
+    for i in range(20):
+        append_message_log(message(i, property_id=f"p{i % 3}"))
+
+    segments = sorted(log_dir.glob("message_logs.*.jsonl"))
+    assert len(segments) >= 3, "Il log oltre la soglia deve essere archiviato in segmenti"
+    for segment in segments:
+        assert os.path.getsize(segment) <= 400
+        assert os.path.exists(str(segment) + ".idx"), "I segmenti archiviati salvano il loro indice"
+
+    assert ids(load_message_logs()) == [f"msg_{i}" for i in range(20)]
+    assert ids(get_message_logs(limit=25)) == [f"msg_{i}" for i in reversed(range(20))]
+    assert ids(get_message_logs(property_id="p1", limit=4)) == ["msg_19", "msg_16", "msg_13", "msg_10"]
+
+    # Un nuovo processo rilegge gli indici salvati invece di scorrere i segmenti
+    monkeypatch.setattr(message_service, "_message_indexes", {})
+    scanned = []
+    index_tail = message_service._index_tail
+
+    def record_tail(index, path):
+        if index["size"] == 0:
+            scanned.append(path)
+        index_tail(index, path)
+
+    monkeypatch.setattr(message_service, "_index_tail", record_tail)
+
+    assert ids(get_message_logs(limit=25)) == [f"msg_{i}" for i in reversed(range(20))]
+    assert not set(scanned) & {str(segment) for segment in segments}, f"Segmenti riletti da capo: {scanned}"
+
+
+def test_stale_index_file_is_rebuilt(log_dir, monkeypatch):
+    monkeypatch.setattr(message_service, "MESSAGE_LOG_MAX_BYTES", 400)
+    for i in range(8):
+        append_message_log(message(i, property_id="p1"))
+    segment = sorted(log_dir.glob("message_logs.*.jsonl"))[0]
+    with open(str(segment) + ".idx", "w", encoding="utf-8") as f:
+        json.dump({"size": 1, "offsets": [], "property": {}, "type": {}}, f)
+
+    monkeypatch.setattr(message_service, "_message_indexes", {})
+
+    assert ids(get_message_logs(property_id="p1", limit=10)) == [f"msg_{i}" for i in reversed(range(8))]
+
+
+def test_legacy_json_log_is_migrated_once(log_dir):
+    legacy = [message(2), message(0), message(1)]
+    with open(log_dir / "message_logs.json", "w", encoding="utf-8") as f:
+        json.dump(legacy, f)
+
+    append_message_log(message(3))
+
+    assert ids(load_message_logs()) == ["msg_0", "msg_1", "msg_2", "msg_3"]
+    assert not os.path.exists(log_dir / "message_logs.json")
+    assert os.path.exists(log_dir / "message_logs.json.migrated")
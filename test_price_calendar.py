@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Verifica il calendario prezzi mappato in memoria di utils/price_calendar.py."""
+
+import json
+import os
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Evitiamo di toccare data/ciao_host.db
+os.environ.setdefault("CIAOHOST_DATABASE_URL", "sqlite://")
+
+from utils import price_calendar
+from utils.price_calendar import STATUSES, PriceCalendar, import_legacy_files
+
+
+@pytest.fixture
+def calendar_dir(tmp_path):
+    return str(tmp_path / "price_calendar")
+
+
+def pricing(start, prices, status="available"):
+    return [
+        {"date": (start + timedelta(days=i)).isoformat(), "price": price, "status": status}
+        for i, price in enumerate(prices)
+    ]
+
+
+def test_property_calendar_round_trip(calendar_dir):
+    calendar = PriceCalendar(calendar_dir)
+    start = date.today()
+    data = pricing(start, [100, 110.5, 120.25])
+    data[1]["status"] = "booked"
+
+    calendar.write_property("p1", data)
+
+    assert calendar.read_property("p1") == data
+    assert calendar.read_property("p2") == []
+    assert "p1" in calendar and "p2" not in calendar
+
+    # Una nuova scrittura sostituisce l'intero calendario dell'immobile
+    calendar.write_property("p1", pricing(start + timedelta(days=5), [90]))
+    assert calendar.read_property("p1") == pricing(start + timedelta(days=5), [90])
+
+
+def test_set_range_keeps_booked_days_unless_status_is_given(calendar_dir):
+    calendar = PriceCalendar(calendar_dir)
+    start = date.today()
+    calendar.write_property("p1", pricing(start, [100, 100], status="booked"))
+
+    calendar.set_range("p1", start, start + timedelta(days=3), 150)
+
+    statuses = [entry["status"] for entry in calendar.read_property("p1")]
+    assert statuses == ["booked", "booked", "available", "available"], "I giorni prenotati non devono tornare disponibili"
+    assert {entry["price"] for entry in calendar.read_property("p1")} == {150}
+
+    calendar.set_range("p1", start, start, 150, status="blocked")
+    assert calendar.read_property("p1")[0]["status"] == "blocked"
+
+
+def test_matrices_grow_for_new_rows_and_days(calendar_dir):
+    calendar = PriceCalendar(calendar_dir)
+    start = calendar.origin
+    for i in range(40):
+        calendar.write_property(f"p{i}", pricing(start, [i]))
+    assert calendar.capacity >= 40
+
+    # Date prima dell'inizio e dopo la fine dell'asse: l'asse si allarga senza perdere i dati
+    before = start - timedelta(days=30)
+    after = start + timedelta(days=calendar.days + 30)
+    calendar.set_range("p0", before, before, 80)
+    calendar.set_range("p1", after, after, 90)
+
+    assert calendar.origin == before
+    assert calendar.read_property("p0") == pricing(before, [80]) + pricing(start, [0])
+    assert calendar.read_property("p1") == pricing(start, [1]) + pricing(after, [90])
+    for i in range(2, 40):
+        assert calendar.read_property(f"p{i}") == pricing(start, [i])
+
+
+def test_other_instance_sees_growth_and_writes_into_new_files(calendar_dir):
+    first = PriceCalendar(calendar_dir)
+    second = PriceCalendar(calendar_dir)
+    start = first.origin
+
+    first.write_property("p1", pricing(start, [100]))
+    # second allarga le matrici: first deve riaprire i file nuovi prima di scrivere
+    second.set_range("p2", start - timedelta(days=10), start - timedelta(days=10), 50)
+    first.set_range("p1", start + timedelta(days=1), start + timedelta(days=1), 120)
+
+    reopened = PriceCalendar(calendar_dir)
+    assert reopened.read_property("p1") == pricing(start, [100, 120])
+    assert reopened.read_property("p2") == pricing(start - timedelta(days=10), [50])
+    assert second.read_property("p1") == pricing(start, [100, 120])
+
+
+def test_legacy_files_are_imported_on_first_open(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(price_calendar, "_calendar", None)
+    os.makedirs("data")
+    start = date.today()
+    with open(os.path.join("data", "pricing_p1.json"), "w", encoding="utf-8") as f:
+        json.dump(pricing(start, [100, 110]), f)
+    with open(os.path.join("data", "pricing_seasons.json"), "w", encoding="utf-8") as f:
+        json.dump({"estate": 1.3}, f)
+
+    assert price_calendar.load_pricing_data("p1") == pricing(start, [100, 110])
+    assert price_calendar.load_pricing_data("seasons") is None, "I file che non sono calendari vanno ignorati"
+
+    price_calendar.save_pricing_data("p1", pricing(start, [80]))
+    assert import_legacy_files(PriceCalendar(os.path.join("data", "other"))) == 1
+    assert price_calendar.load_pricing_data("p1") == pricing(start, [80]), "L'import avviene solo alla prima apertura"
+
+
+def test_view_range_slices_every_property_without_copying(calendar_dir):
+    calendar = PriceCalendar(calendar_dir)
+    start = calendar.origin + timedelta(days=10)
+    calendar.write_property("p1", pricing(start, [100, 110, 120]))
+    calendar.write_property("p2", pricing(start + timedelta(days=1), [80, 90], status="booked"))
+
+    prices, status, rows, first_day = calendar.view_range(start, start + timedelta(days=2))
+
+    assert np.shares_memory(prices, calendar.prices) and np.shares_memory(status, calendar.status)
+    assert first_day == start and prices.shape == status.shape == (2, 3)
+    assert prices[rows["p1"]].tolist() == [100, 110, 120]
+    assert np.isnan(prices[rows["p2"], 0]) and prices[rows["p2"], 1:].tolist() == [80, 90]
+    assert [STATUSES[code] for code in status[rows["p2"]]] == ["", "booked", "booked"]
+    with pytest.raises(ValueError):
+        prices[0, 0] = 1
+
+    # L'intervallo viene limitato ai giorni dell'archivio
+    prices, _, _, first_day = calendar.view_range(calendar.origin - timedelta(days=5), calendar.origin + timedelta(days=1))
+    assert first_day == calendar.origin and prices.shape == (2, 2)
+    assert calendar.view_range(calendar.origin - timedelta(days=9), calendar.origin - timedelta(days=5))[0].shape == (2, 0)
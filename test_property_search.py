@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""Verifica gli indici della ricerca immobili: testo e ordinamento (utils/property_search.py), facet
+(utils/property_facets.py), nomi per /prenota (utils/property_names.py) e cache dei risultati (utils/search_cache.py)."""
+
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Evitiamo di toccare data/ciao_host.db
+os.environ.setdefault("CIAOHOST_DATABASE_URL", "sqlite://")
+
+from utils import (
+    availability_index, availability_matrix, booking_database, json_cache, json_database, property_facets,
+    property_names, property_search, search_cache,
+)
+from utils.property_facets import FacetIndex, filter_property_ids, get_facets
+from utils.property_names import PropertyNameIndex, name_key, resolve_property_name, trigrams
+from utils.property_search import (
+    SORT_MODES, PropertyTextIndex, fold_text, property_tokens, search_properties, tokenize, top_properties,
+)
+from utils.search_cache import SearchResultCache, search_key, search_property_ids
+
+PROPERTIES = {
+    "p1": {"name": "Casetta Viola", "type": "Appartamento", "location": "Roma", "address": "Via Appia 1",
+           "price": 90, "max_guests": 2, "services": ["WiFi", "Aria condizionata"], "created_at": "2025-01-01"},
+    "p2": {"name": "Villa Rosa", "type": "Villa", "location": "Cortina d'Ampezzo", "address": "Via Città 2",
+           "price": 300, "max_guests": 8, "services": ["WiFi", "Piscina"], "created_at": "2025-03-01"},
+    "p3": {"name": "Baita Città Alta", "type": "Baita", "location": "Bergamo", "address": "Piazza Vecchia",
+           "price": 150, "max_guests": 4, "services": ["Camino"], "created_at": "2025-02-01"},
+    "p4": {"name": "Villetta al mare", "type": "Villa", "location": "Roma", "address": "Lungomare 4",
+           "price": 150, "max_guests": 6, "services": ["WiFi", "Piscina", "Parcheggio"], "created_at": "2024-12-01"},
+}
+
+
+@pytest.fixture
+def catalogue(tmp_path, monkeypatch):
+    """Catalogo in un file temporaneo, con gli indici del processo da ricostruire"""
+    path = str(tmp_path / "proprieta.json")
+    monkeypatch.setattr(json_database, "DATABASE_FILE", path)
+    monkeypatch.setattr(json_database, "STORAGE_MODE", "journal")
+    monkeypatch.setattr(json_database, "STORAGE_BACKEND", "json")
+    monkeypatch.setattr(property_search, "_index", None)
+    monkeypatch.setattr(property_search, "_view", None)
+    monkeypatch.setattr(property_facets, "_index", None)
+    monkeypatch.setattr(property_facets, "_view", None)
+    monkeypatch.setattr(property_names, "_index", None)
+    monkeypatch.setattr(property_names, "_view", None)
+    json_database.save_database({"properties": PROPERTIES, "users": {}})
+    yield path
+    json_cache.invalidate(path)
+
+
+def random_catalogue(count, seed):
+    rng = random.Random(seed)
+    words = ["casa", "casetta", "villa", "villetta", "baita", "rosa", "viola", "mare", "monte", "lago", "città"]
+    services = ["WiFi", "Piscina", "Camino", "Parcheggio", "Aria condizionata"]
+    return {
+        f"r{i}": {
+            "name": " ".join(rng.sample(words, 2)),
+            "type": rng.choice(["Villa", "Appartamento", "Baita"]),
+            "location": rng.choice(["Roma", "Bergamo", "Cortina d'Ampezzo", ""]),
+            "address": f"Via {rng.choice(words)} {i}",
+            "price": rng.choice([80, 120, 150, 200, 300]),
+            "max_guests": rng.randint(1, 10),
+            "services": rng.sample(services, rng.randint(0, 3)),
+            "created_at": f"2025-{rng.randint(1, 12):02d}-01",
+        }
+        for i in range(count)
+    }
+
+
+def scan_search(properties, query):
+    """Quello che faceva la ricerca prima dell'indice: confronto con ogni immobile"""
+    words = tokenize(query)
+    return {
+        property_id for property_id, prop in properties.items()
+        if all(any(token.startswith(word) for token in property_tokens(prop)) for word in words)
+    }
+
+
+def test_text_is_folded_to_lowercase_without_accents():
+    assert fold_text("Città") == "citta"
+    assert tokenize("Cortina d'Ampezzo, VIA Città!") == ["cortina", "d", "ampezzo", "via", "citta"]
+
+
+def test_search_matches_every_word_as_prefix(catalogue):
+    assert search_properties("villa") == {"p2", "p4"}
+    assert search_properties("villet") == {"p4"}
+    assert search_properties("roma vill") == {"p4"}, "Tutte le parole devono comparire"
+    assert search_properties("CITTA") == {"p2", "p3"}, "Maiuscole e accenti vanno ignorati"
+    assert search_properties("piscina") == {"p2", "p4"}, "Anche i servizi sono cercabili"
+    assert search_properties("inesistente") == set()
+    assert search_properties("  ,, ") is None
+
+
+def test_index_matches_scan_after_random_updates():
+    properties = random_catalogue(300, seed=21)
+    index = PropertyTextIndex.from_properties(properties)
+    rng = random.Random(5)
+    replacements = random_catalogue(100, seed=22)
+    for property_id in rng.sample(list(properties), 100):
+        if rng.random() < 0.4:
+            index.remove(property_id)
+            del properties[property_id]
+        else:
+            properties[property_id] = replacements.popitem()[1]
+            index.add(property_id, properties[property_id])
+
+    for query in ["casa", "cas", "villa rosa", "via 1", "citta", "piscina wifi", "cortina", "lago monte", "zzz"]:
+        assert index.search(query) == scan_search(properties, query), f"Risultato diverso dalla scansione per {query!r}"
+
+
+def test_process_index_follows_database_changes(catalogue):
+    index = property_search.get_property_text_index()
+
+    json_database.add_property({"id": "p5", "name": "Trullo Bianco", "city": "Alberobello"})
+    assert search_properties("trullo") == {"p5"}
+    json_database.update_property("p1", {"name": "Casetta Gialla", "city": "Roma"})
+    assert search_properties("viola") == set()
+    assert search_properties("gialla") == {"p1"}
+    json_database.delete_property("p2")
+    assert search_properties("villa") == {"p4"}
+
+    assert property_search.get_property_text_index() is index, "L'indice va aggiornato, non ricostruito"
+
+
+def scan_filter(properties, property_type=None, location=None, services=(), price_range=None):
+    return {
+        property_id for property_id, prop in properties.items()
+        if (property_type is None or (prop.get("type") or "Non specificato") == property_type)
+        and (location is None or (prop.get("location") or "Non specificato") == location)
+        and set(services) <= set(prop.get("services") or ())
+        and (price_range is None or price_range[0] <= float(prop.get("price") or 0) <= price_range[1])
+    }
+
+
+def test_facets_count_values_and_price_bounds(catalogue):
+    facets = get_facets()
+
+    assert facets["type"] == {"Appartamento": 1, "Villa": 2, "Baita": 1}
+    assert facets["location"] == {"Roma": 2, "Cortina d'Ampezzo": 1, "Bergamo": 1}
+    assert facets["services"]["WiFi"] == 3 and facets["services"]["Camino"] == 1
+    assert facets["price"] == (90.0, 300.0)
+
+    # Conteggi limitati ai risultati, fascia di prezzo sempre del catalogo
+    facets = get_facets(["p2", "p4"])
+    assert facets["location"] == {"Cortina d'Ampezzo": 1, "Roma": 1}
+    assert facets["price"] == (90.0, 300.0)
+
+
+def test_filters_intersect_facet_sets(catalogue):
+    assert filter_property_ids() is None
+    assert filter_property_ids(property_type="Villa", location="Roma") == {"p4"}
+    assert filter_property_ids(services=["WiFi", "Piscina"]) == {"p2", "p4"}
+    assert filter_property_ids(price_range=(100, 150)) == {"p3", "p4"}, "Gli estremi della fascia sono inclusi"
+    assert filter_property_ids(property_type="Villa", price_range=(0, 200)) == {"p4"}
+    assert filter_property_ids(location="Milano") == set()
+
+
+def test_facet_index_matches_scan_after_random_updates():
+    properties = random_catalogue(300, seed=31)
+    index = FacetIndex.from_properties(properties)
+    replacements = random_catalogue(100, seed=32)
+    rng = random.Random(9)
+    for property_id in rng.sample(list(properties), 100):
+        if rng.random() < 0.4:
+            index.remove(property_id)
+            del properties[property_id]
+        else:
+            properties[property_id] = replacements.popitem()[1]
+            index.add(property_id, properties[property_id])
+
+    prices = [float(prop["price"]) for prop in properties.values()]
+    assert index.price_bounds() == (min(prices), max(prices))
+    assert index.counts("type") == {
+        value: len(scan_filter(properties, property_type=value)) for value in ("Villa", "Appartamento", "Baita")
+        if scan_filter(properties, property_type=value)
+    }
+    assert index.ids_in_price_range(120, 200) == scan_filter(properties, price_range=(120, 200))
+    for services in (["WiFi"], ["Piscina", "Camino"], []):
+        assert set.intersection(set(properties), *(index.ids_for("services", service) for service in services)) == (
+            scan_filter(properties, services=services)
+        )
+
+
+def test_facets_follow_database_changes(catalogue):
+    get_facets()
+
+    json_database.add_property({"id": "p5", "name": "Trullo", "type": "Trullo", "city": "Alberobello", "base_price": 60})
+    json_database.delete_property("p2")
+
+    facets = get_facets()
+    assert facets["type"] == {"Appartamento": 1, "Villa": 1, "Baita": 1, "Trullo": 1}
+    assert facets["price"] == (60.0, 150.0)
+    assert filter_property_ids(location="Alberobello") == {"p5"}
+
+
+def test_results_are_ranked_by_relevance_then_name(catalogue):
+    ids = list(PROPERTIES)
+
+    assert top_properties(ids, PROPERTIES, "Rilevanza", 2, query="villa") == ["p2", "p4"], "A pari punteggio vale il nome"
+    assert top_properties(ids, PROPERTIES, "Rilevanza", 3, query="vill roma") == ["p4", "p1", "p2"], (
+        "Le parole intere valgono più dei prefissi"
+    )
+    assert top_properties(ids, PROPERTIES, "Rilevanza", 4) == ["p3", "p1", "p2", "p4"], "Senza testo: ordine di nome"
+
+
+def test_pages_are_prefixes_of_the_full_sort():
+    properties = random_catalogue(300, seed=41)
+    ids = list(properties)
+    for sort_mode, (field, descending) in SORT_MODES.items():
+        if field == "relevance":
+            continue
+        key = (lambda property_id: properties[property_id][field])
+        expected = sorted(ids, key=key, reverse=descending)
+        for limit in (12, 24, 36, 300, 400):
+            assert top_properties(ids, properties, sort_mode, limit) == expected[:limit], (
+                f"Pagina di {limit} diversa dall'ordinamento completo per {sort_mode}"
+            )
+
+
+def test_missing_or_invalid_sort_values_do_not_break_sorting():
+    properties = {
+        "a": {"name": "A", "price": "non valido"},
+        "b": {"name": "B", "price": 50},
+        "c": {"name": "C"},
+    }
+
+    assert top_properties(properties, properties, "Prezzo decrescente", 3)[0] == "b"
+    assert top_properties(properties, properties, "Più recenti", 3) == ["a", "b", "c"]
+    assert top_properties(properties, properties, "Ordinamento sconosciuto", 1) == ["a"], "Ordinamento di default: rilevanza"
+
+
+def scan_similarity(properties, query):
+    """Somiglianza di Dice tra la query e il nome (o alias) più simile di ogni immobile"""
+    key = name_key(query)
+    query_grams = trigrams(key)
+    result = {}
+    for property_id, prop in properties.items():
+        for name in property_names.property_names(prop):
+            grams = trigrams(name_key(name))
+            similarity = 1.0 if name_key(name) == key else min(0.99, 2 * len(query_grams & grams) / (len(query_grams) + len(grams)))
+            if similarity >= property_names.MIN_SIMILARITY:
+                result[property_id] = max(result.get(property_id, 0), similarity)
+    return result
+
+
+def test_trigrams_pad_words_like_pg_trgm():
+    assert trigrams("viola") == {"  v", " vi", "vio", "iol", "ola", "la "}
+    assert name_key("  Casetta   Viola! ") == "casetta viola"
+
+
+def test_resolver_picks_only_confident_matches(catalogue):
+    data = json_database.load_database()
+    data["properties"]["p3"]["aliases"] = ["Baita Bergamo"]
+    json_database.save_database(data)
+
+    assert resolve_property_name("casetta viola!")[0] == "p1", "Un nome identico viene scelto"
+    assert resolve_property_name("vila rosa")[0] == "p2", "Un errore di battitura con un solo candidato vicino viene accettato"
+    assert resolve_property_name("baita bergamo")[0] == "p3", "Anche gli alias sono cercati"
+
+    property_id, candidates = resolve_property_name("casseta viola")
+    assert property_id is None, "Sotto la soglia si chiede conferma"
+    assert [candidate[:2] for candidate in candidates] == [("p1", "Casetta Viola")]
+
+    property_id, candidates = resolve_property_name("villa")
+    assert property_id is None
+    assert [candidate[0] for candidate in candidates][:2] == ["p2", "p4"]
+
+    assert resolve_property_name("xyz") == (None, [])
+
+    # L'indice del processo segue le modifiche del catalogo
+    json_database.add_property({"id": "p5", "name": "Trullo Bianco"})
+    json_database.delete_property("p1")
+    assert resolve_property_name("trullo bianco")[0] == "p5"
+    assert "p1" not in [candidate[0] for candidate in resolve_property_name("casetta viola")[1]]
+
+
+def test_name_index_matches_scan_after_random_updates():
+    properties = random_catalogue(300, seed=51)
+    index = PropertyNameIndex.from_properties(properties)
+    replacements = random_catalogue(100, seed=52)
+    rng = random.Random(3)
+    for property_id in rng.sample(list(properties), 100):
+        if rng.random() < 0.4:
+            index.remove(property_id)
+            del properties[property_id]
+        else:
+            properties[property_id] = replacements.popitem()[1]
+            index.add(property_id, properties[property_id])
+
+    for query in ["casa rosa", "vila", "casetta mare", "baita lago", "monte", "zzz"]:
+        expected = scan_similarity(properties, query)
+        found = dict(index.search(query, limit=len(properties)))
+        assert found.keys() == expected.keys(), f"Candidati diversi dalla scansione per {query!r}"
+        for property_id, similarity in found.items():
+            assert similarity == pytest.approx(expected[property_id])
+
+
+def test_name_lookup_matches_scan_on_a_large_catalogue():
+    # I tempi sono misurati da benchmarks/bench_property_names.py
+    properties = random_catalogue(5000, seed=53)
+    for property_id, prop in properties.items():
+        prop["name"] += f" {property_id}"
+    index = PropertyNameIndex.from_properties(properties)
+
+    for query in ["casetta viola", "vila rosa r42", "baita monte", "lago mare r4999"]:
+        expected = scan_similarity(properties, query)
+        found = dict(index.search(query, limit=len(properties)))
+        assert found.keys() == expected.keys(), f"Candidati diversi dalla scansione per {query!r}"
+        for property_id, similarity in found.items():
+            assert similarity == pytest.approx(expected[property_id])
+    assert index.search(properties["r42"]["name"], limit=1) == [("r42", 1.0)]
+
+
+@pytest.fixture
+def search_results(catalogue, tmp_path, monkeypatch):
+    """Cache dei risultati vuota e prenotazioni in un file temporaneo"""
+    monkeypatch.setattr(booking_database, "BOOKINGS_DB_FILE", str(tmp_path / "prenotazioni.json"))
+    monkeypatch.setattr(booking_database, "STORAGE_BACKEND", "json")
+    monkeypatch.setattr(availability_index, "_index", None)
+    monkeypatch.setattr(availability_index, "_signature", None)
+    monkeypatch.setattr(availability_matrix, "_matrix", None)
+    monkeypatch.setattr(availability_matrix, "_signature", None)
+    booking_database.save_bookings_database({"bookings": {}})
+    cache = SearchResultCache(maxsize=4)
+    monkeypatch.setattr(search_cache, "_cache", cache)
+    return cache
+
+
+def test_equivalent_filters_share_a_key():
+    check_in = date(2025, 7, 1)
+    assert search_key("Villa  Rosa!", services=["WiFi", "Piscina"]) == search_key("villa rosa", services=("Piscina", "WiFi", "WiFi"))
+    assert search_key("villa", check_in=check_in, check_out=check_in) == search_key("villa"), "Date non valide: nessun filtro"
+    assert search_key("villa", price_range=[0, 100]) == search_key("villa", price_range=(0, 100))
+    assert search_key("villa") != search_key("villa", property_type="Villa")
+
+
+def test_repeated_search_is_served_from_cache(search_results):
+    first = search_property_ids("vill", services=["WiFi"])
+    second = search_property_ids("VILL", services=("WiFi",))
+
+    assert first == ("p2", "p4")
+    assert second is first
+    assert (search_results.hits, search_results.misses) == (1, 1)
+    assert search_property_ids() is None, "Senza filtri non c'è nessun risultato da filtrare"
+
+
+def test_catalogue_changes_invalidate_results(search_results):
+    assert search_property_ids("villa") == ("p2", "p4")
+
+    json_database.add_property({"id": "p5", "name": "Villa Nuova", "city": "Lucca"})
+
+    assert search_property_ids("villa") == ("p2", "p4", "p5")
+
+
+def test_bookings_invalidate_only_searches_with_dates(search_results):
+    check_in = date.today() + timedelta(days=10)
+    check_out = check_in + timedelta(days=3)
+    assert search_property_ids("villa", check_in=check_in, check_out=check_out) == ("p2", "p4")
+    assert search_property_ids("villa") == ("p2", "p4")
+    misses = search_results.misses
+
+    booking_database.add_booking({
+        "property_id": "p2",
+        "check_in_date": check_in.strftime("%d/%m/%Y"),
+        "check_out_date": check_out.strftime("%d/%m/%Y"),
+        "status": "Confermata",
+    })
+
+    assert search_property_ids("villa") == ("p2", "p4")
+    assert search_results.misses == misses, "Una prenotazione non cambia le ricerche senza date"
+    assert search_property_ids("villa", check_in=check_in, check_out=check_out) == ("p4",)
+    assert search_results.misses == misses + 1
+
+
+def test_result_cache_is_bounded_lru():
+    cache = SearchResultCache(maxsize=2)
+    cache.get("a", lambda: 1)
+    cache.get("b", lambda: 2)
+    cache.get("a", lambda: pytest.fail("a è in cache"))
+    cache.get("c", lambda: 3)
+
+    assert len(cache) == 2
+    assert cache.get("a", lambda: "ricalcolato") == 1, "La voce usata di recente resta in cache"
+    assert cache.get("b", lambda: "ricalcolato") == "ricalcolato", "La voce meno recente esce dalla cache"
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Verifica che le query più frequenti di utils/database.py usino gli indici (niente full scan)."""
+
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Il modulo crea il suo motore all'import: evitiamo di toccare data/ciao_host.db
+os.environ.setdefault("CIAOHOST_DATABASE_URL", "sqlite://")
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from utils import database
+from utils.database import Booking, Invoice, create_database_engine, migrate_schema
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    test_engine = create_database_engine(f"sqlite:///{tmp_path / 'plans.db'}", "production")
+    migrate_schema(test_engine)
+    monkeypatch.setattr(database, "Session", sessionmaker(bind=test_engine))
+    yield test_engine
+    test_engine.dispose()
+
+
+def captured_selects(engine, action):
+    """Esegue action e restituisce le SELECT inviate al database con i loro parametri"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        action()
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    return statements
+
+
+def query_plan(engine, statement, parameters):
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+        return [row[3] for row in cursor.fetchall()]
+    finally:
+        connection.close()
+
+
+def assert_uses_index(engine, statement, parameters, table):
+    plan = [step for step in query_plan(engine, statement, parameters) if f" {table}" in f" {step}"]
+    assert plan, f"La query non legge {table}: {statement}"
+    for step in plan:
+        assert step.startswith("SEARCH") and "INDEX" in step, f"Full scan su {table}: {step}\n{statement}"
+
+
+def test_upcoming_cleaning_tasks_use_status_date_index(engine):
+    statements = captured_selects(engine, lambda: database.get_upcoming_cleaning_tasks(7))
+
+    statement, parameters = statements[-1]
+    assert_uses_index(engine, statement, parameters, "cleaning_tasks")
+
+
+def test_invoice_lookup_by_booking_uses_index(engine):
+    session = database.get_db_session()
+    session.add(Booking(
+        id="b1", property_id="p1", guest_name="Mario Rossi",
+        checkin_date=date(2025, 7, 1), checkout_date=date(2025, 7, 5),
+        price_per_night=100.0, total_price=400.0,
+    ))
+    session.commit()
+    session.close()
+
+    statements = captured_selects(engine, lambda: database.create_invoice_for_booking("b1"))
+
+    lookups = [(s, p) for s, p in statements if "WHERE invoices.booking_id" in s]
+    assert lookups, "create_invoice_for_booking non cerca più la fattura per booking_id"
+    for statement, parameters in lookups:
+        assert_uses_index(engine, statement, parameters, "invoices")
+
+
+def test_bookings_by_property_and_dates_use_index(engine):
+    def run():
+        session = database.get_db_session()
+        session.query(Booking).filter(Booking.property_id == "p1").all()
+        session.query(Booking).filter(
+            Booking.property_id == "p1",
+            Booking.checkin_date < date(2025, 8, 1),
+            Booking.checkout_date > date(2025, 7, 1),
+        ).all()
+        session.query(Booking).filter(Booking.checkin_date.between(date(2025, 7, 1), date(2025, 7, 31))).all()
+        session.query(Booking).filter(Booking.checkout_date.between(date(2025, 7, 1), date(2025, 7, 31))).all()
+        session.close()
+
+    statements = captured_selects(engine, run)
+
+    assert len(statements) == 4
+    for statement, parameters in statements:
+        assert_uses_index(engine, statement, parameters, "bookings")
+
+
+def test_invoice_listing_is_one_indexed_query(engine):
+    session = database.get_db_session()
+    for i in range(3):
+        session.add(Booking(
+            id=f"b{i}", property_id="p1", guest_name=f"Ospite {i}",
+            checkin_date=date(2025, 7, 1), checkout_date=date(2025, 7, 5),
+            price_per_night=100.0, total_price=400.0,
+        ))
+        session.add(Invoice(
+            booking_id=f"b{i}", invoice_number=f"2025-{i:04d}", date=date(2025, 7, 1 + i),
+            amount=400.0, tax_amount=72.13,
+        ))
+    session.commit()
+    session.close()
+
+    statements = captured_selects(engine, lambda: database.get_invoices_with_details(
+        date(2025, 7, 2), date(2025, 7, 31), ["Emessa"], limit=10,
+    ))
+
+    assert len(statements) == 1
+    statement, parameters = statements[0]
+    assert_uses_index(engine, statement, parameters, "invoices")
+    invoices = database.get_invoices_with_details(date(2025, 7, 2), date(2025, 7, 31), ["Emessa"], "ospite 2")
+    assert [invoice["guest_name"] for invoice in invoices] == ["Ospite 2"]
+    assert invoices[0]["property_name"] == "Sconosciuto"
+    assert database.count_invoices_with_details(date(2025, 7, 2), date(2025, 7, 31), ["Emessa"]) == 2
+
+
+def test_cleaning_calendar_is_one_indexed_query(engine):
+    def run():
+        database.get_cleaning_tasks(date(2025, 7, 1), date(2025, 7, 31), ["Programmata"])
+        database.get_cleaning_tasks(date(2025, 7, 1), date(2025, 7, 31))
+
+    statements = captured_selects(engine, run)
+
+    assert len(statements) == 2
+    for statement, parameters in statements:
+        assert_uses_index(engine, statement, parameters, "cleaning_tasks")
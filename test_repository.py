@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Verifica la cache di lettura e i metodi di scrittura di utils/repository.py con entrambi i backend."""
+
+import json
+import os
+import sys
+from datetime import date, datetime
+from types import MappingProxyType
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Il modulo crea il suo motore all'import: evitiamo di toccare data/ciao_host.db
+os.environ.setdefault("CIAOHOST_DATABASE_URL", "sqlite://")
+
+from sqlalchemy.orm import sessionmaker
+
+from utils import booking_database, database, json_cache, json_database, repository
+from utils.database import Booking, Property, create_database_engine, migrate_schema
+from utils.repository import JsonRepository, SqliteRepository
+
+
+@pytest.fixture
+def json_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(json_database, "DATABASE_FILE", str(tmp_path / "proprieta.json"))
+    monkeypatch.setattr(json_database, "STORAGE_MODE", "journal")
+    monkeypatch.setattr(json_database, "STORAGE_BACKEND", "json")
+    monkeypatch.setattr(booking_database, "BOOKINGS_DB_FILE", str(tmp_path / "prenotazioni.json"))
+    monkeypatch.setattr(booking_database, "STORAGE_BACKEND", "json")
+    json_database.save_database({"properties": {"p1": {"name": "Casetta Viola"}}, "users": {"a@b.it": "segreta"}})
+    with open(booking_database.BOOKINGS_DB_FILE, "w", encoding="utf-8") as f:
+        json.dump({"bookings": {"b1": {
+            "property_id": "p1", "check_in_date": "01/07/2025", "check_out_date": "05/07/2025", "status": "Confermata",
+        }}}, f)
+    yield tmp_path
+    json_cache.invalidate()
+
+
+@pytest.fixture
+def sql_engine(tmp_path, monkeypatch):
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'repository.db'}", "production")
+    migrate_schema(engine)
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "Session", sessionmaker(bind=engine))
+    # Firma costante: solo le scritture del repository possono svuotare la cache
+    monkeypatch.setattr(repository, "_sql_signature", lambda: "invariata")
+    session = database.get_db_session()
+    session.add(Property(id="p1", name="Casetta Viola", base_price=100.0))
+    session.add(Booking(
+        id="b1", property_id="p1", guest_name="Anna", checkin_date=date(2025, 7, 1), checkout_date=date(2025, 7, 5),
+        price_per_night=100.0, total_price=400.0, status="Confermata",
+    ))
+    session.commit()
+    session.close()
+    yield engine
+    engine.dispose()
+
+
+def test_json_reads_are_cached_until_the_files_change(json_files):
+    repo = JsonRepository()
+
+    properties = repo.list_properties()
+    bookings = repo.list_bookings()
+    assert repo.list_properties() is properties and repo.list_bookings() is bookings
+    assert [prop["id"] for prop in properties] == ["p1"]
+    assert repo.list_users() == {"a@b.it": "segreta"}
+
+    # Scrittura esterna al repository: la firma del file cambia e la cache viene ricaricata
+    json_database.add_property({"id": "p2", "name": "Villa Rosa"})
+    assert [prop["id"] for prop in repo.list_properties()] == ["p1", "p2"]
+    assert repo.get_property("p2")["name"] == "Villa Rosa"
+    assert repo.list_bookings() is bookings
+
+
+def test_repository_writes_refresh_the_cache(json_files):
+    repo = JsonRepository()
+    repo.list_bookings()
+
+    booking_id = repo.add_booking({
+        "property_id": "p1", "check_in_date": "10/07/2025", "check_out_date": "12/07/2025", "status": "Confermata",
+    })
+
+    assert set(repo.list_bookings()) == {"b1", booking_id}
+    assert set(repo.bookings_for_property("p1")) == {"b1", booking_id}
+    assert repo.update_booking(booking_id, {"status": "Annullata"})
+    assert repo.get_booking(booking_id)["status"] == "Annullata"
+    assert repo.booking_records()[booking_id].check_in == date(2025, 7, 10)
+    assert repo.bookings_for_property("p9") == {}
+
+
+def test_bookings_are_read_only_with_both_backends(json_files, sql_engine, monkeypatch):
+    json_bookings = JsonRepository().list_bookings()
+    sql_bookings = SqliteRepository().list_bookings()
+
+    for bookings in (json_bookings, sql_bookings):
+        assert isinstance(bookings, MappingProxyType) and isinstance(bookings["b1"], MappingProxyType)
+        with pytest.raises(TypeError):
+            bookings["b1"]["status"] = "Annullata"
+    assert sql_bookings["b1"]["check_in_date"] == json_bookings["b1"]["check_in_date"] == "01/07/2025"
+    assert sql_bookings["b1"]["property_name"] == "Casetta Viola"
+
+    for backend in ("json", "sqlite"):
+        monkeypatch.setattr(booking_database, "STORAGE_BACKEND", backend)
+        for bookings in (booking_database.get_all_bookings(), booking_database.get_bookings_for_property("p1")):
+            assert isinstance(bookings, MappingProxyType) and isinstance(bookings["b1"], MappingProxyType), backend
+
+
+def test_invoice_and_cleaning_writes_invalidate_their_cache(sql_engine):
+    repo = SqliteRepository()
+    assert repo.count_invoices() == 0
+    assert not repo.has_cleaning_tasks()
+
+    assert repo.create_invoice_for_booking("b1")
+    assert repo.count_invoices() == 1
+    assert [invoice["booking_id"] for invoice in repo.list_invoices()] == ["b1"]
+
+    repo.schedule_cleaning("p1", datetime(2025, 7, 5, 11, 0))
+    assert repo.has_cleaning_tasks()
+    repo.schedule_cleanings_bulk([{"property_id": "p1", "scheduled_date": datetime(2025, 7, 6, 11, 0)}])
+    assert len(repo.list_cleaning_tasks()) == 2
+
+
+def test_invalidate_drops_only_the_given_entity(sql_engine):
+    repo = SqliteRepository()
+    properties = repo.list_properties()
+    bookings = repo.list_bookings()
+
+    repo.invalidate("bookings")
+
+    assert repo.list_properties() is properties
+    assert repo.list_bookings() is not bookings
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Verifica che l'anti-join di get_uninvoiced_bookings/iter_uninvoiced_bookings dia lo stesso risultato del vecchio filtro in Python."""
+
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Il modulo crea il suo motore all'import: evitiamo di toccare data/ciao_host.db
+os.environ.setdefault("CIAOHOST_DATABASE_URL", "sqlite://")
+
+from sqlalchemy.orm import sessionmaker
+
+from utils import database
+from utils.database import (
+    Booking, Property, create_database_engine, get_all_bookings, get_all_invoices, get_property,
+    get_uninvoiced_bookings, iter_uninvoiced_bookings, migrate_schema,
+)
+
+STATUSES = ("confermata", "attiva", "completata", "cancellata", "in attesa")
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    test_engine = create_database_engine(f"sqlite:///{tmp_path / 'uninvoiced.db'}", "production")
+    migrate_schema(test_engine)
+    monkeypatch.setattr(database, "Session", sessionmaker(bind=test_engine))
+    yield test_engine
+    test_engine.dispose()
+
+
+def create_bookings(count, seed=7):
+    """Prenotazioni con stati casuali, metà circa già fatturate, alcune su un immobile inesistente"""
+    rng = random.Random(seed)
+    session = database.get_db_session()
+    session.add(Property(id="p1", name="Casetta Viola", base_price=100.0))
+    session.add(Property(id="p2", name="Villa Rosa", base_price=200.0))
+    session.commit()
+    for i in range(count):
+        check_in = date(2025, 1, 1) + timedelta(days=rng.randrange(365))
+        session.add(Booking(
+            id=f"b{i:03d}", property_id=rng.choice(("p1", "p2", "p9")), guest_name=f"Ospite {i}",
+            checkin_date=check_in, checkout_date=check_in + timedelta(days=3),
+            price_per_night=100.0, total_price=300.0, status=rng.choice(STATUSES),
+        ))
+    session.commit()
+    session.close()
+    invoiced = [f"b{i:03d}" for i in range(count) if rng.random() < 0.5]
+    database.create_invoices_for_bookings(invoiced)
+    return invoiced
+
+
+def python_filter():
+    """Il filtro usato prima dell'anti-join: tutte le fatture e tutte le prenotazioni in memoria"""
+    invoiced_booking_ids = [invoice.get("booking_id") for invoice in get_all_invoices()]
+    result = []
+    for booking in get_all_bookings():
+        if booking.get("id") not in invoiced_booking_ids and booking.get("status") in ["confermata", "attiva", "completata"]:
+            property_data = get_property(booking.get("property_id"))
+            result.append((booking["id"], property_data.get("name") if property_data else "Sconosciuto"))
+    return sorted(result)
+
+
+def test_anti_join_matches_the_python_filter(engine):
+    invoiced = create_bookings(120)
+    expected = python_filter()
+    assert expected and len(expected) < 120 - len(invoiced), "I dati devono contenere tutti i casi"
+
+    uninvoiced = get_uninvoiced_bookings()
+
+    assert sorted((booking["id"], booking["property_name"]) for booking in uninvoiced) == expected
+    assert [booking["id"] for booking in iter_uninvoiced_bookings(batch_size=7)] == [booking["id"] for booking in uninvoiced]
+    assert not {booking["id"] for booking in uninvoiced} & set(invoiced)
+    check_ins = [booking["checkin_date"] for booking in uninvoiced]
+    assert check_ins == sorted(check_ins), "Le prenotazioni vanno ordinate per check-in"
+    assert [booking["id"] for booking in get_uninvoiced_bookings(limit=5)] == [booking["id"] for booking in uninvoiced[:5]]
+
+
+def test_invoicing_removes_bookings_from_the_backlog(engine):
+    create_bookings(30)
+    backlog = [booking["id"] for booking in get_uninvoiced_bookings()]
+
+    database.create_invoices_for_bookings(backlog[:3])
+
+    assert [booking["id"] for booking in get_uninvoiced_bookings()] == backlog[3:]
+    assert sorted(booking_id for booking_id, _ in python_filter()) == sorted(backlog[3:])
+
+
+def test_status_match_ignores_case(engine):
+    session = database.get_db_session()
+    session.add(Booking(
+        id="b1", property_id="p1", guest_name="Anna", checkin_date=date(2025, 7, 1), checkout_date=date(2025, 7, 5),
+        price_per_night=100.0, total_price=400.0, status="Confermata",
+    ))
+    session.commit()
+    session.close()
+
+    # Il vecchio filtro confrontava lo stato così com'era e scartava "Confermata"
+    assert [booking["id"] for booking in get_uninvoiced_bookings()] == ["b1"]
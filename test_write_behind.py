@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Verifica la coda di scrittura in background di utils/write_behind.py e il salvataggio diretto delle prenotazioni confermate in chat."""
+
+import json
+import os
+import sys
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Evitiamo di toccare data/ciao_host.db
+os.environ.setdefault("CIAOHOST_DATABASE_URL", "sqlite://")
+
+import booking_handler
+from utils import availability_index, booking_database
+from utils.write_behind import WriteBehindQueue
+
+
+class SessionState(dict):
+    """Sostituto di st.session_state (accesso sia per chiave sia per attributo)"""
+
+    __getattr__ = dict.__getitem__
+    __setattr__ = dict.__setitem__
+
+
+@pytest.fixture
+def chat_session(tmp_path, monkeypatch):
+    monkeypatch.setattr(booking_database, "BOOKINGS_DB_FILE", str(tmp_path / "prenotazioni.json"))
+    monkeypatch.setattr(booking_database, "STORAGE_BACKEND", "json")
+    monkeypatch.setattr(availability_index, "_index", None)
+    monkeypatch.setattr(availability_index, "_signature", None)
+    session_state = SessionState(properties={"p1": {"name": "Casetta Viola"}})
+    monkeypatch.setattr(booking_handler.st, "session_state", session_state)
+    check_in = date.today() + timedelta(days=30)
+    session_state.booking_state = {
+        "active": True,
+        "step": "confirmation",
+        "property_id": "p1",
+        "property_name": "Casetta Viola",
+        "data": {
+            "property_id": "p1",
+            "property_name": "Casetta Viola",
+            "check_in_date": check_in.strftime("%d/%m/%Y"),
+            "check_out_date": (check_in + timedelta(days=3)).strftime("%d/%m/%Y"),
+            "guests": 2,
+        },
+    }
+    return session_state
+
+
+def blocked_writer(write_queue, key="bloccante"):
+    """Occupa il thread di scrittura finché l'evento restituito non viene impostato"""
+    started = threading.Event()
+    release = threading.Event()
+
+    def write():
+        started.set()
+        release.wait(5)
+
+    ack = write_queue.submit(key, write)
+    assert started.wait(5)
+    return release, ack
+
+
+def test_submit_runs_write_and_returns_result():
+    write_queue = WriteBehindQueue()
+
+    ack = write_queue.submit("documento", lambda: 42)
+
+    assert ack.wait(5)
+    assert ack.result == 42 and ack.error is None
+
+
+def test_pending_writes_of_same_document_are_coalesced():
+    write_queue = WriteBehindQueue()
+    release, _ = blocked_writer(write_queue)
+    writes = []
+
+    first = write_queue.submit("documento", lambda: writes.append("prima"))
+    second = write_queue.submit("documento", lambda: writes.append("seconda") or "ultima")
+    assert first is second, "Le scritture in coda dello stesso documento condividono la conferma"
+    assert not first.done()
+
+    release.set()
+    assert write_queue.flush(5)
+    assert writes == ["seconda"], "Solo l'ultima scrittura in coda va eseguita"
+    assert first.result == "ultima"
+
+
+def test_failed_write_sets_error_and_queue_keeps_working():
+    write_queue = WriteBehindQueue()
+
+    def broken():
+        raise OSError("disco pieno")
+
+    failed = write_queue.submit("documento", broken)
+    ok = write_queue.submit("altro", lambda: "ok")
+
+    assert failed.wait(5) and isinstance(failed.error, OSError)
+    assert ok.wait(5) and ok.result == "ok"
+
+
+def test_full_queue_blocks_submit_until_writer_catches_up():
+    write_queue = WriteBehindQueue(maxsize=1)
+    release, _ = blocked_writer(write_queue)
+    write_queue.submit("a", lambda: "a")
+
+    submitted = threading.Event()
+    thread = threading.Thread(target=lambda: (write_queue.submit("b", lambda: "b"), submitted.set()))
+    thread.start()
+
+    assert not submitted.wait(0.2), "Con la coda piena submit deve attendere"
+    release.set()
+    assert submitted.wait(5)
+    thread.join()
+    assert write_queue.flush(5)
+
+
+def test_flush_waits_for_the_write_in_progress():
+    write_queue = WriteBehindQueue()
+    release, ack = blocked_writer(write_queue)
+
+    assert not write_queue.flush(0.1), "La scrittura in corso non è ancora terminata"
+    release.set()
+    assert write_queue.flush(5)
+    assert ack.done()
+
+
+def test_chat_confirmation_is_on_disk_before_the_reply(chat_session):
+    reply = booking_handler.handle_booking("sì")
+
+    assert "Prenotazione confermata" in reply
+    with open(booking_database.BOOKINGS_DB_FILE, encoding="utf-8") as f:
+        saved = json.load(f)["bookings"]
+    [(booking_id, booking)] = saved.items()
+    assert booking["property_id"] == "p1" and booking["status"] == "Confermata"
+    assert booking_id[:8] in reply
+    assert chat_session.booking_state["active"] is False
+
+
+def test_chat_confirmation_reports_save_errors_and_allows_retry(chat_session, monkeypatch):
+    monkeypatch.setattr(booking_database, "add_booking", lambda booking_data, **kwargs: None)
+
+    reply = booking_handler.handle_booking("sì")
+
+    assert reply.startswith("❌ Errore durante il salvataggio")
+    assert chat_session.booking_state["step"] == "confirmation", "Rispondendo di nuovo 'sì' si deve poter riprovare"
+    assert "bookings" not in chat_session
@@ -1,14 +1,12 @@
 import streamlit as st
-import json
+from utils.repository import get_repository
 import random
 
 def get_current_user():
     """Ottiene l'username dell'utente loggato"""
     try:
         # Carica il database utenti
-        with open("c:/Users/DEADSHOT/Desktop/ciaohostreale/ciaohostluss/DatabaseCiaoHostProprieta.json", "r") as f:
-            data = json.load(f)
-            users = data.get("users", {})
+        users = get_repository().list_users()
         
         # Ottieni l'email dell'utente loggato dal session state
         current_email = st.session_state.get('current_user_email', '')
@@ -1,53 +1,32 @@
 import streamlit as st
 import pandas as pd
-import json
-import uuid
 from datetime import datetime
 import time
 from loading_animations import show_loading_animation, show_success_animation
+from utils.repository import get_repository
 
 def load_bookings():
-    """Carica le prenotazioni dal database"""
+    """Carica le prenotazioni dal database (in sola lettura)"""
     try:
-        with open("c:/Users/DEADSHOT/Desktop/ciaohostreale/ciaohostluss/DatabaseCiaoHostPrenotazioni.json", "r") as f:
-            data = json.load(f)
-            return data.get("bookings", {})
+        return get_repository().list_bookings()
     except Exception as e:
         st.error(f"Errore nel caricamento delle prenotazioni: {e}")
         return {}
 
 def load_users():
-    """Carica gli utenti dal database"""
+    """Carica gli utenti dal database (in sola lettura)"""
     try:
-        with open("c:/Users/DEADSHOT/Desktop/ciaohostreale/ciaohostluss/DatabaseCiaoHostProprieta.json", "r") as f:
-            data = json.load(f)
-            return data.get("users", {})
+        return get_repository().list_users()
     except Exception as e:
         st.error(f"Errore nel caricamento degli utenti: {e}")
         return {}
 
-def save_bookings(bookings):
-    """Salva le prenotazioni nel database"""
-    try:
-        with open("c:/Users/DEADSHOT/Desktop/ciaohostreale/ciaohostluss/DatabaseCiaoHostPrenotazioni.json", "r") as f:
-            data = json.load(f)
-        
-        data["bookings"] = bookings
-        
-        with open("c:/Users/DEADSHOT/Desktop/ciaohostreale/ciaohostluss/DatabaseCiaoHostPrenotazioni.json", "w") as f:
-            json.dump(data, f, indent=2)
-        
+def update_booking_status(booking_id, status):
+    """Aggiorna lo stato di una prenotazione nel database"""
+    if get_repository().update_booking(booking_id, {"status": status}):
         return True
-    except Exception as e:
-        st.error(f"Errore nel salvataggio delle prenotazioni: {e}")
-        return False
-
-def convert_date(date_str):
-    """Converte una data dal formato italiano a un oggetto datetime"""
-    try:
-        return datetime.strptime(date_str, "%d/%m/%Y")
-    except:
-        return datetime.now()  # Fallback
+    st.error("Errore nel salvataggio delle prenotazioni")
+    return False
 
 def show_checkin_management():
     """Mostra la gestione dei check-in e check-out"""
@@ -55,13 +34,16 @@ def show_checkin_management():
     # Carica i dati
     bookings = load_bookings()
     users = load_users()
+    # Prenotazioni con le date già convertite, condivise tra i rerun
+    records = get_repository().booking_records()
     
     # Crea una lista di utenti per associarli alle prenotazioni
     user_list = list(users.keys())
     
-    # Prepara i dati per la visualizzazione
-    checkin_data = []
-    checkout_data = []
+    # Prepara i dati per la visualizzazione: (data di ordinamento, riga)
+    checkin_rows = []
+    checkout_rows = []
+    today = datetime.now().date()
     
     for booking_id, booking in bookings.items():
         # Assegna casualmente un utente se non è presente
@@ -70,10 +52,6 @@ def show_checkin_management():
         # Estrai username dall'email
         username = user_email.split('@')[0] if '@' in user_email else user_email
         
-        # Converti le date
-        check_in_date = convert_date(booking.get("check_in_date", "01/01/2023"))
-        check_out_date = convert_date(booking.get("check_out_date", "01/01/2023"))
-        
         # Crea il record per il check-in
         checkin_record = {
             "ID Prenotazione": booking_id[:8],
@@ -101,12 +79,15 @@ def show_checkin_management():
             "Booking ID": booking_id
         }
         
-        checkin_data.append(checkin_record)
-        checkout_data.append(checkout_record)
+        record = records.get(booking_id)
+        checkin_rows.append(((record and record.check_in) or today, checkin_record))
+        checkout_rows.append(((record and record.check_out) or today, checkout_record))
     
-    # Ordina i dati per data
-    checkin_data.sort(key=lambda x: convert_date(x["Data"]))
-    checkout_data.sort(key=lambda x: convert_date(x["Data"]))
+    # Ordina i dati per data, usando le date già convertite
+    checkin_rows.sort(key=lambda row: row[0])
+    checkout_rows.sort(key=lambda row: row[0])
+    checkin_data = [record for _, record in checkin_rows]
+    checkout_data = [record for _, record in checkout_rows]
     
     # Crea i DataFrame
     checkin_df = pd.DataFrame(checkin_data)
@@ -185,8 +166,7 @@ def show_checkin_management():
                             # Aggiorna lo stato della prenotazione
                             booking_id = selected_booking["Booking ID"]
                             if booking_id in bookings:
-                                bookings[booking_id]["status"] = "Completata"
-                                if save_bookings(bookings):
+                                if update_booking_status(booking_id, "Completata"):
                                     show_success_animation(f"Check-in completato per {selected_booking['Utente']}!")
                                     time.sleep(1)
                                     st.rerun()
@@ -199,8 +179,7 @@ def show_checkin_management():
                             # Aggiorna lo stato della prenotazione
                             booking_id = selected_booking["Booking ID"]
                             if booking_id in bookings:
-                                bookings[booking_id]["status"] = "Cancellata"
-                                if save_bookings(bookings):
+                                if update_booking_status(booking_id, "Cancellata"):
                                     show_success_animation("Prenotazione cancellata con successo!")
                                     time.sleep(1)
                                     st.rerun()
@@ -278,8 +257,7 @@ def show_checkin_management():
                             # Aggiorna lo stato della prenotazione
                             booking_id = selected_booking["Booking ID"]
                             if booking_id in bookings:
-                                bookings[booking_id]["status"] = "Completata"
-                                if save_bookings(bookings):
+                                if update_booking_status(booking_id, "Completata"):
                                     show_success_animation(f"Check-out completato per {selected_booking['Utente']}!")
                                     time.sleep(1)
                                     st.rerun()
@@ -338,8 +316,7 @@ def show_checkin_management():
                     # Mostra animazione di caricamento
                     show_loading_animation("Aggiunta prenotazione in corso...", duration=1)
                     
-                    # Crea una nuova prenotazione
-                    booking_id = str(uuid.uuid4())
+                    # Crea una nuova prenotazione (l'ID viene assegnato dal database)
                     new_booking = {
                         "property_id": property_id,
                         "property_name": property_name,
@@ -354,8 +331,7 @@ def show_checkin_management():
                     }
                     
                     # Aggiungi la prenotazione al database
-                    bookings[booking_id] = new_booking
-                    if save_bookings(bookings):
+                    if get_repository().add_booking(new_booking):
                         show_success_animation("Prenotazione aggiunta con successo!")
                         time.sleep(1)
                         st.rerun()
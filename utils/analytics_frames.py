@@ -0,0 +1,71 @@
+"""
+Tabella colonnare (pandas) degli immobili condivisa dalle pagine di analisi.
+
+Invece di ricostruire un DataFrame da liste di dizionari ad ogni rerun, ogni
+pagina chiede qui la tabella già materializzata: tipo, città e stato sono
+colonne categoriche (un codice intero per riga invece di una stringa).
+
+La tabella segue la vista in cache di utils/json_database.py e viene
+ricostruita solo quando il database cambia. get_properties_frame()
+restituisce la tabella condivisa, senza copiarla: va usata in sola lettura
+(filtri, groupby e selezioni creano già oggetti nuovi); chi deve modificarla
+in place ne fa prima una copia con .copy().
+"""
+import threading
+
+import pandas as pd
+
+from utils import json_database
+
+PROPERTY_COLUMNS = {
+    "id": "string",
+    "name": "string",
+    "type": "category",
+    "city": "category",
+    "status": "category",
+    "bedrooms": "int64",
+    "bathrooms": "float64",
+    "max_guests": "int64",
+    "base_price": "float64",
+    "cleaning_fee": "float64",
+}
+
+_lock = threading.RLock()
+
+# Tabella immobili e vista di json_database da cui è stata costruita
+_properties = (None, None)
+
+def _typed_frame(rows, columns):
+    """DataFrame con i tipi di colonna indicati, anche se rows è vuota"""
+    frame = pd.DataFrame(rows, columns=list(columns))
+    return frame.astype(columns)
+
+def _property_row(prop):
+    return {
+        "id": prop["id"],
+        "name": prop.get("name", ""),
+        "type": prop.get("type") or "Non specificato",
+        "city": prop.get("city") or "Non specificata",
+        "status": prop.get("status") or "Attivo",
+        "bedrooms": int(prop.get("bedrooms") or 0),
+        "bathrooms": float(prop.get("bathrooms") or 0),
+        "max_guests": int(prop.get("max_guests") or 0),
+        "base_price": float(prop.get("base_price") or 0),
+        "cleaning_fee": float(prop.get("cleaning_fee") or 0),
+    }
+
+def get_properties_frame():
+    """
+    Tabella degli immobili (una riga per immobile)
+
+    Returns:
+        pd.DataFrame: Tabella condivisa con le colonne PROPERTY_COLUMNS, in sola lettura
+    """
+    global _properties
+    view = json_database.get_database_view()
+    with _lock:
+        cached_view, frame = _properties
+        if cached_view is not view:
+            frame = _typed_frame([_property_row(prop) for prop in json_database.get_all_properties()], PROPERTY_COLUMNS)
+            _properties = (view, frame)
+        return frame
@@ -0,0 +1,201 @@
+"""
+Indice in memoria delle disponibilità degli immobili.
+
+Per ogni immobile i soggiorni occupati sono tenuti come intervalli [check-in,
+check-out) ordinati e non sovrapposti (i soggiorni che si toccano o si
+sovrappongono vengono fusi in un unico blocco), così le domande "il periodo è
+libero?" e "qual è la prima finestra libera?" si risolvono con una ricerca
+binaria (bisect) invece di scorrere tutte le prenotazioni.
+
+L'indice di processo restituito da get_availability_index() viene aggiornato
+in modo incrementale ad ogni add_booking() e ricostruito solo quando il file
+delle prenotazioni è stato modificato da qualcun altro.
+"""
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+from utils import booking_database
+from utils.booking_records import parse_booking_date
+from utils.json_cache import file_signature
+
+# Prenotazioni che non occupano l'immobile (confronto in minuscolo)
+RELEASED_BOOKING_STATUSES = ("annullata", "cancellata", "cancelled")
+
+def booking_stay(booking):
+    """
+    Soggiorno occupato da una prenotazione nel formato JSON
+
+    Returns:
+        tuple: (property_id, check_in, check_out) con date datetime.date, None se
+            la prenotazione è annullata o non ha immobile e date valide
+    """
+    status = (booking.get("status") or "").lower()
+    check_in = parse_booking_date(booking.get("check_in_date"))
+    check_out = parse_booking_date(booking.get("check_out_date"))
+    property_id = booking.get("property_id")
+    if status in RELEASED_BOOKING_STATUSES or not property_id or check_in is None or check_out is None:
+        return None
+    return property_id, check_in, check_out
+
+class PropertyAvailability:
+    """Soggiorni occupati di un singolo immobile"""
+
+    def __init__(self):
+        self._stays = {}
+        self._starts = []
+        self._ends = []
+
+    def __len__(self):
+        return len(self._stays)
+
+    def add(self, booking_id, check_in, check_out):
+        """Registra (o sposta) il soggiorno di una prenotazione"""
+        if booking_id in self._stays:
+            self.remove(booking_id)
+        if check_out <= check_in:
+            return
+        self._stays[booking_id] = (check_in, check_out)
+
+        # Blocchi che toccano [check_in, check_out]: vengono fusi con il nuovo soggiorno
+        lo = bisect_left(self._ends, check_in)
+        hi = bisect_right(self._starts, check_out)
+        if lo < hi:
+            check_in = min(check_in, self._starts[lo])
+            check_out = max(check_out, self._ends[hi - 1])
+        self._starts[lo:hi] = [check_in]
+        self._ends[lo:hi] = [check_out]
+
+    def remove(self, booking_id):
+        """Libera il soggiorno di una prenotazione"""
+        if self._stays.pop(booking_id, None) is None:
+            return
+        # Un blocco può contenere più soggiorni: ricostruiamo i blocchi di questo immobile
+        self._starts = []
+        self._ends = []
+        for check_in, check_out in sorted(self._stays.values()):
+            if self._ends and check_in <= self._ends[-1]:
+                self._ends[-1] = max(self._ends[-1], check_out)
+            else:
+                self._starts.append(check_in)
+                self._ends.append(check_out)
+
+    def is_free(self, check_in, check_out):
+        """True se nessun soggiorno cade in [check_in, check_out)"""
+        # Primo blocco che finisce dopo il check-in
+        index = bisect_right(self._ends, check_in)
+        return index == len(self._starts) or self._starts[index] >= check_out
+
+    def next_free_window(self, nights, start):
+        """
+        Prima finestra libera di nights notti a partire da start
+
+        Returns:
+            tuple: (check_in, check_out) come datetime.date
+        """
+        stay = timedelta(days=nights)
+        check_in = start
+        index = bisect_right(self._ends, check_in)
+        while index < len(self._starts) and self._starts[index] < check_in + stay:
+            check_in = max(check_in, self._ends[index])
+            index += 1
+        return check_in, check_in + stay
+
+class AvailabilityIndex:
+    """Disponibilità di tutti gli immobili, indicizzate per property_id"""
+
+    def __init__(self):
+        self._properties = {}
+        self._property_by_booking = {}
+
+    def __len__(self):
+        return len(self._property_by_booking)
+
+    @classmethod
+    def from_bookings(cls, bookings):
+        """Costruisce l'indice da un dizionario {booking_id: prenotazione} nel formato JSON"""
+        index = cls()
+        for booking_id, booking in bookings.items():
+            index.apply_booking(booking_id, booking)
+        return index
+
+    def apply_booking(self, booking_id, booking):
+        """Aggiunge, sposta o libera una prenotazione nel formato JSON"""
+        self.remove_booking(booking_id)
+
+        stay = booking_stay(booking)
+        if stay is None:
+            return
+        property_id, check_in, check_out = stay
+
+        availability = self._properties.get(property_id)
+        if availability is None:
+            availability = self._properties[property_id] = PropertyAvailability()
+        availability.add(booking_id, check_in, check_out)
+        self._property_by_booking[booking_id] = property_id
+
+    def remove_booking(self, booking_id):
+        """Libera il soggiorno di una prenotazione, se presente"""
+        property_id = self._property_by_booking.pop(booking_id, None)
+        if property_id is not None:
+            self._properties[property_id].remove(booking_id)
+
+    def is_free(self, property_id, check_in, check_out):
+        """True se l'immobile è libero in [check_in, check_out)"""
+        availability = self._properties.get(property_id)
+        return availability is None or availability.is_free(check_in, check_out)
+
+    def next_free_window(self, property_id, nights, start):
+        """Prima finestra libera di nights notti dell'immobile a partire da start"""
+        availability = self._properties.get(property_id)
+        if availability is None:
+            return start, start + timedelta(days=nights)
+        return availability.next_free_window(nights, start)
+
+# Indice condiviso dal processo e firma del file da cui è stato costruito
+_index = None
+_signature = None
+_lock = threading.RLock()
+
+def get_availability_index():
+    """
+    Indice delle disponibilità del processo, ricostruito se il file delle prenotazioni è cambiato
+
+    Returns:
+        AvailabilityIndex: Indice da usare in sola lettura (per interrogarlo da
+            più thread usare is_available e next_free_window)
+    """
+    global _index, _signature
+    with _lock:
+        signature = file_signature(booking_database.BOOKINGS_DB_FILE)
+        if _index is None or signature != _signature:
+            # Costruito dal file JSON, come la firma: vale anche con il backend sqlite
+            _index = AvailabilityIndex.from_bookings(booking_database.get_bookings_view().get("bookings", {}))
+            _signature = signature
+        return _index
+
+def is_available(property_id, check_in, check_out):
+    """True se l'immobile è libero in [check_in, check_out) (date come datetime.date)"""
+    with _lock:
+        return get_availability_index().is_free(property_id, check_in, check_out)
+
+def next_free_window(property_id, nights, start):
+    """Prima finestra libera di nights notti dell'immobile a partire da start"""
+    with _lock:
+        return get_availability_index().next_free_window(property_id, nights, start)
+
+def _on_booking_saved(booking_id, booking, signatures):
+    """Aggiorna l'indice dopo una scrittura di questo processo, senza ricostruirlo"""
+    global _signature
+    with _lock:
+        if _index is None:
+            return
+        _index.apply_booking(booking_id, booking)
+        # Se prima della scrittura il file era quello da cui deriva l'indice, ora
+        # l'indice corrisponde al file scritto; altrimenti qualcun altro lo ha
+        # modificato e la firma vecchia forzerà la ricostruzione
+        before, after = signatures
+        if _signature in (before, after):
+            _signature = after
+
+booking_database.add_booking_listener(_on_booking_saved)
@@ -0,0 +1,214 @@
+"""
+Matrice delle disponibilità giornaliere (immobili × giorni) per la ricerca per date.
+
+Ogni riga è un immobile e ogni colonna un giorno a partire da oggi, per un
+orizzonte mobile di HORIZON_DAYS giorni; una cella vale True se la notte che
+inizia in quel giorno è occupata. Trovare gli immobili liberi in un periodo
+richiede una sola operazione vettoriale (slice delle colonne + any per riga)
+invece di controllare le prenotazioni di ogni immobile.
+
+La matrice di processo è aggiornata in modo incrementale ad ogni add_booking()
+(come l'indice di utils/availability_index.py), avanza da sola al cambio di
+giorno e viene ricostruita se il file delle prenotazioni cambia per mano di
+un altro processo. I periodi che escono dall'orizzonte vengono controllati
+con l'indice per intervalli.
+"""
+import os
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+from utils import availability_index, booking_database
+from utils.availability_index import booking_stay
+from utils.json_cache import file_signature
+
+# Giorni coperti dalla matrice a partire da oggi
+HORIZON_DAYS = int(os.environ.get("CIAOHOST_AVAILABILITY_HORIZON_DAYS", 730))
+
+class AvailabilityMatrix:
+    """Occupazione giornaliera di tutti gli immobili su un orizzonte fisso"""
+
+    def __init__(self, origin, horizon_days=HORIZON_DAYS):
+        self.origin = origin
+        self.horizon_days = horizon_days
+        self._rows = {}
+        self._occupied = np.zeros((0, horizon_days), dtype=bool)
+        self._stays = {}
+        # Prenotazioni di ogni immobile, per ricalcolare una sola riga
+        self._property_stays = {}
+
+    def __len__(self):
+        return len(self._stays)
+
+    @classmethod
+    def from_bookings(cls, bookings, property_ids=(), origin=None, horizon_days=HORIZON_DAYS):
+        """Costruisce la matrice da un dizionario {booking_id: prenotazione} nel formato JSON"""
+        matrix = cls(origin or date.today(), horizon_days)
+        for property_id in property_ids:
+            matrix._row(property_id)
+        for booking_id, booking in bookings.items():
+            stay = booking_stay(booking)
+            if stay is not None:
+                matrix._add_stay(booking_id, stay)
+        matrix._fill()
+        return matrix
+
+    def _row(self, property_id):
+        """Indice di riga dell'immobile, aggiungendo la riga se manca"""
+        row = self._rows.get(property_id)
+        if row is None:
+            row = self._rows[property_id] = len(self._rows)
+            if row >= len(self._occupied):
+                # Capacità raddoppiata: gli immobili nuovi non riallocano la matrice ogni volta
+                grown = np.zeros((max(2 * len(self._occupied), 16), self.horizon_days), dtype=bool)
+                grown[:len(self._occupied)] = self._occupied
+                self._occupied = grown
+        return row
+
+    def _add_stay(self, booking_id, stay):
+        self._stays[booking_id] = stay
+        self._property_stays.setdefault(stay[0], set()).add(booking_id)
+        return self._row(stay[0])
+
+    def _columns(self, check_in, check_out):
+        """Colonne [start, stop) del periodo, tagliate all'orizzonte"""
+        start = min(max((check_in - self.origin).days, 0), self.horizon_days)
+        stop = min(max((check_out - self.origin).days, 0), self.horizon_days)
+        return start, stop
+
+    def _fill(self, stays=None):
+        """Segna i soggiorni indicati (default: tutti) con somme cumulative vettoriali"""
+        stays = list(self._stays.values() if stays is None else stays)
+        if not stays:
+            return
+        rows = np.fromiter((self._rows[property_id] for property_id, _, _ in stays), dtype=np.intp, count=len(stays))
+        spans = np.array([self._columns(check_in, check_out) for _, check_in, check_out in stays], dtype=np.intp)
+        # +1 al check-in e -1 al check-out: la somma cumulativa è > 0 nei giorni occupati
+        deltas = np.zeros((len(self._occupied), self.horizon_days + 1), dtype=np.int32)
+        np.add.at(deltas, (rows, spans[:, 0]), 1)
+        np.add.at(deltas, (rows, spans[:, 1]), -1)
+        self._occupied |= np.cumsum(deltas[:, :-1], axis=1, dtype=np.int32) > 0
+
+    def apply_booking(self, booking_id, booking):
+        """Aggiunge, sposta o libera una prenotazione nel formato JSON"""
+        self.remove_booking(booking_id)
+        stay = booking_stay(booking)
+        if stay is None:
+            return
+        row = self._add_stay(booking_id, stay)
+        start, stop = self._columns(stay[1], stay[2])
+        self._occupied[row, start:stop] = True
+
+    def remove_booking(self, booking_id):
+        """Libera i giorni di una prenotazione, se presente"""
+        stay = self._stays.pop(booking_id, None)
+        if stay is None:
+            return
+        # Altri soggiorni possono toccare gli stessi giorni: ricalcoliamo solo la
+        # riga dell'immobile, dalle sue prenotazioni
+        property_id = stay[0]
+        booking_ids = self._property_stays[property_id]
+        booking_ids.discard(booking_id)
+        row = self._rows[property_id]
+        self._occupied[row] = False
+        for other_id in booking_ids:
+            start, stop = self._columns(*self._stays[other_id][1:])
+            self._occupied[row, start:stop] = True
+
+    def advance(self, origin):
+        """Sposta l'inizio dell'orizzonte a origin, ricalcolando i giorni che entrano"""
+        shift = (origin - self.origin).days
+        if shift <= 0:
+            return
+        self.origin = origin
+        if shift >= self.horizon_days:
+            self._occupied[:] = False
+            self._fill()
+            return
+        self._occupied[:, :-shift] = self._occupied[:, shift:]
+        self._occupied[:, -shift:] = False
+        first_new_day = origin + timedelta(days=self.horizon_days - shift)
+        self._fill(stay for stay in self._stays.values() if stay[2] > first_new_day)
+
+    def covers(self, check_in, check_out):
+        """True se il periodo cade interamente nell'orizzonte della matrice"""
+        return self.origin <= check_in and (check_out - self.origin).days <= self.horizon_days
+
+    def free_properties(self, check_in, check_out, property_ids):
+        """
+        Immobili liberi per tutte le notti in [check_in, check_out)
+
+        Args:
+            check_in (date): Primo giorno del soggiorno
+            check_out (date): Giorno di partenza (non occupato)
+            property_ids (iterable): Immobili da controllare
+
+        Returns:
+            list: ID degli immobili liberi, nello stesso ordine di property_ids
+        """
+        start, stop = self._columns(check_in, check_out)
+        busy = self._occupied[:len(self._rows), start:stop].any(axis=1)
+        return [
+            property_id for property_id in property_ids
+            if property_id not in self._rows or not busy[self._rows[property_id]]
+        ]
+
+# Matrice condivisa dal processo e firma del file da cui è stata costruita
+_matrix = None
+_signature = None
+_lock = threading.RLock()
+
+def get_availability_matrix():
+    """
+    Matrice delle disponibilità del processo, allineata al file delle prenotazioni e alla data di oggi
+
+    Returns:
+        AvailabilityMatrix: Matrice da usare in sola lettura (per interrogarla da
+            più thread usare find_free_properties)
+    """
+    global _matrix, _signature
+    with _lock:
+        signature = file_signature(booking_database.BOOKINGS_DB_FILE)
+        if _matrix is None or signature != _signature:
+            # Costruito dal file JSON, come la firma: vale anche con il backend sqlite
+            _matrix = AvailabilityMatrix.from_bookings(booking_database.get_bookings_view().get("bookings", {}))
+            _signature = signature
+        else:
+            _matrix.advance(date.today())
+        return _matrix
+
+def find_free_properties(property_ids, check_in, check_out):
+    """
+    Filtra gli immobili liberi per tutte le notti in [check_in, check_out)
+
+    Args:
+        property_ids (iterable): ID degli immobili candidati
+        check_in (date): Data di check-in
+        check_out (date): Data di check-out
+
+    Returns:
+        list: ID degli immobili liberi, nello stesso ordine di property_ids
+    """
+    with _lock:
+        matrix = get_availability_matrix()
+        if matrix.covers(check_in, check_out):
+            return matrix.free_properties(check_in, check_out, property_ids)
+    # Periodo fuori orizzonte: controllo per intervalli, immobile per immobile
+    return [
+        property_id for property_id in property_ids
+        if availability_index.is_available(property_id, check_in, check_out)
+    ]
+
+def _on_booking_saved(booking_id, booking, signatures):
+    """Aggiorna la matrice dopo una scrittura di questo processo, senza ricostruirla"""
+    global _signature
+    with _lock:
+        if _matrix is None:
+            return
+        _matrix.apply_booking(booking_id, booking)
+        before, after = signatures
+        if _signature in (before, after):
+            _signature = after
+
+booking_database.add_booking_listener(_on_booking_saved)
@@ -0,0 +1,539 @@
+"""
+Backup incrementale e ripristino dei dati dell'applicazione in archivi tar.gz.
+
+Ogni backup è un archivio in BACKUP_DIR che contiene un manifest.json (elenco
+dei file salvati con percorso, sha256 e archivio in cui si trova il contenuto)
+e i contenuti nuovi, come membri "blobs/<sha256>". Un file che non è cambiato
+dall'ultimo backup (stessa dimensione e mtime, oppure stesso sha256) non viene
+copiato di nuovo: il manifest rimanda all'archivio precedente che lo contiene.
+Lo stesso contenuto presente in più file (es. foto duplicate) viene salvato una
+volta sola. Accanto ad ogni archivio viene scritta una copia del manifest
+(<archivio>.manifest.json), così il backup successivo non deve decomprimere
+quello precedente.
+
+Sia il backup che il ripristino lavorano a blocchi di CHUNK_SIZE byte: anche
+archivi di foto da diversi GB non vengono mai caricati in memoria. Il database
+SQLite viene copiato con l'API di backup di sqlite3 (copia coerente anche con
+connessioni aperte).
+"""
+import contextlib
+import glob
+import hashlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import time
+from datetime import datetime
+
+from utils import booking_database, json_cache, json_database, message_service
+from utils.json_writer import atomic_write_json, file_lock, update_json
+
+BACKUP_DIR = os.environ.get("CIAOHOST_BACKUP_DIR", os.path.join("data", "backups"))
+
+# Cartella del progetto: i file indicati con un percorso assoluto (es. il
+# database degli immobili, accanto ai moduli) sono salvati relativi a questa
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dimensione dei blocchi letti e scritti durante backup e ripristino
+CHUNK_SIZE = 1024 * 1024
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_FORMAT = 1
+
+BACKUP_CATEGORIES = (
+    "Immobili",
+    "Prenotazioni",
+    "Chat e Comunicazioni",
+    "Impostazioni",
+    "Prezzi",
+    "Database",
+    "Foto",
+)
+
+PHOTOS_DIR = os.path.join("data", "property_photos")
+
+def _category_files(category):
+    """File esistenti che appartengono a una categoria di backup"""
+    if category == "Immobili":
+        paths = [json_database.DATABASE_FILE, json_database.get_journal_file()]
+    elif category == "Prenotazioni":
+        paths = [booking_database.BOOKINGS_DB_FILE]
+    elif category == "Chat e Comunicazioni":
+        # Gli indici .idx sono solo una cache e vengono ricostruiti
+        paths = glob.glob(os.path.join(message_service.MESSAGE_LOG_DIR, "message_logs*.jsonl"))
+    elif category == "Impostazioni":
+        paths = [os.path.join("data", "cleaning_services.json")]
+    elif category == "Prezzi":
+        from utils import price_calendar
+        paths = glob.glob(os.path.join(price_calendar.PRICE_CALENDAR_DIR, "*"))
+        paths += glob.glob(os.path.join("data", "pricing_*.json"))
+    elif category == "Foto":
+        paths = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(PHOTOS_DIR)
+            for name in names
+        ]
+    else:
+        return []
+    return sorted(path for path in paths if os.path.isfile(path) and not path.endswith((".lock", ".tmp")))
+
+def _category_lock(category):
+    """Lock da tenere mentre si copiano i file di una categoria"""
+    if category == "Prezzi":
+        from utils import price_calendar
+        if os.path.isdir(price_calendar.PRICE_CALENDAR_DIR):
+            # Le matrici mappate in memoria vengono scritte in place sotto il lock di
+            # meta.json: prices.f32, status.u8 e meta.json vanno copiati insieme
+            return file_lock(os.path.join(price_calendar.PRICE_CALENDAR_DIR, "meta.json"))
+    return contextlib.nullcontext()
+
+def _sqlite_path():
+    """Percorso del database SQLite dell'applicazione, None se non è un file SQLite"""
+    from utils.database import engine
+    if engine.url.get_backend_name() != "sqlite":
+        return None
+    path = engine.url.database
+    return path if path and path != ":memory:" else None
+
+def _archive_path(path):
+    """
+    Percorso salvato nel manifest, con /, e cartella a cui è relativo
+
+    I percorsi assoluti sotto PROJECT_ROOT sono salvati relativi al progetto
+    ("root"), quelli relativi restano relativi alla cartella di lavoro ("cwd"),
+    come li usa l'applicazione: il backup si ripristina anche se l'app viene
+    avviata da un'altra cartella.
+
+    Returns:
+        tuple: (percorso, "root" oppure "cwd")
+    """
+    if os.path.isabs(path):
+        relative = os.path.relpath(path, PROJECT_ROOT)
+        if not relative.startswith(".."):
+            return relative.replace(os.sep, "/"), "root"
+    return os.path.relpath(os.path.abspath(path)).replace(os.sep, "/"), "cwd"
+
+def _local_path(entry):
+    """Percorso locale di un file del manifest (i manifest senza "base" sono relativi alla cartella di lavoro)"""
+    path = os.path.normpath(entry["path"])
+    if os.path.isabs(path) or path.startswith(".."):
+        raise ValueError(f"Percorso non valido nel backup: {entry['path']}")
+    if entry.get("base") == "root":
+        return os.path.join(PROJECT_ROOT, path)
+    return path
+
+def _entry_key(entry):
+    return (entry.get("base", "cwd"), entry["path"])
+
+def _copy_chunks(source, target, size=None, digest=None):
+    """Copia a blocchi (al massimo size byte) aggiornando l'hash, restituisce i byte copiati"""
+    copied = 0
+    while size is None or copied < size:
+        chunk = source.read(CHUNK_SIZE if size is None else min(CHUNK_SIZE, size - copied))
+        if not chunk:
+            break
+        if digest is not None:
+            digest.update(chunk)
+        if target is not None:
+            target.write(chunk)
+        copied += len(chunk)
+    return copied
+
+class _HashingReader:
+    """File in lettura che calcola lo sha256 dei byte letti (per tarfile.addfile)"""
+
+    def __init__(self, handle):
+        self._handle = handle
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        chunk = self._handle.read(size)
+        self.digest.update(chunk)
+        return chunk
+
+def list_backups(backup_dir=BACKUP_DIR):
+    """
+    Backup disponibili, dal più recente
+
+    Returns:
+        list: Manifest dei backup (dict con name, created_at, parent, categories, files)
+    """
+    manifests = []
+    for path in glob.glob(os.path.join(backup_dir, "*.manifest.json")):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifests.append(json.load(f))
+        except (OSError, json.JSONDecodeError):
+            continue
+    return sorted(manifests, key=lambda manifest: manifest["name"], reverse=True)
+
+def create_backup(categories=BACKUP_CATEGORIES, backup_dir=BACKUP_DIR, full=False):
+    """
+    Crea un backup incrementale delle categorie indicate
+
+    Args:
+        categories (iterable): Categorie da salvare (vedi BACKUP_CATEGORIES)
+        backup_dir (str): Cartella degli archivi
+        full (bool): Se True non riusa i contenuti dei backup precedenti
+            (archivio ripristinabile da solo)
+
+    Returns:
+        dict: Manifest del backup, con "path" (percorso dell'archivio), "stored"
+            (file copiati in questo archivio) e "reused" (file rimandati ai backup precedenti)
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    categories = [category for category in BACKUP_CATEGORIES if category in set(categories)]
+    name = f"ciaohost_backup_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.tar.gz"
+    archive = os.path.join(backup_dir, name)
+
+    # Contenuti già salvati negli archivi esistenti: per percorso (scorciatoia su
+    # dimensione/mtime, vale la versione più recente) e per sha256
+    previous = [] if full else [
+        manifest for manifest in list_backups(backup_dir)
+        if os.path.exists(os.path.join(backup_dir, manifest["name"]))
+    ]
+    previous_files = {}
+    known_blobs = {}
+    for manifest in previous:
+        for entry in manifest["files"]:
+            if os.path.exists(os.path.join(backup_dir, entry["archive"])):
+                previous_files.setdefault(_entry_key(entry), entry)
+                known_blobs.setdefault(entry["sha256"], (entry["archive"], entry["member"]))
+
+    manifest = {
+        "format": MANIFEST_FORMAT,
+        "name": name,
+        "created_at": datetime.now().isoformat(),
+        "parent": previous[0]["name"] if previous else None,
+        "categories": categories,
+        "files": [],
+    }
+    stored = reused = 0
+    sqlite_snapshot = None
+
+    try:
+        with tarfile.open(archive + ".tmp", "w:gz") as tar:
+            for category in categories:
+                if category == "Database":
+                    source = _sqlite_path()
+                    if not source or not os.path.exists(source):
+                        continue
+                    sqlite_snapshot = _snapshot_sqlite(source, backup_dir)
+                    files = [(source, sqlite_snapshot)]
+                else:
+                    files = None
+
+                with _category_lock(category):
+                    if files is None:
+                        files = [(path, path) for path in _category_files(category)]
+                    for path, read_path in files:
+                        entry, added = _backup_file(tar, name, category, path, read_path, previous_files, known_blobs)
+                        manifest["files"].append(entry)
+                        stored += added
+                        reused += not added
+
+            data = json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+            info = tarfile.TarInfo(MANIFEST_NAME)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+
+        os.replace(archive + ".tmp", archive)
+        atomic_write_json(archive[:-len(".tar.gz")] + ".manifest.json", manifest, ensure_ascii=False, indent=2)
+    finally:
+        if os.path.exists(archive + ".tmp"):
+            os.remove(archive + ".tmp")
+        if sqlite_snapshot and os.path.exists(sqlite_snapshot):
+            os.remove(sqlite_snapshot)
+
+    return {**manifest, "path": archive, "stored": stored, "reused": reused}
+
+def _snapshot_sqlite(source, backup_dir):
+    """Copia coerente del database SQLite in un file temporaneo"""
+    fd, snapshot = tempfile.mkstemp(dir=backup_dir, prefix=".sqlite-", suffix=".tmp")
+    os.close(fd)
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(snapshot)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+    return snapshot
+
+def _backup_file(tar, name, category, path, read_path, previous_files, known_blobs):
+    """
+    Aggiunge un file al backup, copiandolo solo se il suo contenuto non è già salvato
+
+    Returns:
+        tuple: (voce del manifest, True se il contenuto è stato copiato in questo archivio)
+    """
+    archive_path, base = _archive_path(path)
+    with open(read_path, "rb") as handle:
+        stat = os.fstat(handle.fileno())
+        # I file in sola aggiunta (journal, log) possono crescere durante la copia:
+        # salviamo i primi size byte, gli stessi in entrambe le letture
+        size = stat.st_size
+        entry = {
+            "path": archive_path,
+            "base": base,
+            "category": category,
+            "size": size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+
+        prev = previous_files.get((base, archive_path))
+        if prev and read_path == path and prev["size"] == size and prev["mtime_ns"] == stat.st_mtime_ns:
+            # Stesso file del backup precedente: nessuna lettura
+            entry.update(sha256=prev["sha256"], archive=prev["archive"], member=prev["member"])
+            return entry, False
+
+        digest = hashlib.sha256()
+        _copy_chunks(handle, None, size, digest)
+        sha256 = digest.hexdigest()
+        if sha256 in known_blobs:
+            entry["sha256"] = sha256
+            entry["archive"], entry["member"] = known_blobs[sha256]
+            return entry, False
+
+        member = f"blobs/{sha256}"
+        handle.seek(0)
+        info = tarfile.TarInfo(member)
+        info.size = size
+        info.mtime = int(stat.st_mtime)
+        reader = _HashingReader(handle)
+        tar.addfile(info, reader)
+
+    # Il contenuto può essere cambiato tra le due letture (es. scrittura in place):
+    # nel manifest va l'hash di quello effettivamente salvato
+    entry["sha256"] = reader.digest.hexdigest()
+    entry["archive"], entry["member"] = name, member
+    known_blobs[entry["sha256"]] = (name, member)
+    return entry, True
+
+def restore_backup(source, categories=None, mode="replace", backup_dir=BACKUP_DIR):
+    """
+    Ripristina un backup
+
+    Args:
+        source (str | file): Percorso dell'archivio oppure file aperto in lettura
+            binaria (es. un file caricato dall'utente); i contenuti rimandati a
+            backup precedenti vengono letti dagli archivi in backup_dir
+        categories (iterable, optional): Categorie da ripristinare (default tutte
+            quelle del backup)
+        mode (str): "replace" sostituisce i file esistenti; "merge" aggiunge a
+            immobili, utenti e prenotazioni solo i record mancanti e ripristina gli
+            altri file solo se non esistono
+        backup_dir (str): Cartella degli archivi
+
+    Returns:
+        dict: Numero di file ripristinati ("restored") e saltati ("skipped")
+
+    Raises:
+        ValueError: Se l'archivio non è un backup valido, mancano archivi
+            precedenti o un contenuto non corrisponde al suo sha256
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=backup_dir, prefix=".restore-")
+    try:
+        manifest = _extract_archive(source, staging)
+        if manifest is None or manifest.get("format") != MANIFEST_FORMAT:
+            raise ValueError("L'archivio non contiene un manifest di backup valido")
+
+        selected = set(manifest["categories"] if categories is None else categories)
+        entries = [entry for entry in manifest["files"] if entry["category"] in selected]
+
+        # Contenuti che stanno negli archivi precedenti
+        missing = {}
+        for entry in entries:
+            if not os.path.exists(os.path.join(staging, entry["member"])):
+                missing.setdefault(entry["archive"], set()).add(entry["member"])
+        for archive, members in missing.items():
+            archive_path = os.path.join(backup_dir, archive)
+            if not os.path.exists(archive_path):
+                raise ValueError(f"Backup precedente non trovato: {archive}")
+            _extract_archive(archive_path, staging, members)
+
+        # In merge il journal del backup viene applicato al suo snapshot prima dell'unione
+        journal = os.path.abspath(json_database.get_journal_file())
+        journal_blob = next(
+            (os.path.join(staging, entry["member"]) for entry in entries
+             if os.path.abspath(_local_path(entry)) == journal),
+            None,
+        )
+
+        restored = skipped = 0
+        for entry in entries:
+            if _restore_file(entry, staging, mode, journal_blob):
+                restored += 1
+            else:
+                skipped += 1
+
+        if mode == "replace" and "Immobili" in selected and journal_blob is None:
+            # Un journal locale più recente verrebbe riapplicato sopra lo snapshot ripristinato
+            with file_lock(json_database.DATABASE_FILE):
+                if os.path.exists(json_database.get_journal_file()):
+                    os.remove(json_database.get_journal_file())
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    # Le cache di processo devono rileggere i file ripristinati
+    json_cache.invalidate()
+    from utils.repository import get_repository
+    get_repository().invalidate()
+
+    return {"restored": restored, "skipped": skipped}
+
+def _extract_archive(source, staging, members=None):
+    """
+    Estrae a blocchi i contenuti di un archivio nella cartella di appoggio
+
+    Args:
+        source (str | file): Archivio tar.gz
+        staging (str): Cartella in cui scrivere i membri blobs/<sha256>
+        members (set, optional): Membri da estrarre (default tutti)
+
+    Returns:
+        dict: Manifest dell'archivio, None se assente
+    """
+    manifest = None
+    # Modalità stream ("r|gz"): l'archivio viene letto una sola volta, in avanti
+    if isinstance(source, str):
+        tar = tarfile.open(source, "r|gz")
+    else:
+        tar = tarfile.open(fileobj=source, mode="r|gz")
+    with tar:
+        for info in tar:
+            if info.name == MANIFEST_NAME:
+                manifest = json.load(tar.extractfile(info))
+            elif info.isfile() and info.name.startswith("blobs/") and (members is None or info.name in members):
+                target = os.path.join(staging, "blobs", os.path.basename(info.name))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, "wb") as f:
+                    _copy_chunks(tar.extractfile(info), f)
+    return manifest
+
+def _restore_file(entry, staging, mode, journal_blob=None):
+    """
+    Scrive un file del backup al suo posto
+
+    Args:
+        entry (dict): Voce del manifest
+        staging (str): Cartella con i contenuti estratti
+        mode (str): "replace" oppure "merge"
+        journal_blob (str, optional): Journal degli immobili estratto dal backup
+
+    Returns:
+        bool: False se il file è stato saltato
+    """
+    blob = os.path.join(staging, entry["member"])
+    path = _local_path(entry)
+
+    if entry["category"] == "Database":
+        target = _sqlite_path() or path
+        if mode == "merge" and os.path.exists(target):
+            return False
+        _verify_blob(blob, entry["sha256"])
+        _restore_sqlite(blob, target)
+        return True
+
+    if mode == "merge":
+        if os.path.abspath(path) == os.path.abspath(json_database.get_journal_file()):
+            # Il journal del backup è già applicato allo snapshot unito ai dati attuali
+            return False
+        if os.path.exists(path) or (journal_blob and os.path.abspath(path) == os.path.abspath(json_database.DATABASE_FILE)):
+            return _merge_json_document(entry, blob, journal_blob)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        digest = hashlib.sha256()
+        with open(blob, "rb") as source, os.fdopen(fd, "wb") as target:
+            _copy_chunks(source, target, digest=digest)
+            target.flush()
+            os.fsync(target.fileno())
+        if digest.hexdigest() != entry["sha256"]:
+            raise ValueError(f"Contenuto danneggiato nel backup: {entry['path']}")
+        if path.endswith((".json", ".jsonl", ".journal")):
+            # Stesso lock usato da chi scrive i documenti JSON e i log
+            with file_lock(path):
+                os.replace(temp_path, path)
+        else:
+            os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    if path.endswith(".jsonl") and os.path.exists(path + ".idx"):
+        # L'indice salvato descrive il segmento precedente
+        os.remove(path + ".idx")
+    return True
+
+def _verify_blob(blob, sha256):
+    digest = hashlib.sha256()
+    with open(blob, "rb") as f:
+        _copy_chunks(f, None, digest=digest)
+    if digest.hexdigest() != sha256:
+        raise ValueError("Contenuto danneggiato nel backup: database")
+
+def _restore_sqlite(blob, target):
+    """Copia il database salvato su quello in uso con l'API di backup di sqlite3"""
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    src = sqlite3.connect(blob)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+    from utils.database import engine
+    engine.dispose()
+
+def _merge_json_document(entry, blob, journal_blob=None):
+    """
+    Unisce immobili/utenti o prenotazioni del backup ai dati esistenti (prevalgono quelli esistenti)
+
+    Args:
+        entry (dict): Voce del manifest
+        blob (str): Contenuto del file nel backup
+        journal_blob (str, optional): Journal degli immobili del backup, applicato
+            allo snapshot prima dell'unione
+
+    Returns:
+        bool: True se il file era un documento unibile
+    """
+    path = os.path.abspath(_local_path(entry))
+    if path == os.path.abspath(json_database.DATABASE_FILE):
+        sections = ("properties", "users")
+    elif path == os.path.abspath(booking_database.BOOKINGS_DB_FILE):
+        sections = ("bookings",)
+    else:
+        return False
+
+    with open(blob, "r", encoding="utf-8") as f:
+        backup = json.load(f)
+    if journal_blob and sections == ("properties", "users"):
+        backup = json_database.apply_journal(backup, journal_blob)
+
+    def add_missing(data):
+        for section in sections:
+            current = data.setdefault(section, {})
+            for key, value in backup.get(section, {}).items():
+                current.setdefault(key, value)
+
+    if sections == ("bookings",):
+        update_json(booking_database.BOOKINGS_DB_FILE, add_missing, booking_database.load_bookings_database,
+                    indent=2, ensure_ascii=False)
+    else:
+        # load_database include il journal, save_database lo incorpora nello snapshot
+        with file_lock(json_database.DATABASE_FILE):
+            data = json_database.load_database()
+            add_missing(data)
+            json_database.save_database(data)
+    return True
@@ -1,11 +1,46 @@
 import json
 import os
+import threading
 from datetime import datetime
+from types import MappingProxyType
+
+from utils import json_cache
+from utils.json_writer import atomic_write_json, file_lock, update_json
 
 BOOKINGS_DB_FILE = "DatabaseCiaoHostPrenotazioni.json"
 
-def load_bookings_database():
-    """Carica il database delle prenotazioni da file JSON"""
+# Backend usato in lettura: "json" legge il file, "sqlite" interroga data/ciao_host.db
+# (allineato ad ogni scrittura, vedi utils/json_to_sqlite.py)
+STORAGE_BACKEND = os.environ.get("CIAOHOST_STORAGE_BACKEND", "json")
+
+# Record tipizzati dell'ultima vista letta: (vista, {booking_id: BookingRecord})
+_records_cache = (None, MappingProxyType({}))
+_records_lock = threading.Lock()
+
+# Funzioni richiamate dopo ogni prenotazione salvata da questo processo
+# (es. l'indice delle disponibilità in utils/availability_index.py)
+_booking_listeners = []
+
+def add_booking_listener(listener):
+    """
+    Registra una funzione da richiamare dopo ogni prenotazione salvata
+
+    Args:
+        listener (callable): Riceve booking_id, la prenotazione e la coppia
+            (firma del file prima, firma dopo) della scrittura, vedi json_writer.update_json
+    """
+    if listener not in _booking_listeners:
+        _booking_listeners.append(listener)
+
+def _notify_booking_listeners(booking_id, booking, signatures):
+    for listener in list(_booking_listeners):
+        try:
+            listener(booking_id, booking, signatures)
+        except Exception as e:
+            print(f"Errore durante l'aggiornamento dopo la prenotazione {booking_id}: {e}")
+
+def _read_bookings_database():
+    """Legge il database delle prenotazioni da file JSON"""
     if os.path.exists(BOOKINGS_DB_FILE):
         try:
             with open(BOOKINGS_DB_FILE, 'r', encoding='utf-8') as f:
@@ -18,20 +53,150 @@ def load_bookings_database():
         save_bookings_database({"bookings": {}})
         return {"bookings": {}}
 
+def get_bookings_view():
+    """Vista in sola lettura del database delle prenotazioni, condivisa tra le sessioni e riletta solo se il file cambia"""
+    return json_cache.load_cached(os.path.abspath(BOOKINGS_DB_FILE), [BOOKINGS_DB_FILE], _read_bookings_database)
+
+def get_bookings_version():
+    """Versione del database delle prenotazioni in cache, cambia ad ogni nuova lettura del file"""
+    get_bookings_view()
+    return json_cache.get_version(os.path.abspath(BOOKINGS_DB_FILE))
+
+def load_bookings_database():
+    """Carica il database delle prenotazioni da file JSON"""
+    return json_cache.thaw(get_bookings_view())
+
+def get_booking_records():
+    """
+    Prenotazioni come BookingRecord con le date già convertite
+
+    La conversione avviene una sola volta per ogni versione del file e il
+    risultato è condiviso (in sola lettura) da tutte le sessioni del processo.
+    Se il file contiene ancora date in formati vecchi (ISO, GG-MM-AAAA) vengono
+    riscritte una volta nel formato GG/MM/AAAA, vedi normalize_booking_dates.
+
+    Returns:
+        MappingProxyType: {booking_id: BookingRecord}
+    """
+    global _records_cache
+    from utils.booking_records import BookingRecord
+    
+    if STORAGE_BACKEND == "sqlite":
+        bookings = query_bookings()
+        return MappingProxyType({
+            booking_id: BookingRecord.from_dict(booking_id, booking)
+            for booking_id, booking in bookings.items()
+        })
+    
+    # La vista in cache cambia oggetto ad ogni nuova lettura del file
+    view = get_bookings_view()
+    with _records_lock:
+        cached_view, records = _records_cache
+        if cached_view is view:
+            return records
+        bookings = view.get('bookings', {})
+        records = MappingProxyType({
+            booking_id: BookingRecord.from_dict(booking_id, booking)
+            for booking_id, booking in bookings.items()
+        })
+        _records_cache = (view, records)
+    
+    # Migrazione delle date in formati vecchi, fuori dal lock dei record: la
+    # scrittura rilegge il file e cambia la vista
+    if _has_legacy_dates(bookings):
+        try:
+            normalize_booking_dates()
+        except Exception as e:
+            print(f"Errore durante la conversione delle date delle prenotazioni: {e}")
+    return records
+
+def _has_legacy_dates(bookings):
+    """True se qualche data valida non è salvata nel formato GG/MM/AAAA"""
+    from utils.booking_records import is_json_date, parse_date
+    
+    return any(
+        value and not is_json_date(value) and parse_date(value) is not None
+        for booking in bookings.values()
+        for value in (booking.get('check_in_date'), booking.get('check_out_date'))
+    )
+
+def normalize_booking_dates():
+    """
+    Riscrive nel formato GG/MM/AAAA le date delle prenotazioni salvate in formati vecchi (ISO, GG-MM-AAAA)
+
+    Returns:
+        int: Numero di prenotazioni modificate
+    """
+    from utils.booking_records import format_json_date, parse_date
+    
+    def normalize(data):
+        changed = 0
+        for booking in data.get('bookings', {}).values():
+            updated = False
+            for field in ('check_in_date', 'check_out_date'):
+                value = booking.get(field)
+                normalized = format_json_date(parse_date(value))
+                if normalized and normalized != value:
+                    booking[field] = normalized
+                    updated = True
+            changed += updated
+        return changed
+    
+    return update_json(BOOKINGS_DB_FILE, normalize, load_bookings_database, indent=2, ensure_ascii=False)
+
 def save_bookings_database(data):
     """Salva il database delle prenotazioni su file JSON"""
     try:
-        with open(BOOKINGS_DB_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        with file_lock(BOOKINGS_DB_FILE):
+            atomic_write_json(BOOKINGS_DB_FILE, data, indent=2, ensure_ascii=False)
     except Exception as e:
         print(f"Errore durante il salvataggio del database delle prenotazioni: {e}")
 
-def add_booking(booking_data):
-    """Aggiunge una nuova prenotazione al database"""
+class BookingConflictError(Exception):
+    """Le date della prenotazione si sovrappongono a un'altra prenotazione dello stesso immobile"""
+
+def find_overlapping_booking(bookings, booking):
+    """
+    Cerca una prenotazione che occupa lo stesso immobile nelle date di booking
+
+    Args:
+        bookings (dict): {booking_id: prenotazione} nel formato del file JSON
+        booking (dict): Prenotazione da confrontare
+
+    Returns:
+        str: ID della prima prenotazione sovrapposta, None se le date sono libere
+    """
+    from utils.availability_index import booking_stay
+    
+    stay = booking_stay(booking)
+    if stay is None:
+        return None
+    property_id, check_in, check_out = stay
+    for other_id, other in bookings.items():
+        other_stay = booking_stay(other)
+        # Il giorno di check-out è libero per un nuovo check-in
+        if (other_stay is not None and other_stay[0] == property_id
+                and other_stay[1] < check_out and other_stay[2] > check_in):
+            return other_id
+    return None
+
+def add_booking(booking_data, reject_overlaps=False):
+    """
+    Aggiunge una nuova prenotazione al database
+
+    Args:
+        booking_data (dict): Prenotazione da salvare
+        reject_overlaps (bool): Se True il controllo delle date avviene sotto il
+            lock del file, insieme all'inserimento, così due sessioni non possono
+            prenotare le stesse date
+
+    Returns:
+        str: ID della prenotazione, None in caso di errore
+
+    Raises:
+        BookingConflictError: Se reject_overlaps è True e le date sono già occupate
+    """
     try:
-        # Carica il database attuale
-        data = load_bookings_database()
-        
         # Genera un ID univoco per la prenotazione
         import uuid
         booking_id = str(uuid.uuid4())
@@ -39,18 +204,117 @@ def add_booking(booking_data):
         # Aggiungi timestamp
         booking_data['created_at'] = datetime.now().isoformat()
         
-        # Aggiungi la prenotazione al database
-        data['bookings'][booking_id] = booking_data
+        def insert_booking(data):
+            bookings = data.setdefault('bookings', {})
+            if reject_overlaps:
+                conflict = find_overlapping_booking(bookings, booking_data)
+                if conflict is not None:
+                    raise BookingConflictError(f"Date già occupate dalla prenotazione {conflict}")
+            bookings[booking_id] = booking_data
+        
+        # Rilegge il database sotto lock e salva la prenotazione insieme alle altre
+        # scritture concorrenti, senza sovrascrivere quelle degli altri processi
+        _, before, after = update_json(
+            BOOKINGS_DB_FILE, insert_booking, load_bookings_database,
+            with_signatures=True, indent=2, ensure_ascii=False
+        )
         
-        # Salva il database aggiornato
-        save_bookings_database(data)
+        _sync_booking(booking_id, booking_data)
+        _notify_booking_listeners(booking_id, booking_data, (before, after))
         
         return booking_id
+    except BookingConflictError:
+        raise
     except Exception as e:
         print(f"Errore durante l'aggiunta della prenotazione: {e}")
         return None
 
+def update_booking(booking_id, changes):
+    """
+    Aggiorna alcuni campi di una prenotazione esistente
+
+    Args:
+        booking_id (str): ID della prenotazione
+        changes (dict): Campi da modificare (es. {"status": "Completata"})
+
+    Returns:
+        bool: True se la prenotazione è stata aggiornata, False se non esiste o in caso di errore
+    """
+    try:
+        updated = {}
+        
+        def apply_changes(data):
+            booking = data.get('bookings', {}).get(booking_id)
+            if booking is None:
+                return False
+            booking.update(changes)
+            updated.update(booking)
+            return True
+        
+        # Come add_booking: solo questa prenotazione viene modificata, le altre
+        # restano quelle lette sotto lock
+        found, before, after = update_json(
+            BOOKINGS_DB_FILE, apply_changes, load_bookings_database,
+            with_signatures=True, indent=2, ensure_ascii=False
+        )
+        if not found:
+            return False
+        
+        _sync_booking(booking_id, updated)
+        _notify_booking_listeners(booking_id, updated, (before, after))
+        
+        return True
+    except Exception as e:
+        print(f"Errore durante l'aggiornamento della prenotazione {booking_id}: {e}")
+        return False
+
+def _sync_booking(booking_id, booking):
+    """Allinea la copia SQLite di una prenotazione appena salvata nel file JSON"""
+    if STORAGE_BACKEND == "sqlite":
+        from utils.json_database import get_database_view
+        from utils.json_to_sqlite import sync_booking
+        prop = get_database_view().get('properties', {}).get(booking.get('property_id'))
+        sync_booking(booking_id, booking, prop)
+
 def get_all_bookings():
-    """Restituisce tutte le prenotazioni nel database"""
-    data = load_bookings_database()
-    return data.get('bookings', {})
\ No newline at end of file
+    """
+    Restituisce tutte le prenotazioni nel database
+
+    Returns:
+        MappingProxyType: {booking_id: prenotazione}, in sola lettura con entrambi i backend
+    """
+    if STORAGE_BACKEND == "sqlite":
+        return json_cache.freeze(query_bookings())
+    return get_bookings_view().get('bookings', MappingProxyType({}))
+
+def get_bookings_for_property(property_id):
+    """Restituisce le prenotazioni di un immobile come dizionario {id: prenotazione} in sola lettura"""
+    if STORAGE_BACKEND == "sqlite":
+        return json_cache.freeze(query_bookings(property_id))
+    return MappingProxyType({
+        booking_id: booking
+        for booking_id, booking in get_bookings_view().get('bookings', {}).items()
+        if booking.get('property_id') == property_id
+    })
+
+def query_bookings(property_id=None):
+    """
+    Legge le prenotazioni da SQLite nel formato del file JSON
+
+    Args:
+        property_id (str, optional): Solo le prenotazioni di questo immobile
+
+    Returns:
+        dict: {booking_id: prenotazione}, una copia modificabile
+    """
+    from utils.database import Booking, Property, get_db_session
+    from utils.json_to_sqlite import booking_to_json
+    
+    session = get_db_session()
+    try:
+        query = session.query(Booking, Property.name).outerjoin(Property, Booking.property_id == Property.id)
+        if property_id is not None:
+            query = query.filter(Booking.property_id == property_id)
+        return {booking.id: booking_to_json(booking, name) for booking, name in query}
+    finally:
+        session.close()
\ No newline at end of file
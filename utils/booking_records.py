@@ -0,0 +1,156 @@
+"""
+Record tipizzato delle prenotazioni con date già convertite.
+
+Le prenotazioni arrivano in due formati: quello del file JSON
+(check_in_date/check_out_date come "GG/MM/AAAA", a volte in formati più vecchi)
+e quello di utils/database.py (checkin_date/checkout_date in ISO).
+BookingRecord li normalizza una sola volta in campi datetime.date, così chi
+filtra, ordina o calcola le notti non deve più chiamare strptime per ogni riga.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Optional
+
+# Formato con cui le date vengono salvate nel file JSON delle prenotazioni
+JSON_DATE_FORMAT = "%d/%m/%Y"
+
+# Formati accettati per le date di check-in/check-out nel JSON (il primo è quello attuale)
+BOOKING_DATE_FORMATS = (JSON_DATE_FORMAT, "%Y-%m-%d", "%d-%m-%Y")
+
+@lru_cache(maxsize=8192)
+def _parse_date_string(value):
+    # Le stesse date si ripetono in migliaia di prenotazioni: la cache evita strptime
+    value = value.strip()
+    for date_format in BOOKING_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+def parse_booking_date(value):
+    """
+    Converte una data di prenotazione (GG/MM/AAAA, AAAA-MM-GG o GG-MM-AAAA) in datetime.date
+
+    Returns:
+        date: La data convertita (date e datetime vengono accettati così come sono),
+            None se mancante, non valida o di un altro tipo
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if not isinstance(value, str) or not value:
+        return None
+    return _parse_date_string(value)
+
+def parse_date(value):
+    """
+    Converte una data (GG/MM/AAAA, ISO con o senza orario, date o datetime) in datetime.date
+
+    Returns:
+        date: La data convertita, None se mancante o non valida
+    """
+    parsed = parse_booking_date(value)
+    if parsed is None and isinstance(value, str) and value.strip():
+        try:
+            parsed = datetime.fromisoformat(value.strip()).date()
+        except ValueError:
+            return None
+    return parsed
+
+def is_json_date(value):
+    """True se value è una data già nel formato GG/MM/AAAA del file JSON"""
+    return isinstance(value, str) and len(value) == 10 and value[2] == "/" and value[5] == "/"
+
+def _to_float(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _to_int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+@dataclass(slots=True, frozen=True)
+class BookingRecord:
+    """Prenotazione normalizzata, in sola lettura"""
+    id: str
+    property_id: str
+    property_name: str
+    check_in: Optional[date]
+    check_out: Optional[date]
+    guests: int
+    status: str
+    user_email: str
+    guest_name: str
+    check_in_time: str
+    special_requests: str
+    total_price: float
+    cleaning_fee: float
+    created_at: str
+
+    @classmethod
+    def from_dict(cls, booking_id, data):
+        """
+        Crea il record da una prenotazione nel formato JSON o in quello di utils/database.py
+
+        Args:
+            booking_id (str): ID della prenotazione (se None si usa data["id"])
+            data (dict): Prenotazione
+
+        Returns:
+            BookingRecord: Record con le date convertite (None se non valide)
+        """
+        user_email = data.get("user_email") or data.get("guest_email") or ""
+        return cls(
+            id=booking_id if booking_id is not None else data.get("id", ""),
+            property_id=data.get("property_id", ""),
+            property_name=data.get("property_name", ""),
+            check_in=parse_date(data.get("check_in_date") or data.get("checkin_date")),
+            check_out=parse_date(data.get("check_out_date") or data.get("checkout_date")),
+            guests=_to_int(data.get("guests", 1), 1),
+            status=data.get("status", ""),
+            user_email=user_email,
+            guest_name=data.get("guest_name") or (user_email.split("@")[0] if user_email else ""),
+            check_in_time=data.get("check_in_time") or data.get("checkin_time") or "",
+            special_requests=data.get("special_requests") or data.get("notes") or "",
+            total_price=_to_float(data.get("total_price")),
+            cleaning_fee=_to_float(data.get("cleaning_fee")),
+            created_at=data.get("created_at") or "",
+        )
+
+    @property
+    def nights(self):
+        """Numero di notti, 0 se le date non sono valide"""
+        if self.check_in is None or self.check_out is None:
+            return 0
+        return max((self.check_out - self.check_in).days, 0)
+
+    def overlaps(self, start, end):
+        """True se il soggiorno tocca l'intervallo chiuso [start, end]"""
+        return (self.check_in is not None and self.check_out is not None
+                and self.check_in <= end and self.check_out >= start)
+
+def format_json_date(value):
+    """Data nel formato GG/MM/AAAA del file JSON, stringa vuota se None"""
+    return value.strftime(JSON_DATE_FORMAT) if value else ""
+
+def to_records(bookings):
+    """
+    Converte un insieme di prenotazioni in record
+
+    Args:
+        bookings (dict | list): {booking_id: prenotazione} oppure lista di
+            prenotazioni con il campo "id"
+
+    Returns:
+        list: BookingRecord nello stesso ordine
+    """
+    if hasattr(bookings, "items"):
+        return [BookingRecord.from_dict(booking_id, booking) for booking_id, booking in bookings.items()]
+    return [BookingRecord.from_dict(None, booking) for booking in bookings]
@@ -1,6 +1,7 @@
 import os
 import json
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, Date
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, exists, func, inspect, insert, or_, select, text, update, Index, Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, Date
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime, timedelta
@@ -11,10 +12,62 @@ import streamlit as st
 os.makedirs('data', exist_ok=True)
 
 # Creiamo una connessione SQLite per la persistenza dei dati
-DATABASE_URL = "sqlite:///data/ciao_host.db"
+DATABASE_URL = os.environ.get("CIAOHOST_DATABASE_URL", "sqlite:///data/ciao_host.db")
+
+# Profilo del motore: "production" abilita WAL, i PRAGMA di tuning e un pool di
+# connessioni dimensionato; "default" usa le impostazioni di SQLAlchemy
+DATABASE_PROFILE = os.environ.get("CIAOHOST_DB_PROFILE", "production")
+
+# PRAGMA applicati ad ogni nuova connessione SQLite nel profilo "production"
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",       # i lettori non bloccano più lo scrittore
+    "synchronous": "NORMAL",     # con WAL resta consistente anche dopo un crash
+    "cache_size": -64000,        # 64 MB di page cache per connessione
+    "mmap_size": 268435456,      # 256 MB letti tramite memory map
+    "busy_timeout": 5000,        # attende fino a 5s un lock invece di fallire
+}
+
+DB_POOL_SIZE = int(os.environ.get("CIAOHOST_DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.environ.get("CIAOHOST_DB_MAX_OVERFLOW", 20))
+
+def _is_memory_database(url):
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+def create_database_engine(url=DATABASE_URL, profile=DATABASE_PROFILE):
+    """
+    Crea il motore SQLAlchemy secondo il profilo richiesto
+
+    Args:
+        url (str): URL del database
+        profile (str): "production" o "default"
+
+    Returns:
+        Engine: Motore del database
+    """
+    if profile != "production" or not url.startswith("sqlite") or _is_memory_database(url):
+        return create_engine(url)
+    
+    production_engine = create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        connect_args={
+            "check_same_thread": False,
+            "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000,
+        },
+    )
+    
+    @event.listens_for(production_engine, "connect")
+    def apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    
+    return production_engine
 
 # Creiamo il motore del database
-engine = create_engine(DATABASE_URL)
+engine = create_database_engine()
 Base = declarative_base()
 
 # Definizione delle tabelle
@@ -36,6 +89,7 @@ class Property(Base):
     wifi_details = Column(Text)
     amenities = Column(Text)  # Stored as JSON string
     status = Column(String(20), default="Attivo")
+    phone = Column(String(50))
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
     
@@ -59,12 +113,19 @@ class Property(Base):
             "wifi_details": self.wifi_details,
             "amenities": json.loads(self.amenities) if self.amenities else [],
             "status": self.status,
+            "phone": self.phone or "",
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None
         }
 
 class Booking(Base):
     __tablename__ = 'bookings'
+    __table_args__ = (
+        # Prenotazioni di un immobile in un intervallo di date (disponibilità, calendari)
+        Index('ix_bookings_property_dates', 'property_id', 'checkin_date', 'checkout_date'),
+        Index('ix_bookings_checkin_date', 'checkin_date'),
+        Index('ix_bookings_checkout_date', 'checkout_date'),
+    )
     
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     property_id = Column(String(36), ForeignKey('properties.id'), nullable=False)
@@ -73,6 +134,7 @@ class Booking(Base):
     guest_phone = Column(String(50))
     checkin_date = Column(Date, nullable=False)
     checkout_date = Column(Date, nullable=False)
+    checkin_time = Column(String(10))
     guests = Column(Integer, default=1)
     price_per_night = Column(Float, nullable=False)
     cleaning_fee = Column(Float, default=0)
@@ -100,6 +162,7 @@ class Booking(Base):
             "guest_phone": self.guest_phone,
             "checkin_date": self.checkin_date.isoformat() if self.checkin_date else None,
             "checkout_date": self.checkout_date.isoformat() if self.checkout_date else None,
+            "checkin_time": self.checkin_time,
             "guests": self.guests,
             "price_per_night": self.price_per_night,
             "cleaning_fee": self.cleaning_fee,
@@ -117,6 +180,11 @@ class Booking(Base):
 
 class Invoice(Base):
     __tablename__ = 'invoices'
+    __table_args__ = (
+        Index('ix_invoices_booking_id', 'booking_id'),
+        # Elenco fatture: filtro per intervallo di date e ordinamento per data
+        Index('ix_invoices_date', 'date'),
+    )
     
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     booking_id = Column(String(36), ForeignKey('bookings.id'), nullable=False)
@@ -148,6 +216,13 @@ class Invoice(Base):
             "created_at": self.created_at.isoformat() if self.created_at else None
         }
 
+class InvoiceSequence(Base):
+    """Contatore dei numeri di fattura, una riga per anno"""
+    __tablename__ = 'invoice_sequences'
+    
+    year = Column(Integer, primary_key=True)
+    last_value = Column(Integer, nullable=False, default=0)
+
 class CleaningService(Base):
     __tablename__ = 'cleaning_services'
     
@@ -172,6 +247,11 @@ class CleaningService(Base):
 
 class CleaningTask(Base):
     __tablename__ = 'cleaning_tasks'
+    __table_args__ = (
+        # Stato in uguaglianza, data in intervallo (get_upcoming_cleaning_tasks)
+        Index('ix_cleaning_tasks_status_date', 'status', 'scheduled_date'),
+        Index('ix_cleaning_tasks_scheduled_date', 'scheduled_date'),
+    )
     
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     property_id = Column(String(36), ForeignKey('properties.id'), nullable=False)
@@ -196,8 +276,34 @@ class CleaningTask(Base):
             "booking_id": self.booking_id
         }
 
+# Colonne aggiunte dopo la prima versione dello schema: create_all non modifica
+# le tabelle già esistenti, quindi le aggiungiamo a mano se mancano
+ADDED_COLUMNS = {
+    'properties': {'phone': 'VARCHAR(50)'},
+    'bookings': {'checkin_time': 'VARCHAR(10)'},
+}
+
+def migrate_schema(bind=None):
+    """Porta uno schema esistente all'ultima versione (idempotente)"""
+    bind = bind or engine
+    Base.metadata.create_all(bind)
+    
+    inspector = inspect(bind)
+    with bind.begin() as connection:
+        for table_name, columns in ADDED_COLUMNS.items():
+            existing = {column['name'] for column in inspector.get_columns(table_name)}
+            for column_name, column_type in columns.items():
+                if column_name not in existing:
+                    connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"))
+        
+        # Anche gli indici dichiarati sui modelli non vengono aggiunti da create_all
+        # alle tabelle già esistenti
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
 # Creazione delle tabelle nel database
-Base.metadata.create_all(engine)
+migrate_schema()
 
 # Creazione della sessione
 Session = sessionmaker(bind=engine)
@@ -207,13 +313,43 @@ def get_db_session():
     """Ottiene una sessione di database"""
     return Session()
 
+@contextmanager
+def session_scope():
+    """
+    Unit of work: una sessione e una sola transazione per un gruppo di operazioni
+
+    Esegue il commit all'uscita dal blocco, il rollback in caso di eccezione e
+    chiude sempre la sessione.
+
+    Esempio:
+        with session_scope() as session:
+            session.add(booking)
+            session.add(invoice)
+    """
+    session = get_db_session()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+# Numero massimo di parametri per un singolo IN (...) su SQLite
+IN_CLAUSE_CHUNK = 500
+
+def _chunks(items, size=IN_CLAUSE_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
 def init_db():
     """Inizializza il database"""
     # Assicuriamoci che la directory 'data' esista
     os.makedirs('data', exist_ok=True)
     
     # Crea le tabelle se non esistono
-    Base.metadata.create_all(engine)
+    migrate_schema()
     
     # Inizializza con dati demo se non ci sono proprietà
     session = get_db_session()
@@ -402,6 +538,68 @@ def add_booking(booking_data):
     session.close()
     return result
 
+def _row_to_dict(model, row):
+    """Serializza una riga inserita in bulk come farebbe model.to_dict()"""
+    return model(**row).to_dict()
+
+def _new_row(model, data):
+    """
+    Riga completa per un INSERT multiplo: i valori di data più i default delle colonne del modello
+
+    Raises:
+        TypeError: Se data contiene campi che non sono colonne del modello, come model(**data)
+    """
+    columns = model.__table__.columns
+    for key in data:
+        if key not in columns:
+            raise TypeError(f"{key!r} is an invalid keyword argument for {model.__name__}")
+    
+    row = {}
+    for column in columns:
+        if column.name in data:
+            row[column.name] = data[column.name]
+        elif column.default is None:
+            row[column.name] = None
+        elif column.default.is_callable:
+            row[column.name] = column.default.arg(None)
+        else:
+            row[column.name] = column.default.arg
+    return row
+
+def add_bookings_bulk(bookings_data, create_invoices=True):
+    """
+    Aggiunge più prenotazioni con un unico INSERT multiplo in una sola transazione
+
+    Args:
+        bookings_data (list): Prenotazioni nello stesso formato di add_booking
+        create_invoices (bool): Se True genera anche le fatture, come add_booking
+
+    Returns:
+        list: Prenotazioni inserite (dict)
+
+    Raises:
+        TypeError: Se una prenotazione contiene campi sconosciuti (nessuna viene inserita)
+    """
+    rows = []
+    for booking_data in bookings_data:
+        row = _new_row(Booking, booking_data)
+        
+        # Gestiamo le date
+        for date_field in ['checkin_date', 'checkout_date']:
+            if isinstance(row[date_field], str):
+                row[date_field] = datetime.fromisoformat(row[date_field]).date()
+        rows.append(row)
+    
+    if not rows:
+        return []
+    
+    with session_scope() as session:
+        session.execute(insert(Booking.__table__), rows)
+        if create_invoices:
+            create_invoices_for_bookings([row["id"] for row in rows], session)
+    
+    return [_row_to_dict(Booking, row) for row in rows]
+
 def update_booking(booking_id, booking_data):
     """Aggiorna una prenotazione esistente"""
     session = get_db_session()
@@ -448,50 +646,200 @@ def delete_booking(booking_id):
     session.close()
     return True
 
+def _invoice_values(booking, invoice_number):
+    """Valori della fattura di una prenotazione (IVA inclusa nel totale)"""
+    # Calcoliamo l'importo IVA
+    tax_percentage = 22.0  # IVA standard italiana
+    amount_without_tax = booking.total_price / (1 + tax_percentage/100)
+    tax_amount = booking.total_price - amount_without_tax
+    
+    return {
+        "id": str(uuid.uuid4()),
+        "booking_id": booking.id,
+        "invoice_number": invoice_number,
+        "date": datetime.now().date(),
+        "amount": booking.total_price,
+        "tax_amount": tax_amount,
+        "tax_percentage": tax_percentage,
+        "status": "Emessa" if booking.payment_status == "Pagato" else "In attesa",
+        "payment_date": datetime.now().date() if booking.payment_status == "Pagato" else None,
+        "notes": f"Fattura per prenotazione {booking.guest_name} dal {booking.checkin_date} al {booking.checkout_date}",
+        "created_at": datetime.now()
+    }
+
+def _last_legacy_invoice_number(session, year):
+    """Numero più alto già usato nell'anno, per inizializzare il contatore (una sola volta per anno)"""
+    prefix = f"INV-{year}-"
+    numbers = session.execute(
+        select(Invoice.invoice_number).where(Invoice.invoice_number.like(prefix + "%"))
+    ).scalars()
+    last = 0
+    for number in numbers:
+        suffix = number[len(prefix):]
+        if suffix.isdigit():
+            last = max(last, int(suffix))
+    return last
+
+def allocate_invoice_numbers(session, count=1, year=None):
+    """
+    Riserva un blocco di numeri di fattura consecutivi in modo atomico
+
+    L'UPDATE sul contatore dell'anno prende il lock di scrittura del database,
+    quindi due processi non possono ottenere lo stesso numero; se la transazione
+    viene annullata anche i numeri riservati tornano disponibili.
+
+    Args:
+        session (Session): Sessione della transazione che crea le fatture
+        count (int): Quanti numeri riservare
+        year (int, optional): Anno di numerazione (default: anno corrente)
+
+    Returns:
+        list: Numeri di fattura nel formato INV-AAAA-NNNN
+    """
+    if count <= 0:
+        return []
+    
+    year = year or datetime.now().year
+    table = InvoiceSequence.__table__
+    updated = session.execute(
+        update(table).where(table.c.year == year).values(last_value=table.c.last_value + count)
+    ).rowcount
+    
+    if updated:
+        last_value = session.execute(select(table.c.last_value).where(table.c.year == year)).scalar_one()
+    else:
+        # Primo numero dell'anno: teniamo conto delle fatture numerate col vecchio metodo
+        last_value = _last_legacy_invoice_number(session, year) + count
+        session.execute(insert(table).values(year=year, last_value=last_value))
+    
+    return [f"INV-{year}-{number:04d}" for number in range(last_value - count + 1, last_value + 1)]
+
 def create_invoice_for_booking(booking_id):
     """Crea una fattura per una prenotazione"""
-    session = get_db_session()
-    booking = session.query(Booking).filter(Booking.id == booking_id).first()
+    with session_scope() as session:
+        # Il numero viene riservato per primo: la transazione tiene così il lock di
+        # scrittura anche durante i controlli e viene annullata se la fattura non serve
+        invoice_number = allocate_invoice_numbers(session)[0]
+        
+        booking = session.query(Booking).filter(Booking.id == booking_id).first()
+        if not booking:
+            session.rollback()
+            return None
+        
+        # Controlliamo se esiste già una fattura per questa prenotazione
+        existing_invoice = session.query(Invoice).filter(Invoice.booking_id == booking_id).first()
+        if existing_invoice:
+            result = existing_invoice.to_dict()
+            session.rollback()
+            return result
+        
+        # Creiamo la nuova fattura
+        new_invoice = Invoice(**_invoice_values(booking, invoice_number))
+        session.add(new_invoice)
+        session.flush()
+        return new_invoice.to_dict()
+
+def create_invoices_for_bookings(booking_ids, session=None):
+    """
+    Crea le fatture di più prenotazioni in un'unica transazione
+
+    Le prenotazioni che hanno già una fattura vengono saltate (restituendo la
+    fattura esistente), quelle inesistenti ignorate.
+
+    Args:
+        booking_ids (list): ID delle prenotazioni
+        session (Session, optional): Sessione di una unit of work già aperta;
+            se assente ne viene aperta una e confermata alla fine
+
+    Returns:
+        list: Fatture (dict) delle prenotazioni richieste
+    """
+    if session is None:
+        with session_scope() as scoped_session:
+            return create_invoices_for_bookings(booking_ids, scoped_session)
     
-    if not booking:
-        session.close()
-        return None
+    booking_ids = list(dict.fromkeys(booking_ids))
+    bookings = []
+    existing = {}
+    for chunk in _chunks(booking_ids):
+        bookings.extend(session.query(Booking).filter(Booking.id.in_(chunk)).all())
+        for invoice in session.query(Invoice).filter(Invoice.booking_id.in_(chunk)):
+            existing.setdefault(invoice.booking_id, invoice.to_dict())
     
-    # Controlliamo se esiste già una fattura per questa prenotazione
-    existing_invoice = session.query(Invoice).filter(Invoice.booking_id == booking_id).first()
-    if existing_invoice:
-        result = existing_invoice.to_dict()
-        session.close()
-        return result
+    to_invoice = [booking for booking in bookings if booking.id not in existing]
     
-    # Otteniamo il prossimo numero di fattura
-    invoice_count = session.query(Invoice).count()
-    invoice_number = f"INV-{datetime.now().year}-{invoice_count + 1:04d}"
+    # Un solo blocco di numeri consecutivi per tutte le fatture
+    invoice_numbers = allocate_invoice_numbers(session, len(to_invoice))
+    rows = [
+        _invoice_values(booking, invoice_number)
+        for booking, invoice_number in zip(to_invoice, invoice_numbers)
+    ]
     
-    # Calcoliamo l'importo IVA
-    tax_percentage = 22.0  # IVA standard italiana
-    amount_without_tax = booking.total_price / (1 + tax_percentage/100)
-    tax_amount = booking.total_price - amount_without_tax
+    if rows:
+        session.execute(insert(Invoice.__table__), rows)
     
-    # Creiamo la nuova fattura
-    new_invoice = Invoice(
-        booking_id=booking_id,
-        invoice_number=invoice_number,
-        date=datetime.now().date(),
-        amount=booking.total_price,
-        tax_amount=tax_amount,
-        tax_percentage=tax_percentage,
-        status="Emessa" if booking.payment_status == "Pagato" else "In attesa",
-        payment_date=datetime.now().date() if booking.payment_status == "Pagato" else None,
-        notes=f"Fattura per prenotazione {booking.guest_name} dal {booking.checkin_date} al {booking.checkout_date}"
+    created = {row["booking_id"]: _row_to_dict(Invoice, row) for row in rows}
+    return [existing.get(booking_id) or created[booking_id] for booking_id in booking_ids
+            if booking_id in existing or booking_id in created]
+
+# Stati (confrontati in minuscolo) delle prenotazioni per cui si può emettere fattura
+INVOICEABLE_BOOKING_STATUSES = ("confermata", "attiva", "completata")
+
+def _uninvoiced_bookings_query(session):
+    """Prenotazioni fatturabili senza fattura (anti-join su invoices) con il nome dell'immobile"""
+    has_invoice = exists().where(Invoice.booking_id == Booking.id)
+    return (
+        session.query(Booking, Property.name)
+        .outerjoin(Property, Booking.property_id == Property.id)
+        .filter(~has_invoice)
+        .filter(func.lower(Booking.status).in_(INVOICEABLE_BOOKING_STATUSES))
+        .order_by(Booking.checkin_date, Booking.id)
     )
-    
-    session.add(new_invoice)
-    session.commit()
-    result = new_invoice.to_dict()
+
+def _uninvoiced_booking_dict(booking, property_name):
+    result = booking.to_dict()
+    result["property_name"] = property_name or "Sconosciuto"
+    return result
+
+def get_uninvoiced_bookings(limit=None):
+    """
+    Recupera le prenotazioni fatturabili che non hanno ancora una fattura
+
+    Args:
+        limit (int, optional): Numero massimo di prenotazioni restituite
+
+    Returns:
+        list: Prenotazioni (dict) con in più property_name, ordinate per check-in
+    """
+    session = get_db_session()
+    query = _uninvoiced_bookings_query(session)
+    if limit is not None:
+        query = query.limit(limit)
+    result = [_uninvoiced_booking_dict(booking, property_name) for booking, property_name in query]
     session.close()
     return result
 
+def iter_uninvoiced_bookings(batch_size=1000):
+    """
+    Come get_uninvoiced_bookings, ma restituisce le prenotazioni in streaming
+
+    Le righe vengono lette dal cursore a blocchi di batch_size, quindi anche un
+    arretrato molto grande non viene mai caricato tutto in memoria.
+
+    Args:
+        batch_size (int): Righe lette dal database per ogni blocco
+
+    Yields:
+        dict: Prenotazione con in più property_name
+    """
+    session = get_db_session()
+    try:
+        query = _uninvoiced_bookings_query(session).yield_per(batch_size)
+        for booking, property_name in query:
+            yield _uninvoiced_booking_dict(booking, property_name)
+    finally:
+        session.close()
+
 def get_all_invoices():
     """Recupera tutte le fatture dal database"""
     session = get_db_session()
@@ -508,6 +856,76 @@ def get_invoice(invoice_id):
     session.close()
     return result
 
+def _invoice_details_filters(start_date=None, end_date=None, statuses=None, search=None):
+    """Condizioni WHERE comuni all'elenco fatture e al suo conteggio"""
+    conditions = []
+    if start_date:
+        conditions.append(Invoice.date >= start_date)
+    if end_date:
+        conditions.append(Invoice.date <= end_date)
+    if statuses:
+        conditions.append(Invoice.status.in_(list(statuses)))
+    if search:
+        term = search.strip().lower()
+        conditions.append(or_(
+            func.lower(Invoice.invoice_number).contains(term, autoescape=True),
+            func.lower(Booking.guest_name).contains(term, autoescape=True),
+            func.lower(Property.name).contains(term, autoescape=True),
+        ))
+    return conditions
+
+def get_invoices_with_details(start_date=None, end_date=None, statuses=None, search=None, limit=None, offset=0):
+    """
+    Recupera le fatture con ospite e immobile in un'unica query (join su bookings e properties)
+
+    Filtri, ordinamento e paginazione vengono eseguiti dal database; le fatture
+    senza prenotazione vengono escluse, quelle di immobili eliminati restano
+    con nome immobile "Sconosciuto".
+
+    Args:
+        start_date (date, optional): Data minima della fattura
+        end_date (date, optional): Data massima della fattura
+        statuses (list, optional): Stati ammessi (Emessa, Pagata, Annullata)
+        search (str, optional): Testo cercato in numero fattura, ospite e immobile
+        limit (int, optional): Numero massimo di fatture restituite
+        offset (int): Numero di fatture da saltare
+
+    Returns:
+        list: Fatture (dict) con in più booking_property_id, guest_name e property_name
+    """
+    session = get_db_session()
+    query = (
+        session.query(Invoice, Booking.property_id, Booking.guest_name, Property.name)
+        .join(Booking, Invoice.booking_id == Booking.id)
+        .outerjoin(Property, Booking.property_id == Property.id)
+        .filter(*_invoice_details_filters(start_date, end_date, statuses, search))
+        .order_by(Invoice.date.desc(), Invoice.invoice_number.desc())
+    )
+    if offset:
+        query = query.offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    
+    result = []
+    for invoice, property_id, guest_name, property_name in query:
+        details = invoice.to_dict()
+        details["booking_property_id"] = property_id
+        details["guest_name"] = guest_name
+        details["property_name"] = property_name or "Sconosciuto"
+        result.append(details)
+    session.close()
+    return result
+
+def count_invoices_with_details(start_date=None, end_date=None, statuses=None, search=None):
+    """Conta le fatture restituite da get_invoices_with_details con gli stessi filtri"""
+    session = get_db_session()
+    query = session.query(func.count(Invoice.id)).join(Booking, Invoice.booking_id == Booking.id)
+    if search:
+        query = query.outerjoin(Property, Booking.property_id == Property.id)
+    result = query.filter(*_invoice_details_filters(start_date, end_date, statuses, search)).scalar()
+    session.close()
+    return result
+
 def add_cleaning_service(service_data):
     """Aggiunge un nuovo servizio di pulizia"""
     session = get_db_session()
@@ -568,6 +986,41 @@ def schedule_cleaning(property_id, scheduled_date, booking_id=None, service_id=N
     session.close()
     return result
 
+def schedule_cleanings_bulk(tasks):
+    """
+    Programma più pulizie con un unico INSERT multiplo in una sola transazione
+
+    Args:
+        tasks (list): Dict con property_id, scheduled_date e opzionalmente
+            booking_id, service_id, notes
+
+    Returns:
+        list: Task di pulizia creati (dict)
+    """
+    if not tasks:
+        return []
+    
+    with session_scope() as session:
+        # Il servizio predefinito viene letto una sola volta per tutto il blocco
+        default_service = session.query(CleaningService).filter(CleaningService.default == True).first()
+        default_service_id = default_service.id if default_service else None
+        
+        rows = []
+        for task in tasks:
+            booking_id = task.get("booking_id")
+            rows.append(_new_row(CleaningTask, {
+                "property_id": task["property_id"],
+                "cleaning_service_id": task.get("service_id") or default_service_id,
+                "scheduled_date": task["scheduled_date"],
+                "status": "Programmata",
+                "notes": task.get("notes") or ("Pulizia programmata automaticamente dopo check-out" if booking_id else "Pulizia programmata manualmente"),
+                "booking_id": booking_id
+            }))
+        
+        session.execute(insert(CleaningTask.__table__), rows)
+    
+    return [_row_to_dict(CleaningTask, row) for row in rows]
+
 def get_all_cleaning_tasks():
     """Recupera tutti i task di pulizia"""
     session = get_db_session()
@@ -576,6 +1029,65 @@ def get_all_cleaning_tasks():
     session.close()
     return result
 
+def has_cleaning_tasks():
+    """Indica se esiste almeno un task di pulizia, senza caricarli"""
+    session = get_db_session()
+    result = session.query(exists().where(CleaningTask.id.isnot(None))).scalar()
+    session.close()
+    return result
+
+def get_cleaning_tasks(start_date=None, end_date=None, statuses=None):
+    """
+    Recupera i task di pulizia di un intervallo di date con nome immobile e servizio
+
+    Il filtro sulle date usa l'indice su scheduled_date (o quello su stato e data
+    quando sono indicati gli stati) e immobile e servizio arrivano con la stessa
+    query, senza una lettura per ogni task.
+
+    Args:
+        start_date (date, optional): Primo giorno incluso
+        end_date (date, optional): Ultimo giorno incluso
+        statuses (list, optional): Stati ammessi (Programmata, Completata, Annullata)
+
+    Returns:
+        list: Task (dict) ordinati per data, con in più property_name e
+            cleaning_service (dict con name, phone ed email, None se assente)
+    """
+    session = get_db_session()
+    query = (
+        session.query(
+            CleaningTask,
+            Property.name,
+            CleaningService.name,
+            CleaningService.phone,
+            CleaningService.email,
+        )
+        .outerjoin(Property, CleaningTask.property_id == Property.id)
+        .outerjoin(CleaningService, CleaningTask.cleaning_service_id == CleaningService.id)
+    )
+    if start_date:
+        query = query.filter(CleaningTask.scheduled_date >= datetime.combine(start_date, datetime.min.time()))
+    if end_date:
+        query = query.filter(CleaningTask.scheduled_date < datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+    if statuses:
+        query = query.filter(CleaningTask.status.in_(list(statuses)))
+    
+    result = []
+    for task, property_name, service_name, service_phone, service_email in query.order_by(CleaningTask.scheduled_date):
+        details = task.to_dict()
+        details["property_name"] = property_name or "Sconosciuto"
+        details["cleaning_service"] = None
+        if service_name is not None:
+            details["cleaning_service"] = {
+                "id": task.cleaning_service_id,
+                "name": service_name,
+                "phone": service_phone,
+                "email": service_email,
+            }
+        result.append(details)
+    session.close()
+    return result
+
 def get_upcoming_cleaning_tasks(days=7):
     """Recupera i task di pulizia per i prossimi giorni"""
     session = get_db_session()
@@ -0,0 +1,87 @@
+import itertools
+import os
+import threading
+from types import MappingProxyType
+
+# Cache dei documenti JSON condivisa da tutte le sessioni del processo.
+# Ogni voce contiene la firma dei file sorgente, la vista in sola lettura
+# del documento e un numero di versione che cresce ad ogni nuovo parsing.
+_cache = {}
+_lock = threading.Lock()
+
+# Contatore globale: le versioni non si ripetono nemmeno dopo un'invalidazione
+_versions = itertools.count(1)
+
+def file_signature(path):
+    """
+    Restituisce la firma di un file usata per validare la cache
+
+    Args:
+        path (str): Percorso del file
+
+    Returns:
+        tuple: (mtime in ns, dimensione, inode) oppure None se il file non esiste
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+def freeze(value):
+    """Converte ricorsivamente dict e liste in MappingProxyType e tuple"""
+    if isinstance(value, (dict, MappingProxyType)):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+def thaw(value):
+    """Restituisce una copia modificabile (dict e liste) di una vista congelata"""
+    if isinstance(value, (dict, MappingProxyType)):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+def load_cached(key, paths, loader):
+    """
+    Restituisce la vista in sola lettura di un documento, rileggendolo solo se i file sono cambiati
+
+    Args:
+        key (str): Chiave del documento nella cache
+        paths (list): File da cui dipende il documento (snapshot, journal, ...)
+        loader (callable): Funzione senza argomenti che carica il documento
+
+    Returns:
+        MappingProxyType: Documento congelato condiviso tra le sessioni
+    """
+    # La firma viene calcolata prima del caricamento: se il file cambia
+    # durante il parsing la chiamata successiva lo rileggerà comunque
+    signature = tuple(file_signature(path) for path in paths)
+
+    with _lock:
+        entry = _cache.get(key)
+        if entry and entry["signature"] == signature:
+            return entry["view"]
+
+    view = freeze(loader())
+
+    with _lock:
+        _cache[key] = {"signature": signature, "view": view, "version": next(_versions)}
+
+    return view
+
+def get_version(key):
+    """Numero di versione del documento in cache (0 se non ancora caricato)"""
+    with _lock:
+        entry = _cache.get(key)
+        return entry["version"] if entry else 0
+
+def invalidate(key=None):
+    """Rimuove un documento dalla cache (o tutti se key è None)"""
+    with _lock:
+        if key is None:
+            _cache.clear()
+        else:
+            _cache.pop(key, None)
@@ -3,19 +3,45 @@ import os
 import uuid
 from datetime import datetime
 
+from utils import json_cache
+from utils.json_writer import atomic_write_json, file_lock, update_json
+
 # Path to the JSON database file
 DATABASE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "DatabaseCiaoHostProprieta.json")
 
-def load_database():
-    """Load the database from the JSON file"""
+# Storage mode: "journal" appends single-record mutations to a log next to the
+# snapshot, "snapshot" rewrites the whole JSON file on every change
+STORAGE_MODE = os.environ.get("CIAOHOST_JSON_STORAGE_MODE", "journal")
+
+# The journal is compacted into a new snapshot once it grows beyond this size
+JOURNAL_COMPACT_BYTES = int(os.environ.get("CIAOHOST_JOURNAL_COMPACT_BYTES", 1024 * 1024))
+
+# Backend used by the readers: "json" scans the JSON document, "sqlite" runs
+# indexed queries on data/ciao_host.db, which is kept in sync on every write
+# (run `python -m utils.json_to_sqlite` once before switching). The JSON file
+# stays the source of truth: get_database_view and the in-memory indexes
+# always read it, see utils/json_to_sqlite.py for the details
+STORAGE_BACKEND = os.environ.get("CIAOHOST_STORAGE_BACKEND", "json")
+
+def get_journal_file():
+    """Path of the append-only journal that belongs to DATABASE_FILE"""
+    return DATABASE_FILE + ".journal"
+
+def _empty_database():
+    return {
+        "properties": {},
+        "users": {}
+    }
+
+def _write_snapshot(data):
+    atomic_write_json(DATABASE_FILE, data, indent=2)
+
+def _load_snapshot():
+    """Load the last snapshot from the JSON file"""
     if not os.path.exists(DATABASE_FILE):
         # Create a new database file if it doesn't exist
-        initial_data = {
-            "properties": {},
-            "users": {}
-        }
-        with open(DATABASE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(initial_data, f, indent=2)
+        initial_data = _empty_database()
+        _write_snapshot(initial_data)
         return initial_data
     
     try:
@@ -23,52 +49,197 @@ def load_database():
             return json.load(f)
     except json.JSONDecodeError:
         # If the file is corrupted, create a new one
-        initial_data = {
-            "properties": {},
-            "users": {}
-        }
-        with open(DATABASE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(initial_data, f, indent=2)
+        initial_data = _empty_database()
+        _write_snapshot(initial_data)
         return initial_data
 
+def _replay_journal(db):
+    """Apply the journaled mutations on top of a snapshot"""
+    return apply_journal(db, get_journal_file())
+
+def apply_journal(db, journal_file):
+    """Apply the mutations of a journal file (e.g. one restored from a backup) on top of a snapshot"""
+    if not os.path.exists(journal_file):
+        return db
+    
+    properties = db.setdefault("properties", {})
+    with open(journal_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn last line (crash during append) is simply ignored
+                continue
+            
+            if entry.get("op") == "put":
+                properties[entry["id"]] = entry["data"]
+            elif entry.get("op") == "delete":
+                properties.pop(entry["id"], None)
+    
+    return db
+
+def _append_journal(entry):
+    """Append a single mutation to the journal, compacting it when it gets too big"""
+    journal_file = get_journal_file()
+    with file_lock(DATABASE_FILE):
+        with open(journal_file, 'a+b') as f:
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # The last append was torn by a crash: close that line, or
+                    # the new entry would be glued onto it and dropped on replay
+                    f.write(b"\n")
+            f.write((json.dumps(entry, separators=(',', ':')) + "\n").encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        
+        if os.path.getsize(journal_file) >= JOURNAL_COMPACT_BYTES:
+            compact_database()
+
+def _read_database():
+    return _replay_journal(_load_snapshot())
+
+def get_database_view():
+    """Read-only view of the database, shared by every session and reparsed only when the files change"""
+    return json_cache.load_cached(DATABASE_FILE, [DATABASE_FILE, get_journal_file()], _read_database)
+
+def get_database_version():
+    """Version number of the cached database, it changes whenever the files are reparsed"""
+    get_database_view()
+    return json_cache.get_version(DATABASE_FILE)
+
+def load_database():
+    """Load the database from the JSON file (snapshot plus journal replay)"""
+    return json_cache.thaw(get_database_view())
+
 def save_database(data):
     """Save the database to the JSON file"""
-    with open(DATABASE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2)
+    with file_lock(DATABASE_FILE):
+        _write_snapshot(data)
+        
+        # The snapshot now contains every journaled mutation. Puts and deletes are
+        # idempotent, so a crash before this point only means a redundant replay.
+        journal_file = get_journal_file()
+        if os.path.exists(journal_file):
+            os.remove(journal_file)
+
+def compact_database():
+    """Fold the journal into a fresh snapshot"""
+    with file_lock(DATABASE_FILE):
+        save_database(_read_database())
+
+def _store_property(property_id, json_property):
+    """Persist a single property record according to STORAGE_MODE"""
+    if STORAGE_MODE == "journal":
+        _append_journal({"op": "put", "id": property_id, "data": json_property})
+    else:
+        with file_lock(DATABASE_FILE):
+            db = load_database()
+            db.setdefault("properties", {})[property_id] = json_property
+            save_database(db)
+
+    if STORAGE_BACKEND == "sqlite":
+        from utils.json_to_sqlite import sync_property
+        sync_property(property_id, json_property)
+
+def _remove_property(property_id):
+    """Remove a single property record according to STORAGE_MODE"""
+    if STORAGE_MODE == "journal":
+        _append_journal({"op": "delete", "id": property_id})
+    else:
+        with file_lock(DATABASE_FILE):
+            db = load_database()
+            db["properties"].pop(property_id, None)
+            save_database(db)
+    
+    if STORAGE_BACKEND == "sqlite":
+        from utils.json_to_sqlite import remove_property
+        remove_property(property_id)
+
+def save_changes(base, data):
+    """
+    Persist only the records of data that differ from base
+
+    base is the read-only view the caller loaded data from (see get_database_view):
+    properties are written with single-record journal entries and users with an
+    update_json read-modify-write, so records changed meanwhile by other sessions
+    or processes are not overwritten by a stale copy.
+
+    Returns:
+        int: Number of records written
+    """
+    base_properties = base.get("properties", {})
+    base_users = base.get("users", {})
+    properties = data.get("properties", {})
+    users = data.get("users", {})
+    written = 0
+    
+    with file_lock(DATABASE_FILE):
+        for property_id, prop in properties.items():
+            if json_cache.freeze(prop) != base_properties.get(property_id):
+                _store_property(property_id, json_cache.thaw(prop))
+                written += 1
+        for property_id in base_properties:
+            if property_id not in properties:
+                _remove_property(property_id)
+                written += 1
+    
+    changed_users = {
+        email: user for email, user in users.items()
+        if json_cache.freeze(user) != base_users.get(email)
+    }
+    removed_users = [email for email in base_users if email not in users]
+    if changed_users or removed_users:
+        def apply_users(db):
+            db_users = db.setdefault("users", {})
+            db_users.update(json_cache.thaw(changed_users))
+            for email in removed_users:
+                db_users.pop(email, None)
+        
+        # update_json takes the file lock itself and rereads the database under it
+        update_json(DATABASE_FILE, apply_users, load_database, indent=2)
+        written += len(changed_users) + len(removed_users)
+    
+    return written
 
 def get_all_properties():
     """Get all properties from the database"""
-    db = load_database()
-    properties = []
-    
-    for prop_id, prop_data in db.get("properties", {}).items():
-        # Convert the JSON property format to the format expected by the application
-        property_data = {
-            "id": prop_id,
-            "name": prop_data.get("name", ""),
-            "type": prop_data.get("type", ""),
-            "city": prop_data.get("location", ""),
-            "address": prop_data.get("address", ""),
-            "bedrooms": int(prop_data.get("bedrooms", 1)),
-            "bathrooms": float(prop_data.get("bathrooms", 1.0)),
-            "max_guests": int(prop_data.get("max_guests", 2)),
-            "base_price": float(prop_data.get("price", 0.0)),
-            "cleaning_fee": float(prop_data.get("cleaning_fee", 30.0)),
-            "amenities": prop_data.get("services", []),
-            "check_in_instructions": prop_data.get("check_in_instructions", ""),
-            "wifi_details": prop_data.get("wifi_details", ""),
-            "status": prop_data.get("status", "Attivo"),
-            "phone": prop_data.get("phone", ""),
-            "created_at": prop_data.get("created_at", datetime.now().isoformat()),
-            "updated_at": prop_data.get("updated_at", datetime.now().isoformat())
-        }
-        properties.append(property_data)
-    
-    return properties
+    if STORAGE_BACKEND == "sqlite":
+        from utils import database
+        return database.get_all_properties()
+    
+    db = get_database_view()
+    return [property_from_json(prop_id, prop_data) for prop_id, prop_data in db.get("properties", {}).items()]
+
+def property_from_json(prop_id, prop_data):
+    """Convert a property stored in the JSON file to the format expected by the application"""
+    return {
+        "id": prop_id,
+        "name": prop_data.get("name", ""),
+        "type": prop_data.get("type", ""),
+        "city": prop_data.get("location", ""),
+        "address": prop_data.get("address", ""),
+        "bedrooms": int(prop_data.get("bedrooms", 1)),
+        "bathrooms": float(prop_data.get("bathrooms", 1.0)),
+        "max_guests": int(prop_data.get("max_guests", 2)),
+        "base_price": float(prop_data.get("price", 0.0)),
+        "cleaning_fee": float(prop_data.get("cleaning_fee", 30.0)),
+        "amenities": list(prop_data.get("services", [])),
+        "check_in_instructions": prop_data.get("check_in_instructions", ""),
+        "wifi_details": prop_data.get("wifi_details", ""),
+        "status": prop_data.get("status", "Attivo"),
+        "phone": prop_data.get("phone", ""),
+        "created_at": prop_data.get("created_at", datetime.now().isoformat()),
+        "updated_at": prop_data.get("updated_at", datetime.now().isoformat())
+    }
 
 def get_property(property_id):
     """Get a property by ID"""
-    db = load_database()
+    if STORAGE_BACKEND == "sqlite":
+        from utils import database
+        return database.get_property(property_id)
+    
+    db = get_database_view()
     prop_data = db.get("properties", {}).get(property_id)
     
     if not prop_data:
@@ -86,7 +257,7 @@ def get_property(property_id):
         "max_guests": prop_data.get("max_guests", 2),
         "base_price": prop_data.get("price", 0),
         "cleaning_fee": prop_data.get("cleaning_fee", 30),
-        "amenities": prop_data.get("services", []),
+        "amenities": list(prop_data.get("services", [])),
         "check_in_instructions": prop_data.get("check_in_instructions", ""),
         "wifi_details": prop_data.get("wifi_details", ""),
         "status": prop_data.get("status", "Attivo"),
@@ -99,8 +270,6 @@ def get_property(property_id):
 
 def add_property(property_data):
     """Add a new property to the database"""
-    db = load_database()
-    
     # Generate a new ID if not provided
     property_id = property_data.get("id", str(uuid.uuid4()))
     
@@ -125,20 +294,12 @@ def add_property(property_data):
     }
     
     # Add the property to the database
-    db["properties"][property_id] = json_property
-    
-    # Save the database
-    save_database(db)
+    _store_property(property_id, json_property)
     
     return True
 
 def update_property(property_id, property_data):
     """Update an existing property in the database"""
-    db = load_database()
-    
-    if property_id not in db.get("properties", {}):
-        return False
-    
     # Convert the application property format to the JSON format
     json_property = {
         "name": property_data.get("name", ""),
@@ -159,25 +320,22 @@ def update_property(property_id, property_data):
         "updated_at": datetime.now().isoformat()
     }
     
-    # Update the property in the database
-    db["properties"][property_id] = json_property
-    
-    # Save the database
-    save_database(db)
+    # Update the property in the database, checking that it still exists under the lock
+    with file_lock(DATABASE_FILE):
+        if property_id not in get_database_view().get("properties", {}):
+            return False
+        
+        _store_property(property_id, json_property)
     
     return True
 
 def delete_property(property_id):
     """Delete a property from the database"""
-    db = load_database()
-    
-    if property_id not in db.get("properties", {}):
-        return False
-    
-    # Delete the property from the database
-    del db["properties"][property_id]
-    
-    # Save the database
-    save_database(db)
+    with file_lock(DATABASE_FILE):
+        if property_id not in get_database_view().get("properties", {}):
+            return False
+        
+        # Delete the property from the database
+        _remove_property(property_id)
     
     return True
\ No newline at end of file
@@ -0,0 +1,367 @@
+"""
+Migrazione dei database JSON (immobili e prenotazioni) verso SQLite.
+
+Uso da riga di comando:
+
+    python -m utils.json_to_sqlite [--batch-size 5000]
+
+Il comando è idempotente: i record già presenti in data/ciao_host.db vengono
+aggiornati con la versione JSON (INSERT ... ON CONFLICT(id) DO UPDATE), quindi
+può essere rilanciato per riallineare il database SQLite. Vengono aggiornate
+solo le colonne che arrivano dal JSON: quelle gestite solo in SQL (stato del
+pagamento, check-in completato, ...) restano invariate e le righe non vengono
+cancellate, quindi le fatture collegate restano valide.
+
+Il file delle prenotazioni viene letto in streaming, una prenotazione alla
+volta, senza caricarlo tutto in memoria.
+
+Con CIAOHOST_STORAGE_BACKEND=sqlite i file JSON restano la fonte dei dati:
+ogni scrittura di json_database e booking_database aggiorna prima il JSON e
+poi la riga SQLite. Da SQLite leggono solo json_database.get_all_properties,
+booking_database.get_all_bookings, get_bookings_for_property,
+get_booking_records e utils/repository.py. La vista get_database_view e gli
+indici in memoria (availability_index, availability_matrix, property_search,
+property_facets, property_names) sono costruiti dai file JSON. Le due copie
+coincidono finché le scritture passano da quei moduli: le modifiche fatte
+direttamente sulle tabelle con utils/database.py non arrivano al JSON né
+agli indici.
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from utils.booking_records import parse_booking_date
+
+DEFAULT_BATCH_SIZE = 5000
+
+# Byte letti per volta dai file JSON in streaming
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Colonne che arrivano dal JSON e vengono aggiornate se la riga esiste già
+JSON_OWNED_COLUMNS = {
+    "properties": (
+        "name", "type", "city", "address", "bedrooms", "bathrooms", "max_guests",
+        "base_price", "current_price", "cleaning_fee", "check_in_instructions",
+        "wifi_details", "amenities", "status", "phone", "updated_at",
+    ),
+    "bookings": (
+        "property_id", "guest_name", "guest_email", "checkin_date", "checkout_date",
+        "checkin_time", "guests", "price_per_night", "cleaning_fee", "total_price",
+        "status", "notes",
+    ),
+}
+
+def _parse_timestamp(value):
+    if not value:
+        return datetime.now()
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return datetime.now()
+
+def property_row(property_id, prop):
+    """Converte un immobile nel formato JSON in una riga della tabella properties"""
+    price = float(prop.get("price", 0) or 0)
+    return {
+        "id": property_id,
+        "name": prop.get("name", ""),
+        "type": prop.get("type", ""),
+        "city": prop.get("location", ""),
+        "address": prop.get("address", ""),
+        "bedrooms": int(prop.get("bedrooms", 1) or 1),
+        "bathrooms": float(prop.get("bathrooms", 1.0) or 1.0),
+        "max_guests": int(prop.get("max_guests", 2) or 2),
+        "base_price": price,
+        "current_price": price,
+        "cleaning_fee": float(prop.get("cleaning_fee", 30.0) or 0),
+        "check_in_instructions": prop.get("check_in_instructions", ""),
+        "wifi_details": prop.get("wifi_details", ""),
+        "amenities": json.dumps(list(prop.get("services", []))),
+        "status": prop.get("status", "Attivo"),
+        "phone": prop.get("phone", ""),
+        "created_at": _parse_timestamp(prop.get("created_at")),
+        "updated_at": _parse_timestamp(prop.get("updated_at")),
+    }
+
+def booking_row(booking_id, booking, prop=None):
+    """
+    Converte una prenotazione nel formato JSON in una riga della tabella bookings
+
+    Args:
+        booking_id (str): ID della prenotazione
+        booking (dict): Prenotazione nel formato di DatabaseCiaoHostPrenotazioni.json
+        prop (dict, optional): Immobile (formato JSON) usato per calcolare i prezzi
+
+    Returns:
+        dict: Riga pronta per l'inserimento, None se le date non sono valide
+    """
+    checkin_date = parse_booking_date(booking.get("check_in_date"))
+    checkout_date = parse_booking_date(booking.get("check_out_date"))
+    if checkin_date is None or checkout_date is None:
+        return None
+
+    prop = prop or {}
+    price_per_night = float(prop.get("price", 0) or 0)
+    cleaning_fee = float(prop.get("cleaning_fee", 0) or 0)
+    nights = max((checkout_date - checkin_date).days, 0)
+    guest_email = booking.get("user_email", "")
+    created_at = _parse_timestamp(booking.get("created_at"))
+
+    return {
+        "id": booking_id,
+        "property_id": booking.get("property_id", ""),
+        "guest_name": guest_email.split("@")[0] if guest_email else "Ospite",
+        "guest_email": guest_email,
+        "guest_phone": booking.get("guest_phone", ""),
+        "checkin_date": checkin_date,
+        "checkout_date": checkout_date,
+        "checkin_time": booking.get("check_in_time"),
+        "guests": int(booking.get("guests", 1) or 1),
+        "price_per_night": price_per_night,
+        "cleaning_fee": cleaning_fee,
+        "total_price": price_per_night * nights + cleaning_fee,
+        "payment_method": booking.get("payment_method"),
+        "payment_status": booking.get("payment_status", "In attesa"),
+        "status": booking.get("status", "Confermata"),
+        "source": booking.get("source", "CiaoHost"),
+        "notes": booking.get("special_requests", ""),
+        "created_at": created_at,
+        "updated_at": created_at,
+        "checkin_completed_at": None,
+        "checkout_completed_at": None,
+    }
+
+def booking_to_json(booking, property_name=None):
+    """Converte un oggetto Booking di SQLAlchemy nel formato JSON delle prenotazioni"""
+    record = {
+        "property_id": booking.property_id,
+        "property_name": property_name or "",
+        "check_in_date": booking.checkin_date.strftime("%d/%m/%Y"),
+        "check_out_date": booking.checkout_date.strftime("%d/%m/%Y"),
+        "guests": booking.guests,
+        "check_in_time": booking.checkin_time or "",
+        "special_requests": booking.notes or "",
+        "status": booking.status,
+        "created_at": booking.created_at.isoformat() if booking.created_at else None,
+    }
+    if booking.guest_email:
+        record["user_email"] = booking.guest_email
+    return record
+
+def _batches(rows, batch_size):
+    iterator = iter(rows)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def iter_json_section(path, section, chunk_size=READ_CHUNK_SIZE):
+    """
+    Legge in streaming le voci di una sezione di un documento JSON
+
+    Il documento deve essere un oggetto con la sezione come oggetto, es.
+    {"bookings": {"id": {...}, ...}}: le voci vengono decodificate una alla
+    volta leggendo il file a blocchi, le altre sezioni vengono saltate.
+
+    Args:
+        path (str): File JSON
+        section (str): Nome della sezione, es. "bookings"
+        chunk_size (int): Byte letti per volta
+
+    Yields:
+        tuple: (chiave, valore) per ogni voce della sezione
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = ""
+        position = 0
+        eof = False
+
+        def fill():
+            nonlocal buffer, position, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            return not eof
+
+        def skip_space():
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position] in " \t\r\n":
+                    position += 1
+                if position < len(buffer) or not fill():
+                    return
+
+        def expect(chars):
+            nonlocal position
+            skip_space()
+            if position >= len(buffer) or buffer[position] not in chars:
+                raise ValueError(f"JSON non valido in {path}: atteso {chars!r} alla posizione {position}")
+            position += 1
+            return buffer[position - 1]
+
+        def value():
+            nonlocal position
+            skip_space()
+            while True:
+                try:
+                    result, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if not fill():
+                        raise
+                    continue
+                # Un numero a fine blocco potrebbe continuare nel blocco successivo
+                if end == len(buffer) and not eof and fill():
+                    continue
+                position = end
+                return result
+
+        def entries():
+            nonlocal position
+            expect("{")
+            skip_space()
+            if position < len(buffer) and buffer[position] == "}":
+                position += 1
+                return
+            while True:
+                key = value()
+                expect(":")
+                yield key
+                if expect(",}") == "}":
+                    return
+
+        for key in entries():
+            if key != section:
+                value()
+                continue
+            for entry_key in entries():
+                yield entry_key, value()
+
+def _upsert_statement(model, bind, update_columns):
+    """INSERT ... ON CONFLICT(id) DO UPDATE delle sole colonne indicate"""
+    dialect = postgresql if bind.dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(model.__table__)
+    return statement.on_conflict_do_update(
+        index_elements=["id"],
+        set_={column: statement.excluded[column] for column in update_columns},
+    )
+
+def upsert_rows(model, rows, batch_size=DEFAULT_BATCH_SIZE, bind=None, update_columns=None):
+    """
+    Inserisce (o aggiorna) le righe a blocchi, una transazione per blocco
+
+    Args:
+        model: Modello SQLAlchemy di destinazione
+        rows (iterable): Righe (dict) generate in streaming
+        batch_size (int): Numero di righe per transazione
+        bind: Engine da usare (default: engine di utils.database)
+        update_columns (iterable, optional): Colonne aggiornate sulle righe già
+            presenti (default JSON_OWNED_COLUMNS della tabella); le altre
+            mantengono il valore salvato in SQL
+
+    Returns:
+        int: Numero di righe scritte
+    """
+    if bind is None:
+        from utils.database import engine as bind
+
+    if update_columns is None:
+        update_columns = JSON_OWNED_COLUMNS[model.__tablename__]
+    statement = _upsert_statement(model, bind, update_columns)
+    written = 0
+    for batch in _batches(rows, batch_size):
+        with bind.begin() as connection:
+            connection.execute(statement, batch)
+        written += len(batch)
+    return written
+
+def migrate(properties_file=None, bookings_file=None, batch_size=DEFAULT_BATCH_SIZE, bind=None):
+    """
+    Copia immobili e prenotazioni dai file JSON nel database SQLite
+
+    Returns:
+        dict: Numero di immobili e prenotazioni migrati e prenotazioni scartate
+    """
+    from utils import booking_database, json_database
+    from utils.database import Booking, Property
+
+    properties_file = properties_file or json_database.DATABASE_FILE
+    bookings_file = bookings_file or booking_database.BOOKINGS_DB_FILE
+
+    # Gli immobili servono interi (prezzi delle prenotazioni) e vengono letti una
+    # volta sola; per il database corrente la vista in cache include il journal
+    if os.path.abspath(properties_file) == os.path.abspath(json_database.DATABASE_FILE):
+        properties = json_database.get_database_view().get("properties", {})
+    else:
+        properties = dict(iter_json_section(properties_file, "properties"))
+
+    skipped = []
+
+    def booking_rows():
+        for booking_id, booking in iter_json_section(bookings_file, "bookings"):
+            row = booking_row(booking_id, booking, properties.get(booking.get("property_id")))
+            if row is None:
+                skipped.append(booking_id)
+                continue
+            yield row
+
+    migrated_properties = upsert_rows(
+        Property,
+        (property_row(property_id, prop) for property_id, prop in properties.items()),
+        batch_size,
+        bind,
+    )
+    migrated_bookings = upsert_rows(Booking, booking_rows(), batch_size, bind)
+
+    return {
+        "properties": migrated_properties,
+        "bookings": migrated_bookings,
+        "skipped_bookings": skipped,
+    }
+
+def sync_property(property_id, prop):
+    """Allinea un singolo immobile nel database SQLite dopo una scrittura JSON"""
+    from utils.database import Property
+    upsert_rows(Property, [property_row(property_id, prop)])
+
+def remove_property(property_id):
+    """Rimuove un immobile dal database SQLite dopo una cancellazione JSON"""
+    from utils.database import Property, get_db_session
+    session = get_db_session()
+    session.query(Property).filter(Property.id == property_id).delete()
+    session.commit()
+    session.close()
+
+def sync_booking(booking_id, booking, prop=None):
+    """Allinea una singola prenotazione nel database SQLite dopo una scrittura JSON"""
+    from utils.database import Booking
+    row = booking_row(booking_id, booking, prop)
+    if row is not None:
+        upsert_rows(Booking, [row])
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra immobili e prenotazioni dai file JSON a SQLite")
+    parser.add_argument("--properties-file", help="File JSON degli immobili")
+    parser.add_argument("--bookings-file", help="File JSON delle prenotazioni")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Righe per transazione")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = migrate(args.properties_file, args.bookings_file, args.batch_size)
+    elapsed = time.perf_counter() - start
+
+    print(f"✅ Immobili migrati: {result['properties']}")
+    print(f"✅ Prenotazioni migrate: {result['bookings']}")
+    if result["skipped_bookings"]:
+        print(f"⚠️ Prenotazioni scartate (date non valide): {len(result['skipped_bookings'])}")
+    print(f"⏱️ Tempo impiegato: {elapsed:.2f}s")
+
+if __name__ == "__main__":
+    main()
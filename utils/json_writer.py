@@ -0,0 +1,213 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from utils.json_cache import file_signature
+
+try:
+    import fcntl
+except ImportError:
+    # Su Windows usiamo il lock di msvcrt sul primo byte del file di lock
+    fcntl = None
+    import msvcrt
+
+# Attesa massima (in secondi) di altre scritture da raggruppare quando sullo
+# stesso file c'è già una scrittura in corso; senza concorrenza non si attende
+WRITE_COALESCE_WINDOW = float(os.environ.get("CIAOHOST_WRITE_COALESCE_WINDOW", 0.05))
+
+# Lock già acquisiti dal thread corrente (i lock sono rientranti per thread)
+_held_locks = threading.local()
+
+# Batch di scritture in attesa di flush, uno per file, e numero di batch in
+# scrittura (o in attesa del lock) per file
+_pending_batches = {}
+_active_writers = {}
+_pending_lock = threading.Lock()
+
+def _lock_file(handle):
+    if fcntl is not None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+    else:
+        while True:
+            try:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCK rinuncia dopo 10 secondi: riproviamo finché il lock non è libero
+                continue
+
+def _unlock_file(handle):
+    if fcntl is not None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+    else:
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+@contextmanager
+def file_lock(path):
+    """
+    Lock consultivo esclusivo su un file, valido tra processi e tra thread
+
+    Il lock viene preso su un file "<path>.lock" separato, così resta valido anche
+    quando il file dati viene sostituito con os.replace. È rientrante: un thread
+    che possiede già il lock può annidare altre sezioni critiche sullo stesso file.
+
+    Args:
+        path (str): Percorso del file da proteggere
+    """
+    lock_path = os.path.abspath(path) + ".lock"
+    held = getattr(_held_locks, "paths", None)
+    if held is None:
+        held = _held_locks.paths = set()
+
+    if lock_path in held:
+        yield
+        return
+
+    with open(lock_path, "a+") as handle:
+        _lock_file(handle)
+        held.add(lock_path)
+        try:
+            yield
+        finally:
+            held.discard(lock_path)
+            _unlock_file(handle)
+
+def atomic_write_json(path, data, **dump_kwargs):
+    """
+    Scrive un documento JSON in modo atomico (file temporaneo + rename)
+
+    Chi legge vede sempre o la versione precedente o quella nuova del file,
+    mai un file troncato a metà scrittura.
+
+    Args:
+        path (str): Percorso del file di destinazione
+        data: Documento da serializzare
+        **dump_kwargs: Argomenti passati a json.dump (indent, ensure_ascii, ...)
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, **dump_kwargs)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def _apply_mutations(batch, load):
+    """
+    Applica le modifiche del batch a un documento letto con load()
+
+    Returns:
+        tuple: (documento, True se almeno una modifica è riuscita); i risultati
+            (riuscita, valore o eccezione) finiscono in batch["results"]
+    """
+    results = [None] * len(batch["mutations"])
+    pending = list(enumerate(batch["mutations"]))
+    while True:
+        document = load()
+        failed = []
+        for index, pending_mutate in pending:
+            try:
+                results[index] = (True, pending_mutate(document))
+            except Exception as e:
+                results[index] = (False, e)
+                failed.append(index)
+        if not failed:
+            break
+        # Il documento contiene le modifiche parziali di quelle fallite: si
+        # riparte da una copia pulita con le sole modifiche riuscite
+        pending = [(index, pending_mutate) for index, pending_mutate in pending if index not in failed]
+        if not pending:
+            break
+    batch["results"] = results
+    return document, bool(pending)
+
+def update_json(path, mutate, load, window=None, with_signatures=False, **dump_kwargs):
+    """
+    Applica una modifica read-modify-write a un documento JSON senza perdere aggiornamenti
+
+    Le chiamate concorrenti sullo stesso file vengono applicate in sequenza allo
+    stesso documento, letto sotto lock, e salvate con un'unica scrittura
+    atomica: mentre un batch viene scritto, le chiamate che arrivano formano il
+    batch successivo. Una scrittura senza concorrenza parte subito.
+
+    Se una modifica solleva un'eccezione, il documento viene riletto e le sole
+    modifiche riuscite vengono riapplicate: su disco non finisce mai un
+    documento modificato a metà. Le modifiche devono quindi poter essere
+    rieseguite (nessun effetto al di fuori del documento).
+
+    Args:
+        path (str): Percorso del file JSON
+        mutate (callable): Funzione che riceve il documento e lo modifica in place;
+            il suo valore di ritorno viene restituito al chiamante
+        load (callable): Funzione senza argomenti che legge il documento aggiornato dal disco
+        window (float, optional): Attesa di altre scritture in secondi quando
+            ce n'è già una in corso sul file (default WRITE_COALESCE_WINDOW)
+        with_signatures (bool): Se True restituisce anche la firma del file
+            (vedi json_cache.file_signature) letta sotto lock prima e dopo la scrittura
+        **dump_kwargs: Argomenti passati a json.dump
+
+    Returns:
+        Il valore restituito da mutate, oppure la tupla (valore, firma prima,
+        firma dopo) se with_signatures è True
+    """
+    if window is None:
+        window = WRITE_COALESCE_WINDOW
+    key = os.path.abspath(path)
+
+    with _pending_lock:
+        batch = _pending_batches.get(key)
+        is_leader = batch is None
+        if is_leader:
+            batch = {"mutations": [], "results": [], "signatures": (None, None), "error": None, "done": threading.Event()}
+            _pending_batches[key] = batch
+        index = len(batch["mutations"])
+        batch["mutations"].append(mutate)
+
+    if is_leader:
+        # Il primo chiamante scrive per tutti; attende altre scritture solo se
+        # il file è già occupato da un altro batch
+        with _pending_lock:
+            busy = _active_writers.get(key, 0) > 0
+            _active_writers[key] = _active_writers.get(key, 0) + 1
+        try:
+            if busy and window > 0:
+                time.sleep(window)
+            with file_lock(path):
+                # Il batch si chiude qui: chi arriva ora forma il batch successivo
+                with _pending_lock:
+                    _pending_batches.pop(key, None)
+                before = file_signature(path)
+                document, changed = _apply_mutations(batch, load)
+                if changed:
+                    atomic_write_json(path, document, **dump_kwargs)
+                batch["signatures"] = (before, file_signature(path))
+        except Exception as e:
+            batch["error"] = e
+        finally:
+            with _pending_lock:
+                _active_writers[key] -= 1
+                if not _active_writers[key]:
+                    del _active_writers[key]
+            batch["done"].set()
+    else:
+        batch["done"].wait()
+
+    if batch["error"] is not None:
+        raise batch["error"]
+
+    succeeded, result = batch["results"][index]
+    if not succeeded:
+        raise result
+    if with_signatures:
+        return (result,) + batch["signatures"]
+    return result
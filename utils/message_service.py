@@ -1,9 +1,27 @@
 import os
+import glob
 import json
 import random
+import tempfile
+import threading
 import streamlit as st
 from datetime import datetime
 from utils.ai_assistant import generate_automated_messages
+from utils.json_cache import file_signature
+from utils.json_writer import atomic_write_json, file_lock
+
+# Log dei messaggi: un file JSON Lines in sola aggiunta, archiviato in segmenti
+# numerati (message_logs.000001.jsonl, ...) quando supera MESSAGE_LOG_MAX_BYTES
+MESSAGE_LOG_DIR = "data"
+MESSAGE_LOG_FILE = os.path.join(MESSAGE_LOG_DIR, "message_logs.jsonl")
+MESSAGE_LOG_MAX_BYTES = int(os.environ.get("CIAOHOST_MESSAGE_LOG_MAX_BYTES", 5 * 1024 * 1024))
+
+# Vecchio formato (un'unica lista JSON), convertito al primo accesso
+LEGACY_MESSAGE_LOG_FILE = os.path.join(MESSAGE_LOG_DIR, "message_logs.json")
+
+# Indici degli offset per segmento: tutte le righe, per immobile e per tipo
+_message_indexes = {}
+_index_lock = threading.Lock()
 
 # Controllo se esiste il file twilio
 try:
@@ -49,10 +67,6 @@ def send_message(to_phone, message_text, message_type="notification", property_d
         "property_id": property_data.get("id") if property_data else None
     }
     
-    # Salva in session state
-    if "message_logs" not in st.session_state:
-        st.session_state.message_logs = []
-    
     # Invia via SMS se richiesto e possibile
     if via_sms and TWILIO_INSTALLED and has_twilio_keys():
         try:
@@ -69,29 +83,26 @@ def send_message(to_phone, message_text, message_type="notification", property_d
             
             message_log["status"] = "sent"
             message_log["sms_sid"] = sms.sid
-            st.session_state.message_logs.append(message_log)
             
-            # Salva i log dei messaggi
-            save_message_logs()
+            # Salva il messaggio nel log
+            append_message_log(message_log)
             
             return {"status": "success", "message": f"Messaggio inviato con successo a {phone}"}
             
         except Exception as e:
             message_log["status"] = "failed"
             message_log["error"] = str(e)
-            st.session_state.message_logs.append(message_log)
             
-            # Salva i log dei messaggi
-            save_message_logs()
+            # Salva il messaggio nel log
+            append_message_log(message_log)
             
             return {"status": "error", "message": f"Errore nell'invio del messaggio: {str(e)}"}
     else:
         # Modalità simulazione (senza SMS)
         message_log["status"] = "simulated"
-        st.session_state.message_logs.append(message_log)
         
-        # Salva i log dei messaggi
-        save_message_logs()
+        # Salva il messaggio nel log
+        append_message_log(message_log)
         
         return {"status": "simulated", "message": f"Messaggio simulato per {phone}: {message_text[:30]}..."}
 
@@ -150,51 +161,214 @@ def get_message_logs(property_id=None, message_type=None, limit=50):
     """
     Ottieni i log dei messaggi, opzionalmente filtrati
     
+    I messaggi vengono letti dal più recente usando gli indici degli offset per
+    immobile e per tipo: si leggono dal disco solo le righe restituite, senza
+    caricare né ordinare tutto lo storico.
+    
     Args:
         property_id (str, optional): Filtra per immobile
         message_type (str, optional): Filtra per tipo di messaggio
         limit (int): Numero massimo di messaggi da restituire
         
     Returns:
-        list: Lista di messaggi filtrati
+        list: Lista di messaggi filtrati (più recenti prima)
     """
-    if "message_logs" not in st.session_state:
-        load_message_logs()
+    _migrate_legacy_message_logs()
     
-    logs = st.session_state.message_logs
-    
-    # Applica filtri
-    if property_id:
-        logs = [log for log in logs if log.get("property_id") == property_id]
+    logs = []
+    for path in reversed(_message_log_segments()):
+        if len(logs) >= limit:
+            break
+        
+        index = _segment_index(path)
+        if index is None:
+            continue
+        
+        # Scegliamo la lista di offset più corta tra i filtri richiesti
+        candidates = [index["offsets"]]
+        if property_id:
+            candidates.append(index["property"].get(property_id, []))
+        if message_type:
+            candidates.append(index["type"].get(message_type, []))
+        offsets = min(candidates, key=len)
+        if not offsets:
+            continue
+        
+        with open(path, "rb") as f:
+            for offset in reversed(offsets):
+                f.seek(offset)
+                log = json.loads(f.readline())
+                if property_id and log.get("property_id") != property_id:
+                    continue
+                if message_type and log.get("type") != message_type:
+                    continue
+                logs.append(log)
+                if len(logs) >= limit:
+                    break
     
-    if message_type:
-        logs = [log for log in logs if log.get("type") == message_type]
+    return logs
+
+def append_message_log(message_log):
+    """
+    Aggiunge un messaggio in coda al log (una riga JSON, senza riscrivere il file)
     
-    # Ordina per timestamp (più recenti prima)
-    logs = sorted(logs, key=lambda x: x.get("timestamp", ""), reverse=True)
+    Quando il file supera MESSAGE_LOG_MAX_BYTES viene archiviato come segmento
+    numerato e si riparte da un file vuoto.
     
-    # Limita il numero di risultati
-    return logs[:limit]
-
-def save_message_logs():
-    """Salva i log dei messaggi su file"""
-    # Crea directory se non esiste
-    os.makedirs("data", exist_ok=True)
+    Args:
+        message_log (dict): Messaggio da registrare
+    """
+    _migrate_legacy_message_logs()
+    line = (json.dumps(message_log, ensure_ascii=False) + "\n").encode("utf-8")
     
     try:
-        with open("data/message_logs.json", "w", encoding="utf-8") as f:
-            json.dump(st.session_state.message_logs, f, ensure_ascii=False, indent=2)
+        os.makedirs(MESSAGE_LOG_DIR, exist_ok=True)
+        with file_lock(MESSAGE_LOG_FILE):
+            if os.path.exists(MESSAGE_LOG_FILE) and os.path.getsize(MESSAGE_LOG_FILE) + len(line) > MESSAGE_LOG_MAX_BYTES:
+                _rotate_message_log()
+            with open(MESSAGE_LOG_FILE, "ab") as f:
+                f.write(line)
     except Exception as e:
         st.error(f"Errore nel salvataggio dei log dei messaggi: {str(e)}")
 
 def load_message_logs():
-    """Carica i log dei messaggi da file"""
-    if os.path.exists("data/message_logs.json"):
+    """Carica tutto lo storico dei messaggi (dal più vecchio), ad esempio per un'esportazione"""
+    _migrate_legacy_message_logs()
+    
+    logs = []
+    for path in _message_log_segments():
         try:
-            with open("data/message_logs.json", "r", encoding="utf-8") as f:
-                st.session_state.message_logs = json.load(f)
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.endswith("\n"):
+                        logs.append(json.loads(line))
         except Exception as e:
             st.error(f"Errore nel caricamento dei log dei messaggi: {str(e)}")
-            st.session_state.message_logs = []
-    else:
-        st.session_state.message_logs = []
\ No newline at end of file
+    return logs
+
+def _message_log_segments():
+    """Segmenti archiviati (dal più vecchio) seguiti dal file corrente"""
+    segments = sorted(glob.glob(os.path.join(MESSAGE_LOG_DIR, "message_logs.*.jsonl")))
+    if os.path.exists(MESSAGE_LOG_FILE):
+        segments.append(MESSAGE_LOG_FILE)
+    return segments
+
+def _new_index():
+    return {"signature": None, "size": 0, "offsets": [], "property": {}, "type": {}}
+
+def _index_tail(index, path):
+    """Indicizza le righe aggiunte al file dopo l'ultimo offset già letto"""
+    with open(path, "rb") as f:
+        f.seek(index["size"])
+        offset = index["size"]
+        for line in f:
+            if not line.endswith(b"\n"):
+                # Riga ancora in scrittura: la leggeremo alla prossima interrogazione
+                break
+            try:
+                log = json.loads(line)
+            except json.JSONDecodeError:
+                offset += len(line)
+                continue
+            index["offsets"].append(offset)
+            if log.get("property_id"):
+                index["property"].setdefault(log["property_id"], []).append(offset)
+            if log.get("type"):
+                index["type"].setdefault(log["type"], []).append(offset)
+            offset += len(line)
+        index["size"] = offset
+
+def _segment_index(path):
+    """
+    Indice degli offset di un segmento, aggiornato leggendo solo le righe nuove
+    
+    I segmenti archiviati non cambiano più: il loro indice viene salvato accanto
+    al file (<segmento>.idx) e riletto alle aperture successive.
+    """
+    signature = file_signature(path)
+    if signature is None:
+        return None
+    
+    with _index_lock:
+        index = _message_indexes.get(path)
+        if index is not None and index["signature"] == signature:
+            return index
+        
+        sealed = path != MESSAGE_LOG_FILE
+        if index is None and sealed:
+            index = _load_index_file(path, signature)
+        if index is None or signature[1] < index["size"] or (index["signature"] and signature[2] != index["signature"][2]):
+            # Primo accesso oppure file sostituito (rotazione): si riparte da zero
+            index = _new_index()
+        
+        _index_tail(index, path)
+        index["signature"] = signature
+        _message_indexes[path] = index
+        if sealed:
+            _save_index_file(path, index)
+        return index
+
+def _load_index_file(path, signature):
+    try:
+        with open(path + ".idx", "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if index.get("size") != signature[1]:
+        return None
+    index["signature"] = signature
+    return index
+
+def _save_index_file(path, index):
+    data = {key: value for key, value in index.items() if key != "signature"}
+    try:
+        atomic_write_json(path + ".idx", data, separators=(",", ":"))
+    except OSError:
+        pass  # L'indice è solo una cache: verrà ricostruito
+
+def _rotate_message_log():
+    """Archivia il file corrente come segmento numerato (chiamare sotto file_lock)"""
+    segments = sorted(glob.glob(os.path.join(MESSAGE_LOG_DIR, "message_logs.*.jsonl")))
+    last_number = int(os.path.basename(segments[-1]).split(".")[1]) if segments else 0
+    segment = os.path.join(MESSAGE_LOG_DIR, f"message_logs.{last_number + 1:06d}.jsonl")
+    os.replace(MESSAGE_LOG_FILE, segment)
+    
+    # L'indice del file corrente vale anche per il segmento (stesso inode, stessi offset)
+    with _index_lock:
+        index = _message_indexes.pop(MESSAGE_LOG_FILE, None)
+        if index is not None:
+            _message_indexes[segment] = index
+    _segment_index(segment)
+
+def _migrate_legacy_message_logs():
+    """Converte una sola volta il vecchio data/message_logs.json nel log JSON Lines"""
+    if not os.path.exists(LEGACY_MESSAGE_LOG_FILE):
+        return
+    
+    os.makedirs(MESSAGE_LOG_DIR, exist_ok=True)
+    with file_lock(MESSAGE_LOG_FILE):
+        if not os.path.exists(LEGACY_MESSAGE_LOG_FILE):
+            return
+        try:
+            with open(LEGACY_MESSAGE_LOG_FILE, "r", encoding="utf-8") as f:
+                legacy_logs = json.load(f)
+        except Exception as e:
+            st.error(f"Errore nel caricamento dei log dei messaggi: {str(e)}")
+            return
+        
+        # Il vecchio file non era ordinato: nel log l'ordine di scrittura è quello cronologico
+        legacy_logs.sort(key=lambda log: log.get("timestamp", ""))
+        existing = b""
+        if os.path.exists(MESSAGE_LOG_FILE):
+            with open(MESSAGE_LOG_FILE, "rb") as f:
+                existing = f.read()
+        
+        fd, temp_path = tempfile.mkstemp(dir=MESSAGE_LOG_DIR, prefix=".message_logs.", suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            for log in legacy_logs:
+                f.write((json.dumps(log, ensure_ascii=False) + "\n").encode("utf-8"))
+            f.write(existing)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, MESSAGE_LOG_FILE)
+        os.replace(LEGACY_MESSAGE_LOG_FILE, LEGACY_MESSAGE_LOG_FILE + ".migrated")
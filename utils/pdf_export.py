@@ -6,9 +6,11 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.units import cm, mm
 from reportlab.platypus.flowables import KeepTogether
 from io import BytesIO
-from datetime import datetime
+from datetime import date, datetime
 import os
 
+from utils.booking_records import parse_date, to_records
+
 def create_logo():
     """Crea un'immagine di logo semplice se non esiste"""
     logo_path = "data/logo.png"
@@ -366,12 +368,11 @@ def create_property_report_pdf(property_data, bookings_data=None, period=None):
         # Filtriamo le prenotazioni se è specificato un periodo
         filtered_bookings = bookings_data
         if period and period.get('start_date') and period.get('end_date'):
-            start_date = datetime.strptime(period.get('start_date'), '%Y-%m-%d').date()
-            end_date = datetime.strptime(period.get('end_date'), '%Y-%m-%d').date()
+            start_date = parse_date(period.get('start_date'))
+            end_date = parse_date(period.get('end_date'))
             filtered_bookings = [
-                b for b in bookings_data 
-                if (datetime.strptime(b.get('checkin_date'), '%Y-%m-%d').date() <= end_date and
-                    datetime.strptime(b.get('checkout_date'), '%Y-%m-%d').date() >= start_date)
+                b for b, record in zip(bookings_data, to_records(bookings_data))
+                if record.overlaps(start_date, end_date)
             ]
         
         if filtered_bookings:
@@ -482,20 +483,19 @@ def create_financial_report_pdf(bookings_data, period=None, properties_data=None
     content.append(Paragraph(f"Data report: {datetime.now().strftime('%d/%m/%Y')}", styles['Normal']))
     content.append(Spacer(1, 12))
     
+    # Convertiamo le date delle prenotazioni una sola volta
+    filtered_bookings = to_records(bookings_data)
+    
     # Filtriamo le prenotazioni se è specificato un periodo
-    filtered_bookings = bookings_data
+    start_date = end_date = None
     if period and period.get('start_date') and period.get('end_date'):
-        start_date = datetime.strptime(period.get('start_date'), '%Y-%m-%d').date()
-        end_date = datetime.strptime(period.get('end_date'), '%Y-%m-%d').date()
-        filtered_bookings = [
-            b for b in bookings_data 
-            if (datetime.strptime(b.get('checkin_date'), '%Y-%m-%d').date() <= end_date and
-                datetime.strptime(b.get('checkout_date'), '%Y-%m-%d').date() >= start_date)
-        ]
+        start_date = parse_date(period.get('start_date'))
+        end_date = parse_date(period.get('end_date'))
+        filtered_bookings = [b for b in filtered_bookings if b.overlaps(start_date, end_date)]
     
     # Riepilogo finanziario
-    total_revenue = sum(b.get('total_price', 0) for b in filtered_bookings)
-    total_cleaning_fees = sum(b.get('cleaning_fee', 0) for b in filtered_bookings)
+    total_revenue = sum(b.total_price for b in filtered_bookings)
+    total_cleaning_fees = sum(b.cleaning_fee for b in filtered_bookings)
     total_bookings = len(filtered_bookings)
     
     # Calcola il ricavo netto (ricavo - tasse e commissioni stimate)
@@ -537,7 +537,7 @@ def create_financial_report_pdf(bookings_data, period=None, properties_data=None
         property_dict = {p.get('id'): p for p in properties_data}
         
         for booking in filtered_bookings:
-            property_id = booking.get('property_id')
+            property_id = booking.property_id
             if property_id not in bookings_by_property:
                 bookings_by_property[property_id] = []
             bookings_by_property[property_id].append(booking)
@@ -549,20 +549,18 @@ def create_financial_report_pdf(bookings_data, period=None, properties_data=None
         
         for property_id, prop_bookings in bookings_by_property.items():
             property_name = property_dict.get(property_id, {}).get('name', 'Sconosciuto')
-            property_revenue = sum(b.get('total_price', 0) for b in prop_bookings)
+            property_revenue = sum(b.total_price for b in prop_bookings)
             property_bookings = len(prop_bookings)
             
             # Calcolo occupazione (giorni occupati / giorni totali nel periodo)
             # Semplificazione: contiamo i giorni di ogni prenotazione nel periodo
             occupied_days = 0
-            if period:
-                start_date = datetime.strptime(period.get('start_date'), '%Y-%m-%d').date()
-                end_date = datetime.strptime(period.get('end_date'), '%Y-%m-%d').date()
+            if start_date and end_date:
                 total_days = (end_date - start_date).days + 1
                 
                 for booking in prop_bookings:
-                    booking_start = max(start_date, datetime.strptime(booking.get('checkin_date'), '%Y-%m-%d').date())
-                    booking_end = min(end_date, datetime.strptime(booking.get('checkout_date'), '%Y-%m-%d').date())
+                    booking_start = max(start_date, booking.check_in)
+                    booking_end = min(end_date, booking.check_out)
                     booking_days = (booking_end - booking_start).days + 1
                     occupied_days += max(0, booking_days)
                 
@@ -606,18 +604,17 @@ def create_financial_report_pdf(bookings_data, period=None, properties_data=None
             property_dict = {p.get('id'): p.get('name') for p in properties_data}
         
         # Ordina le prenotazioni per data di check-in
-        sorted_bookings = sorted(filtered_bookings, key=lambda b: b.get('checkin_date', ''))
+        sorted_bookings = sorted(filtered_bookings, key=lambda b: b.check_in or date.min)
         
         for booking in sorted_bookings:
-            property_id = booking.get('property_id')
-            property_name = property_dict.get(property_id, 'Sconosciuto')
+            property_name = property_dict.get(booking.property_id, 'Sconosciuto')
             
             bookings_table_data.append([
-                booking.get('checkin_date'),
+                booking.check_in.isoformat() if booking.check_in else '',
                 property_name,
-                booking.get('guest_name'),
-                booking.get('status'),
-                f"€{booking.get('total_price', 0):.2f}"
+                booking.guest_name,
+                booking.status,
+                f"€{booking.total_price:.2f}"
             ])
         
         bookings_table = Table(bookings_table_data, colWidths=[doc.width*0.15, doc.width*0.3, doc.width*0.2, doc.width*0.15, doc.width*0.2])
@@ -0,0 +1,306 @@
+"""
+Calendario prezzi di tutti gli immobili in un unico archivio binario mappato in memoria.
+
+Sostituisce i file data/pricing_<id>.json (una lista di {date, price, status}
+per ogni immobile): i prezzi sono una matrice float32 immobili × giorni e gli
+stati una matrice uint8 delle stesse dimensioni, entrambe aperte con
+numpy.memmap. Leggere il calendario di un immobile è una slice della matrice
+(nessun parsing) e le modifiche scrivono solo le celle interessate, sotto lo
+stesso lock di meta.json con cui un altro processo potrebbe allargare i file.
+
+File in PRICE_CALENDAR_DIR:
+    prices.f32   matrice float32 (NaN = nessun prezzo per quel giorno)
+    status.u8    matrice uint8 con l'indice dello stato in STATUSES (0 = nessun dato)
+    meta.json    primo giorno, numero di giorni, righe allocate e riga di ogni immobile
+
+Uso da riga di comando (importa i vecchi file JSON, è idempotente):
+
+    python -m utils.price_calendar [--pattern "data/pricing_*.json"]
+"""
+import argparse
+import glob
+import json
+import os
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+from utils.json_cache import file_signature
+from utils.json_writer import atomic_write_json, file_lock
+
+PRICE_CALENDAR_DIR = os.path.join("data", "price_calendar")
+
+# File JSON per immobile usati prima del calendario binario
+LEGACY_PRICING_PATTERN = os.path.join("data", "pricing_*.json")
+
+# Stati possibili di un giorno; l'indice nella tupla è il valore salvato
+STATUSES = ("", "available", "booked", "blocked", "unavailable")
+
+# Giorni di un archivio nuovo, a partire dal 1° gennaio dell'anno scorso; le
+# matrici si allargano da sole per date fuori da questo intervallo
+DEFAULT_DAYS = 4 * 366
+
+class PriceCalendar:
+    """Matrici prezzi/stati mappate in memoria e righe degli immobili"""
+
+    def __init__(self, directory=PRICE_CALENDAR_DIR):
+        self.directory = directory
+        self.meta_file = os.path.join(directory, "meta.json")
+        self.prices_file = os.path.join(directory, "prices.f32")
+        self.status_file = os.path.join(directory, "status.u8")
+        self._signature = None
+        self._open()
+
+    def _open(self):
+        """(Ri)apre le matrici secondo meta.json, creando un archivio vuoto se manca"""
+        os.makedirs(self.directory, exist_ok=True)
+        with file_lock(self.meta_file):
+            if not os.path.exists(self.meta_file):
+                origin = date(date.today().year - 1, 1, 1)
+                self._create(origin, DEFAULT_DAYS, 16, {})
+            with open(self.meta_file, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self._signature = file_signature(self.meta_file)
+
+        self.origin = date.fromisoformat(meta["origin"])
+        self.days = meta["days"]
+        self.capacity = meta["capacity"]
+        self.rows = meta["properties"]
+        shape = (self.capacity, self.days)
+        self.prices = np.memmap(self.prices_file, dtype=np.float32, mode="r+", shape=shape)
+        self.status = np.memmap(self.status_file, dtype=np.uint8, mode="r+", shape=shape)
+
+    def _create(self, origin, days, capacity, rows, copy_from=None):
+        """Scrive matrici e meta.json nuovi (chiamare sotto file_lock), copiando i dati esistenti"""
+        shape = (capacity, days)
+        prices = np.memmap(self.prices_file + ".tmp", dtype=np.float32, mode="w+", shape=shape)
+        status = np.memmap(self.status_file + ".tmp", dtype=np.uint8, mode="w+", shape=shape)
+        prices[:] = np.nan
+        if copy_from is not None:
+            # Copia della parte comune dei due assi dei giorni
+            shift = (copy_from.origin - origin).days
+            src_start = max(0, -shift)
+            dst_start = max(0, shift)
+            length = min(copy_from.days - src_start, days - dst_start)
+            if length > 0:
+                used = len(copy_from.rows)
+                prices[:used, dst_start:dst_start + length] = copy_from.prices[:used, src_start:src_start + length]
+                status[:used, dst_start:dst_start + length] = copy_from.status[:used, src_start:src_start + length]
+        prices.flush()
+        status.flush()
+        del prices, status
+        os.replace(self.prices_file + ".tmp", self.prices_file)
+        os.replace(self.status_file + ".tmp", self.status_file)
+        atomic_write_json(self.meta_file, {
+            "origin": origin.isoformat(),
+            "days": days,
+            "capacity": capacity,
+            "properties": rows,
+        })
+
+    def refresh(self):
+        """Riapre l'archivio se un altro processo ha aggiunto immobili o esteso le matrici"""
+        if file_signature(self.meta_file) != self._signature:
+            self._open()
+
+    def __contains__(self, property_id):
+        self.refresh()
+        return property_id in self.rows
+
+    def _column(self, day):
+        return (day - self.origin).days
+
+    def _ensure(self, property_id, first_day, last_day):
+        """
+        Riga dell'immobile, allargando le matrici se servono altre righe o altri giorni
+
+        Chi scrive nelle matrici deve tenere file_lock(meta_file) anche durante la
+        scrittura: un altro processo che le allarga sostituisce i file, e una
+        scrittura sulla mappa dei file vecchi andrebbe persa.
+        """
+        with file_lock(self.meta_file):
+            self.refresh()
+            row = self.rows.get(property_id)
+            rows = dict(self.rows)
+            if row is None:
+                row = rows[property_id] = len(rows)
+
+            origin = min(self.origin, first_day)
+            end = max(self.origin + timedelta(days=self.days), last_day + timedelta(days=1))
+            days = (end - origin).days
+            capacity = self.capacity if row < self.capacity else 2 * self.capacity
+
+            if origin != self.origin or days != self.days or capacity != self.capacity:
+                self._create(origin, days, capacity, rows, copy_from=self)
+                self._open()
+            elif property_id not in self.rows:
+                atomic_write_json(self.meta_file, {
+                    "origin": self.origin.isoformat(),
+                    "days": self.days,
+                    "capacity": self.capacity,
+                    "properties": rows,
+                })
+                self.rows = rows
+                self._signature = file_signature(self.meta_file)
+            return row
+
+    def set_range(self, property_id, start, end, price, status=None):
+        """
+        Imposta lo stesso prezzo per tutti i giorni da start a end inclusi
+
+        Args:
+            property_id (str): ID dell'immobile
+            start (date): Primo giorno
+            end (date): Ultimo giorno (incluso)
+            price (float): Prezzo per notte
+            status (str, optional): Nuovo stato dei giorni (vedi STATUSES); se
+                omesso i giorni prenotati o bloccati restano tali e solo quelli
+                senza dati diventano "available"
+        """
+        with file_lock(self.meta_file):
+            row = self._ensure(property_id, start, end)
+            first, last = self._column(start), self._column(end) + 1
+            self.prices[row, first:last] = price
+            codes = self.status[row, first:last]
+            if status is None:
+                codes[codes == 0] = _status_code("available")
+            else:
+                codes[:] = _status_code(status)
+            self.flush()
+
+    def write_property(self, property_id, pricing_data):
+        """Sostituisce il calendario di un immobile con una lista di {date, price, status}"""
+        entries = [(date.fromisoformat(entry["date"][:10]), entry) for entry in pricing_data]
+        if not entries:
+            return
+        days = [day for day, _ in entries]
+        prices = np.fromiter((float(entry.get("price", 0)) for _, entry in entries), dtype=np.float32, count=len(entries))
+        codes = np.fromiter((_status_code(entry.get("status", "available")) for _, entry in entries), dtype=np.uint8, count=len(entries))
+
+        with file_lock(self.meta_file):
+            row = self._ensure(property_id, min(days), max(days))
+            columns = np.fromiter((self._column(day) for day in days), dtype=np.intp, count=len(days))
+            self.prices[row] = np.nan
+            self.status[row] = 0
+            self.prices[row, columns] = prices
+            self.status[row, columns] = codes
+            self.flush()
+
+    def read_property(self, property_id):
+        """
+        Calendario di un immobile nel formato dei vecchi file JSON
+
+        Returns:
+            list: Lista di {date, price, status} ordinata per data, vuota se l'immobile non ha prezzi
+        """
+        self.refresh()
+        row = self.rows.get(property_id)
+        if row is None:
+            return []
+        columns = np.flatnonzero(self.status[row])
+        prices = self.prices[row, columns]
+        codes = self.status[row, columns]
+        return [
+            {
+                "date": (self.origin + timedelta(days=int(column))).isoformat(),
+                "price": round(float(price), 2),
+                "status": STATUSES[code],
+            }
+            for column, price, code in zip(columns, prices, codes)
+        ]
+
+    def view_range(self, start, end):
+        """
+        Prezzi e stati di tutti gli immobili da start a end inclusi, senza copiare i dati
+
+        Le matrici restituite sono viste in sola lettura sulle mappe dei file:
+        leggerle non copia nulla, ma un altro processo che allarga l'archivio
+        sostituisce i file, quindi vanno richieste di nuovo ad ogni uso invece
+        di essere conservate.
+
+        Args:
+            start (date): Primo giorno
+            end (date): Ultimo giorno (incluso); l'intervallo viene limitato ai
+                giorni presenti nell'archivio
+
+        Returns:
+            tuple: (prices, status, rows, first_day) con prices e status di forma
+                (immobili, giorni), rows = {property_id: riga} e first_day il
+                giorno della prima colonna
+        """
+        self.refresh()
+        first = min(max(self._column(start), 0), self.days)
+        last = min(max(self._column(end) + 1, first), self.days)
+        used = len(self.rows)
+        prices = self.prices[:used, first:last].view()
+        status = self.status[:used, first:last].view()
+        prices.flags.writeable = False
+        status.flags.writeable = False
+        return prices, status, dict(self.rows), self.origin + timedelta(days=first)
+
+    def flush(self):
+        self.prices.flush()
+        self.status.flush()
+
+def _status_code(status):
+    try:
+        return STATUSES.index(status)
+    except ValueError:
+        return STATUSES.index("available")
+
+def import_legacy_files(calendar=None, pattern=LEGACY_PRICING_PATTERN):
+    """
+    Importa nel calendario i vecchi file data/pricing_<id>.json
+
+    Returns:
+        int: Numero di immobili importati
+    """
+    calendar = calendar or get_price_calendar()
+    imported = 0
+    for path in sorted(glob.glob(pattern)):
+        property_id = os.path.basename(path)[len("pricing_"):-len(".json")]
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                pricing_data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        # Altri file con lo stesso prefisso (es. pricing_seasons.json) non sono calendari
+        if not isinstance(pricing_data, list) or not all(isinstance(entry, dict) and "date" in entry for entry in pricing_data):
+            continue
+        calendar.write_property(property_id, pricing_data)
+        imported += 1
+    return imported
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+def get_price_calendar():
+    """Calendario prezzi del processo; alla prima apertura importa i vecchi file JSON"""
+    global _calendar
+    with _calendar_lock:
+        if _calendar is None:
+            is_new = not os.path.exists(os.path.join(PRICE_CALENDAR_DIR, "meta.json"))
+            _calendar = PriceCalendar()
+            if is_new:
+                import_legacy_files(_calendar)
+        return _calendar
+
+def load_pricing_data(property_id):
+    """Calendario di un immobile come lista di {date, price, status}, None se non ci sono prezzi"""
+    return get_price_calendar().read_property(property_id) or None
+
+def save_pricing_data(property_id, pricing_data):
+    """Salva il calendario di un immobile (lista di {date, price, status})"""
+    get_price_calendar().write_property(property_id, pricing_data)
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa i file data/pricing_<id>.json nel calendario prezzi binario")
+    parser.add_argument("--pattern", default=LEGACY_PRICING_PATTERN, help="File JSON da importare")
+    args = parser.parse_args()
+
+    imported = import_legacy_files(pattern=args.pattern)
+    print(f"✅ Calendari importati: {imported}")
+
+if __name__ == "__main__":
+    main()
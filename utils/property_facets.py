@@ -0,0 +1,198 @@
+"""
+Facet degli immobili (tipo, località, servizi, prezzo) per i filtri della ricerca.
+
+Per ogni facet viene mantenuto l'insieme degli immobili di ogni valore, così
+che i filtri della pagina di ricerca leggano valori e conteggi già pronti
+invece di scorrere tutto il catalogo ad ogni rerun, e i filtri per tipo,
+località e servizi diventino intersezioni di insiemi. I prezzi sono tenuti in
+una lista ordinata: minimo, massimo e fascia di prezzo costano una bisect.
+
+Come l'indice testuale di utils/property_search.py, l'indice del processo
+segue la vista in cache di utils/json_database.py e aggiorna solo gli immobili
+aggiunti, modificati o eliminati.
+"""
+import bisect
+import threading
+from collections import Counter
+
+from utils import json_database
+
+# Facet a valore singolo (campo del file JSON) e facet a più valori
+SINGLE_FACETS = ("type", "location")
+MULTI_FACETS = ("services",)
+FACETS = SINGLE_FACETS + MULTI_FACETS
+
+DEFAULT_FACET_VALUE = "Non specificato"
+
+def _facet_values(prop):
+    """Valori di ogni facet di un immobile: {facet: tupla di valori}"""
+    values = {facet: (prop.get(facet) or DEFAULT_FACET_VALUE,) for facet in SINGLE_FACETS}
+    for facet in MULTI_FACETS:
+        values[facet] = tuple(sorted(set(prop.get(facet) or ())))
+    return values
+
+def _price(prop):
+    try:
+        return float(prop.get("price") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+class FacetIndex:
+    """Immobili per valore di ogni facet e prezzi ordinati"""
+
+    def __init__(self):
+        self._postings = {facet: {} for facet in FACETS}
+        self._documents = {}
+        self._prices = []
+
+    def __len__(self):
+        return len(self._documents)
+
+    @classmethod
+    def from_properties(cls, properties):
+        """Costruisce l'indice da un dizionario {property_id: immobile} nel formato JSON"""
+        index = cls()
+        for property_id, prop in properties.items():
+            index.add(property_id, prop)
+        return index
+
+    def add(self, property_id, prop):
+        """Indicizza (o reindicizza) un immobile"""
+        self.remove(property_id)
+        values = _facet_values(prop)
+        price = _price(prop)
+        for facet, facet_values in values.items():
+            for value in facet_values:
+                self._postings[facet].setdefault(value, set()).add(property_id)
+        bisect.insort(self._prices, (price, property_id))
+        self._documents[property_id] = (values, price)
+
+    def remove(self, property_id):
+        """Toglie un immobile dall'indice, se presente"""
+        document = self._documents.pop(property_id, None)
+        if document is None:
+            return
+        values, price = document
+        for facet, facet_values in values.items():
+            postings = self._postings[facet]
+            for value in facet_values:
+                postings[value].discard(property_id)
+                if not postings[value]:
+                    del postings[value]
+        del self._prices[bisect.bisect_left(self._prices, (price, property_id))]
+
+    def counts(self, facet, property_ids=None):
+        """
+        Numero di immobili per valore di un facet
+
+        Args:
+            facet (str): Nome del facet (vedi FACETS)
+            property_ids (iterable, optional): Limita il conteggio a questi
+                immobili (es. i risultati filtrati); il costo dipende da quanti sono
+
+        Returns:
+            dict: {valore: numero di immobili}
+        """
+        if property_ids is None:
+            return {value: len(ids) for value, ids in self._postings[facet].items()}
+        counter = Counter()
+        for property_id in property_ids:
+            document = self._documents.get(property_id)
+            if document is not None:
+                counter.update(document[0][facet])
+        return dict(counter)
+
+    def price_bounds(self):
+        """(prezzo minimo, prezzo massimo) del catalogo, (0, 0) se vuoto"""
+        if not self._prices:
+            return (0.0, 0.0)
+        return (self._prices[0][0], self._prices[-1][0])
+
+    def price(self, property_id):
+        """Prezzo indicizzato di un immobile"""
+        return self._documents[property_id][1]
+
+    def ids_for(self, facet, value):
+        """Immobili con quel valore del facet (insieme in sola lettura)"""
+        return self._postings[facet].get(value, frozenset())
+
+    def ids_in_price_range(self, low, high):
+        """Immobili con prezzo compreso tra low e high inclusi"""
+        start = bisect.bisect_left(self._prices, (low,))
+        stop = bisect.bisect_right(self._prices, (high, "\U0010ffff"))
+        return {property_id for _, property_id in self._prices[start:stop]}
+
+# Indice del processo e vista di json_database da cui è stato costruito
+_index = None
+_view = None
+_lock = threading.Lock()
+
+def _current_index():
+    """Indice allineato alla vista corrente del database (chiamare sotto _lock)"""
+    global _index, _view
+    view = json_database.get_database_view()
+    if _index is None:
+        _index = FacetIndex.from_properties(view.get("properties", {}))
+    elif view is not _view:
+        old_properties = _view.get("properties", {})
+        new_properties = view.get("properties", {})
+        for property_id in old_properties.keys() - new_properties.keys():
+            _index.remove(property_id)
+        for property_id, prop in new_properties.items():
+            old = old_properties.get(property_id)
+            if old is None or _facet_values(old) != _facet_values(prop) or _price(old) != _price(prop):
+                _index.add(property_id, prop)
+    _view = view
+    return _index
+
+def get_facets(property_ids=None):
+    """
+    Valori dei facet con il numero di immobili e fascia di prezzo
+
+    Args:
+        property_ids (iterable, optional): Conta solo questi immobili (default tutto il catalogo)
+
+    Returns:
+        dict: {"type": {valore: n}, "location": {...}, "services": {...},
+            "price": (minimo, massimo)}; la fascia di prezzo è sempre quella del catalogo
+    """
+    with _lock:
+        index = _current_index()
+        if property_ids is not None:
+            property_ids = list(property_ids)
+        facets = {facet: index.counts(facet, property_ids) for facet in FACETS}
+        facets["price"] = index.price_bounds()
+        return facets
+
+def filter_property_ids(property_type=None, location=None, services=(), price_range=None):
+    """
+    Immobili che soddisfano i filtri per facet, come intersezione degli insiemi dell'indice
+
+    Args:
+        property_type (str, optional): Tipo richiesto
+        location (str, optional): Località richiesta
+        services (iterable): Servizi che l'immobile deve avere tutti
+        price_range (tuple, optional): (prezzo minimo, prezzo massimo) inclusi
+
+    Returns:
+        set: ID degli immobili, None se non è attivo nessun filtro
+    """
+    with _lock:
+        index = _current_index()
+        sets = []
+        if property_type is not None:
+            sets.append(index.ids_for("type", property_type))
+        if location is not None:
+            sets.append(index.ids_for("location", location))
+        for service in services:
+            sets.append(index.ids_for("services", service))
+        if not sets and price_range is None:
+            return None
+        sets.sort(key=len)
+        result = set(sets[0]) if sets else index.ids_in_price_range(*price_range)
+        for ids in sets[1:]:
+            result &= ids
+        if sets and price_range is not None:
+            low, high = price_range
+            result = {property_id for property_id in result if low <= index.price(property_id) <= high}
+        return result
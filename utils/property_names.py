@@ -0,0 +1,245 @@
+"""
+Indice a trigrammi dei nomi degli immobili per riconoscere il nome scritto in
+/prenota <nome> anche con errori di battitura o parole mancanti.
+
+Ogni nome (e ogni alias, campo "aliases" dell'immobile) viene normalizzato come
+nella ricerca testuale (minuscole, senza accenti) e diviso in trigrammi di
+caratteri, con le parole completate da spazi come in pg_trgm ("viola" ->
+"  v", " vi", "vio", "iol", "ola", "la "). Ogni trigramma rimanda ai nomi che
+lo contengono: una ricerca conta in un solo passaggio numpy (bincount) i
+trigrammi in comune con i nomi che ne condividono almeno uno e li ordina per
+somiglianza (coefficiente di Dice), senza confrontare la query con ogni nome.
+
+Come gli altri indici degli immobili, l'indice del processo segue la vista in
+cache di utils/json_database.py e aggiorna solo gli immobili cambiati.
+"""
+import heapq
+import threading
+
+import numpy as np
+
+from utils import json_database
+from utils.property_search import fold_text, tokenize
+
+# Somiglianza minima perché un nome sia proposto come alternativa
+MIN_SIMILARITY = 0.3
+
+# Somiglianza oltre la quale il primo candidato viene scelto senza chiedere conferma,
+# se il secondo è abbastanza distante
+AUTO_SELECT_SIMILARITY = 0.85
+AUTO_SELECT_MARGIN = 0.15
+
+def name_key(name):
+    """Forma normalizzata di un nome ("Casetta  Viola!" -> "casetta viola")"""
+    return " ".join(tokenize(name))
+
+def trigrams(text):
+    """Insieme dei trigrammi di un testo già normalizzato"""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def property_names(prop):
+    """Nomi con cui un immobile può essere cercato: nome e alias"""
+    names = [prop.get("name") or ""]
+    aliases = prop.get("aliases") or ()
+    if isinstance(aliases, str):
+        aliases = [aliases]
+    names.extend(aliases)
+    return tuple(name for name in names if name_key(name))
+
+class PropertyNameIndex:
+    """Indice trigramma -> nomi, con ricerca per somiglianza"""
+
+    def __init__(self):
+        # Ogni nome normalizzato occupa una posizione (slot) negli array
+        self._slot_keys = []
+        self._slot_properties = []
+        self._free_slots = []
+        self._key_slots = {}
+        self._gram_counts = np.zeros(0)
+        # Trigramma -> slot dei nomi che lo contengono (e copia in array per la ricerca)
+        self._postings = {}
+        self._arrays = {}
+        self._documents = {}
+
+    def __len__(self):
+        return len(self._documents)
+
+    @classmethod
+    def from_properties(cls, properties):
+        """Costruisce l'indice da un dizionario {property_id: immobile} nel formato JSON"""
+        index = cls()
+        for property_id, prop in properties.items():
+            index.add(property_id, prop)
+        return index
+
+    def add(self, property_id, prop):
+        """Indicizza (o reindicizza) un immobile"""
+        self.remove(property_id)
+        keys = tuple({name_key(name): None for name in property_names(prop)})
+        for key in keys:
+            slot = self._key_slots.get(key)
+            if slot is None:
+                slot = self._new_slot(key)
+            self._slot_properties[slot].add(property_id)
+        name = prop.get("name") or ""
+        self._documents[property_id] = (name, fold_text(name), keys)
+
+    def remove(self, property_id):
+        """Toglie un immobile dall'indice, se presente"""
+        document = self._documents.pop(property_id, None)
+        if document is None:
+            return
+        for key in document[2]:
+            slot = self._key_slots[key]
+            self._slot_properties[slot].discard(property_id)
+            if not self._slot_properties[slot]:
+                self._free_slot(slot)
+
+    def _new_slot(self, key):
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._slot_keys[slot] = key
+        else:
+            slot = len(self._slot_keys)
+            self._slot_keys.append(key)
+            self._slot_properties.append(set())
+            if slot >= len(self._gram_counts):
+                # Crescita geometrica: la copia dell'array costa O(1) ammortizzato
+                self._gram_counts = np.resize(self._gram_counts, max(16, 2 * len(self._gram_counts)))
+        grams = trigrams(key)
+        self._gram_counts[slot] = len(grams)
+        self._key_slots[key] = slot
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(slot)
+            self._arrays.pop(gram, None)
+        return slot
+
+    def _free_slot(self, slot):
+        key = self._slot_keys[slot]
+        for gram in trigrams(key):
+            postings = self._postings[gram]
+            postings.discard(slot)
+            self._arrays.pop(gram, None)
+            if not postings:
+                del self._postings[gram]
+        del self._key_slots[key]
+        self._slot_keys[slot] = None
+        self._gram_counts[slot] = 0
+        self._free_slots.append(slot)
+
+    def _posting_array(self, gram):
+        array = self._arrays.get(gram)
+        if array is None:
+            array = self._arrays[gram] = np.fromiter(self._postings[gram], dtype=np.intp)
+        return array
+
+    def name(self, property_id):
+        """Nome dell'immobile indicizzato"""
+        return self._documents[property_id][0]
+
+    def search(self, query, limit=5, min_similarity=MIN_SIMILARITY):
+        """
+        Immobili con un nome o alias simile alla query, dal più simile
+
+        Args:
+            query (str): Nome scritto dall'utente, es. "casetta viola"
+            limit (int): Numero massimo di candidati
+            min_similarity (float): Somiglianza minima (0-1)
+
+        Returns:
+            list: [(property_id, somiglianza)], somiglianza 1.0 per un nome identico
+        """
+        key = name_key(query)
+        query_grams = trigrams(key)
+        arrays = [self._posting_array(gram) for gram in query_grams if gram in self._postings]
+        if not arrays:
+            return []
+
+        # Trigrammi in comune con ogni nome, contati in un solo passaggio
+        shared = np.bincount(np.concatenate(arrays), minlength=len(self._slot_keys))
+        slots = np.flatnonzero(shared)
+        similarity = 2 * shared[slots] / (len(query_grams) + self._gram_counts[slots])
+        # Nomi diversi possono avere gli stessi trigrammi: 1.0 solo se identici
+        similarity = np.minimum(similarity, 0.99)
+        exact = self._key_slots.get(key)
+        if exact is not None:
+            similarity[slots == exact] = 1.0
+        keep = similarity >= min_similarity
+        slots, similarity = slots[keep], similarity[keep]
+
+        # Nomi dal più simile finché ci sono abbastanza immobili, compresi
+        # quelli a pari merito con l'ultimo (ordinati poi per nome)
+        best = {}
+        last = None
+        for position in np.argsort(-similarity, kind="stable"):
+            value = float(similarity[position])
+            if len(best) >= limit and value < last:
+                break
+            last = value
+            for property_id in self._slot_properties[slots[position]]:
+                best.setdefault(property_id, value)
+
+        return heapq.nsmallest(limit, best.items(), key=lambda item: (-item[1], self._documents[item[0]][1]))
+
+# Indice del processo e vista di json_database da cui è stato costruito
+_index = None
+_view = None
+_lock = threading.Lock()
+
+def _current_index():
+    """Indice allineato alla vista corrente del database (chiamare sotto _lock)"""
+    global _index, _view
+    view = json_database.get_database_view()
+    if _index is None:
+        _index = PropertyNameIndex.from_properties(view.get("properties", {}))
+    elif view is not _view:
+        old_properties = _view.get("properties", {})
+        new_properties = view.get("properties", {})
+        for property_id in old_properties.keys() - new_properties.keys():
+            _index.remove(property_id)
+        for property_id, prop in new_properties.items():
+            old = old_properties.get(property_id)
+            if old is None or property_names(old) != property_names(prop):
+                _index.add(property_id, prop)
+    _view = view
+    return _index
+
+def find_property_candidates(query, limit=5):
+    """
+    Immobili il cui nome (o alias) somiglia a quello scritto dall'utente
+
+    Args:
+        query (str): Nome scritto dall'utente
+        limit (int): Numero massimo di candidati
+
+    Returns:
+        list: [(property_id, nome, somiglianza)] dal più simile
+    """
+    with _lock:
+        index = _current_index()
+        return [(property_id, index.name(property_id), similarity)
+                for property_id, similarity in index.search(query, limit)]
+
+def resolve_property_name(query, limit=5):
+    """
+    Risolve il nome di un immobile per il comando /prenota
+
+    Returns:
+        tuple: (property_id scelto o None, candidati come in find_property_candidates);
+            l'immobile è scelto se il nome è identico o se il primo candidato è
+            molto simile e nettamente migliore del secondo
+    """
+    candidates = find_property_candidates(query, limit)
+    if not candidates:
+        return None, []
+    best_similarity = candidates[0][2]
+    runner_up = candidates[1][2] if len(candidates) > 1 else 0
+    if best_similarity == 1.0 and runner_up < 1.0:
+        return candidates[0][0], candidates
+    if best_similarity >= AUTO_SELECT_SIMILARITY and best_similarity - runner_up >= AUTO_SELECT_MARGIN:
+        return candidates[0][0], candidates
+    return None, candidates
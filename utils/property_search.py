@@ -0,0 +1,237 @@
+"""
+Indice testuale invertito degli immobili per la ricerca per nome, tipo, località,
+indirizzo e servizi.
+
+Il testo di ogni immobile viene diviso in parole normalizzate (minuscole e senza
+accenti: "Città" e "citta" sono la stessa parola) e ogni parola rimanda
+all'insieme degli immobili che la contengono. Una ricerca cerca ogni parola
+della query come prefisso nel vocabolario ordinato (bisect) e interseca gli
+insiemi trovati partendo dal più piccolo: il costo dipende dal numero di
+risultati, non dal numero di immobili.
+
+L'indice del processo segue la vista in cache di utils/json_database.py: quando
+la vista cambia vengono reindicizzati solo gli immobili aggiunti, modificati o
+eliminati.
+"""
+import bisect
+import heapq
+import re
+import threading
+import unicodedata
+
+from utils import json_database
+
+# Campi dell'immobile (formato del file JSON) inclusi nella ricerca testuale
+TEXT_FIELDS = ("name", "type", "location", "address")
+
+# Ordinamenti dei risultati: etichetta -> (campo o "relevance", True se decrescente)
+SORT_MODES = {
+    "Rilevanza": ("relevance", True),
+    "Prezzo crescente": ("price", False),
+    "Prezzo decrescente": ("price", True),
+    "Capienza": ("max_guests", True),
+    "Più recenti": ("created_at", True),
+}
+
+_WORD_RE = re.compile(r"\w+")
+
+def fold_text(text):
+    """Testo in minuscolo e senza accenti ("Cortina d'Ampezzo" -> "cortina d'ampezzo")"""
+    decomposed = unicodedata.normalize("NFKD", str(text))
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+def tokenize(text):
+    """Parole normalizzate di un testo"""
+    return _WORD_RE.findall(fold_text(text))
+
+def property_tokens(prop):
+    """Insieme delle parole indicizzate di un immobile"""
+    parts = [prop.get(field) or "" for field in TEXT_FIELDS]
+    parts.extend(prop.get("services") or ())
+    return frozenset(token for part in parts for token in tokenize(part))
+
+class PropertyTextIndex:
+    """Indice invertito parola -> immobili, con ricerca per prefisso"""
+
+    def __init__(self):
+        self._postings = {}
+        self._vocabulary = []
+        self._documents = {}
+
+    def __len__(self):
+        return len(self._documents)
+
+    @classmethod
+    def from_properties(cls, properties):
+        """Costruisce l'indice da un dizionario {property_id: immobile} nel formato JSON"""
+        index = cls()
+        for property_id, prop in properties.items():
+            tokens = property_tokens(prop)
+            index._documents[property_id] = tokens
+            for token in tokens:
+                index._postings.setdefault(token, set()).add(property_id)
+        index._vocabulary = sorted(index._postings)
+        return index
+
+    def add(self, property_id, prop):
+        """Indicizza (o reindicizza) un immobile"""
+        tokens = property_tokens(prop)
+        old_tokens = self._documents.get(property_id, frozenset())
+        if tokens == old_tokens and property_id in self._documents:
+            return
+        for token in old_tokens - tokens:
+            self._discard(token, property_id)
+        for token in tokens - old_tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = set()
+                bisect.insort(self._vocabulary, token)
+            postings.add(property_id)
+        self._documents[property_id] = tokens
+
+    def remove(self, property_id):
+        """Toglie un immobile dall'indice, se presente"""
+        for token in self._documents.pop(property_id, ()):
+            self._discard(token, property_id)
+
+    def _discard(self, token, property_id):
+        postings = self._postings[token]
+        postings.discard(property_id)
+        if not postings:
+            del self._postings[token]
+            del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+
+    def _prefix_matches(self, prefix):
+        """Immobili con almeno una parola che inizia per prefix"""
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        # Tutte le parole con quel prefisso sono contigue nel vocabolario ordinato
+        stop = bisect.bisect_left(self._vocabulary, prefix + "\U0010ffff", start)
+        if stop - start == 1:
+            return self._postings[self._vocabulary[start]]
+        matches = set()
+        for token in self._vocabulary[start:stop]:
+            matches |= self._postings[token]
+        return matches
+
+    def score(self, property_id, words):
+        """Rilevanza di un immobile per le parole della query: 2 per parola intera, 1 per prefisso"""
+        tokens = self._documents.get(property_id, frozenset())
+        score = 0
+        for word in words:
+            if word in tokens:
+                score += 2
+            elif any(token.startswith(word) for token in tokens):
+                score += 1
+        return score
+
+    def search(self, query):
+        """
+        Immobili che contengono tutte le parole della query (anche solo come inizio di parola)
+
+        Args:
+            query (str): Testo cercato, es. "villa cort"
+
+        Returns:
+            set: ID degli immobili trovati, None se la query non contiene parole
+        """
+        words = tokenize(query)
+        if not words:
+            return None
+        postings = sorted((self._prefix_matches(word) for word in set(words)), key=len)
+        result = set(postings[0])
+        for matches in postings[1:]:
+            if not result:
+                break
+            result &= matches
+        return result
+
+# Indice del processo e vista di json_database da cui è stato costruito
+_index = None
+_view = None
+_lock = threading.Lock()
+
+def get_property_text_index():
+    """
+    Indice testuale allineato alla vista corrente del database degli immobili
+
+    Returns:
+        PropertyTextIndex: Indice da usare in sola lettura (per cercare da più
+            thread usare search_properties)
+    """
+    global _index, _view
+    view = json_database.get_database_view()
+    with _lock:
+        if _index is None:
+            _index = PropertyTextIndex.from_properties(view.get("properties", {}))
+        elif view is not _view:
+            _sync(_index, _view.get("properties", {}), view.get("properties", {}))
+        _view = view
+        return _index
+
+def _sync(index, old_properties, new_properties):
+    """Reindicizza solo gli immobili cambiati tra due versioni del database"""
+    for property_id in old_properties.keys() - new_properties.keys():
+        index.remove(property_id)
+    for property_id, prop in new_properties.items():
+        old = old_properties.get(property_id)
+        if old is None or any(old.get(field) != prop.get(field) for field in TEXT_FIELDS + ("services",)):
+            index.add(property_id, prop)
+
+def search_properties(query):
+    """
+    Cerca gli immobili per nome, tipo, località, indirizzo e servizi
+
+    Args:
+        query (str): Testo cercato (maiuscole e accenti vengono ignorati)
+
+    Returns:
+        set: ID degli immobili trovati, None se la query è vuota
+    """
+    index = get_property_text_index()
+    with _lock:
+        return index.search(query)
+
+def relevance_scores(query, property_ids):
+    """Rilevanza testuale degli immobili indicati: {property_id: punteggio}"""
+    words = set(tokenize(query))
+    index = get_property_text_index()
+    with _lock:
+        return {property_id: index.score(property_id, words) for property_id in property_ids}
+
+def _sort_value(prop, field):
+    value = prop.get(field)
+    if field == "created_at":
+        return value or ""
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def top_properties(property_ids, properties, sort_mode, limit, query=""):
+    """
+    Primi limit immobili secondo l'ordinamento scelto
+
+    Usa una selezione con heap (heapq.nsmallest/nlargest, O(n log limit)):
+    mostrando una pagina alla volta non serve ordinare tutti i risultati.
+
+    Args:
+        property_ids (iterable): ID dei risultati della ricerca
+        properties (dict): {property_id: immobile} nel formato del file JSON
+        sort_mode (str): Una delle chiavi di SORT_MODES
+        limit (int): Numero di immobili da restituire
+        query (str): Testo cercato, per l'ordinamento per rilevanza
+
+    Returns:
+        list: ID dei primi limit immobili, in ordine
+    """
+    field, descending = SORT_MODES.get(sort_mode, SORT_MODES["Rilevanza"])
+    property_ids = list(property_ids)
+    if field == "relevance":
+        scores = relevance_scores(query, property_ids) if tokenize(query) else {}
+        # Punteggio decrescente, a parità di punteggio in ordine di nome
+        return heapq.nsmallest(limit, property_ids, key=lambda property_id: (
+            -scores.get(property_id, 0), fold_text(properties[property_id].get("name", ""))
+        ))
+    key = lambda property_id: _sort_value(properties[property_id], field)
+    select = heapq.nlargest if descending else heapq.nsmallest
+    return select(limit, property_ids, key=key)
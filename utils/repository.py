@@ -0,0 +1,322 @@
+"""
+Accesso unico ai dati dell'applicazione (immobili, prenotazioni, utenti, fatture,
+pulizie e prezzi) con cache di lettura condivisa dalle pagine.
+
+Le pagine chiedono i dati a get_repository() invece di aprire i file o
+scegliere tra utils/json_database.py, utils/booking_database.py e
+utils/database.py. L'implementazione viene scelta da CIAOHOST_STORAGE_BACKEND:
+
+    json    immobili e prenotazioni letti dai file JSON (JsonRepository)
+    sqlite  immobili e prenotazioni letti da data/ciao_host.db (SqliteRepository)
+
+In entrambi i casi le scritture passano dai moduli esistenti (il file JSON
+resta la fonte dei dati, la copia SQLite viene allineata), utenti e prezzi
+vivono solo nel file degli immobili e nel calendario prezzi, fatture e
+pulizie solo nel database SQL.
+
+Ogni lettura è messa in cache per entità e restituita in sola lettura
+(MappingProxyType/tuple, vedi json_cache.freeze): la cache è valida finché non
+cambiano i file sorgente (anche per mano di altri processi) e viene svuotata
+da ogni scrittura fatta tramite il repository.
+"""
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from types import MappingProxyType
+
+from utils import booking_database, json_cache, json_database, price_calendar
+from utils.booking_records import BookingRecord
+
+# Entità gestite dal repository, ognuna con la propria cache
+ENTITIES = ("properties", "bookings", "users", "invoices", "cleaning")
+
+# Numero massimo di letture in cache (fatture e pulizie hanno una voce per filtro e pagina)
+REPOSITORY_CACHE_SIZE = int(os.environ.get("CIAOHOST_REPOSITORY_CACHE_SIZE", 256))
+
+class Repository(ABC):
+    """Interfaccia comune e cache di lettura; le sottoclassi indicano da dove leggere"""
+
+    def __init__(self, cache_size=REPOSITORY_CACHE_SIZE):
+        # Cache LRU: le voci usate meno di recente escono per prime
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._generations = dict.fromkeys(ENTITIES, 0)
+        self._lock = threading.Lock()
+
+    # --- Cache -------------------------------------------------------------
+
+    def _source_signature(self, entity):
+        """Firma delle sorgenti di un'entità: se cambia, la cache viene ricaricata"""
+        if entity == "users":
+            return json_database.get_database_version()
+        if entity in ("invoices", "cleaning"):
+            return _sql_signature()
+        return self._catalogue_signature(entity)
+
+    @abstractmethod
+    def _catalogue_signature(self, entity):
+        """Firma delle sorgenti di immobili ("properties") e prenotazioni ("bookings")"""
+
+    def _cached(self, entity, key, loader):
+        """Valore in cache per (entità, chiave), ricaricato se le sorgenti sono cambiate"""
+        with self._lock:
+            generation = self._generations[entity]
+        signature = (generation, self._source_signature(entity))
+        with self._lock:
+            entry = self._cache.get((entity, key))
+            if entry is not None and entry[0] == signature:
+                self._cache.move_to_end((entity, key))
+                return entry[1]
+
+        value = loader()
+        if not isinstance(value, (MappingProxyType, tuple)):
+            # Le viste di json_cache sono già in sola lettura: niente copia
+            value = json_cache.freeze(value)
+
+        with self._lock:
+            # Una scrittura durante il caricamento rende il valore già vecchio
+            if self._generations[entity] == generation:
+                self._cache[(entity, key)] = (signature, value)
+                self._cache.move_to_end((entity, key))
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+        return value
+
+    def invalidate(self, entity=None):
+        """Svuota la cache di un'entità (o di tutte se entity è None)"""
+        with self._lock:
+            for name in ENTITIES if entity is None else (entity,):
+                self._generations[name] += 1
+            self._cache = OrderedDict(
+                (cache_key, entry) for cache_key, entry in self._cache.items()
+                if entity is not None and cache_key[0] != entity
+            )
+
+    # --- Immobili ----------------------------------------------------------
+
+    @abstractmethod
+    def _load_properties(self):
+        """Immobili nel formato dell'applicazione, letti dalla sorgente"""
+
+    def list_properties(self):
+        """Tutti gli immobili nel formato dell'applicazione (tupla in sola lettura)"""
+        return self._cached("properties", "all", self._load_properties)
+
+    def properties_by_id(self):
+        """Immobili indicizzati per ID: {property_id: immobile}"""
+        return self._cached("properties", "by_id", lambda: {
+            prop["id"]: prop for prop in self.list_properties()
+        })
+
+    def get_property(self, property_id):
+        """Immobile con l'ID indicato, None se non esiste"""
+        return self.properties_by_id().get(property_id)
+
+    def add_property(self, property_data):
+        try:
+            return json_database.add_property(property_data)
+        finally:
+            self.invalidate("properties")
+
+    def update_property(self, property_id, property_data):
+        try:
+            return json_database.update_property(property_id, property_data)
+        finally:
+            self.invalidate("properties")
+
+    def delete_property(self, property_id):
+        try:
+            return json_database.delete_property(property_id)
+        finally:
+            self.invalidate("properties")
+
+    # --- Prenotazioni ------------------------------------------------------
+
+    @abstractmethod
+    def _load_bookings(self):
+        """Prenotazioni nel formato del file JSON, lette dalla sorgente"""
+
+    def list_bookings(self):
+        """Tutte le prenotazioni nel formato del file JSON: {booking_id: prenotazione}"""
+        return self._cached("bookings", "all", self._load_bookings)
+
+    def get_booking(self, booking_id):
+        return self.list_bookings().get(booking_id)
+
+    def bookings_for_property(self, property_id):
+        """Prenotazioni di un immobile: {booking_id: prenotazione}, vuoto se non ce ne sono"""
+        by_property = self._cached("bookings", "by_property", self._group_bookings)
+        return by_property.get(property_id, json_cache.freeze({}))
+
+    def _group_bookings(self):
+        groups = {}
+        for booking_id, booking in self.list_bookings().items():
+            groups.setdefault(booking.get("property_id"), {})[booking_id] = booking
+        return groups
+
+    def booking_records(self):
+        """Prenotazioni come BookingRecord con le date già convertite: {booking_id: record}"""
+        return self._cached("bookings", "records", lambda: MappingProxyType({
+            booking_id: BookingRecord.from_dict(booking_id, booking)
+            for booking_id, booking in self.list_bookings().items()
+        }))
+
+    def add_booking(self, booking_data):
+        """Salva una nuova prenotazione, restituisce il suo ID (None in caso di errore)"""
+        try:
+            return booking_database.add_booking(booking_data)
+        finally:
+            self.invalidate("bookings")
+
+    def update_booking(self, booking_id, changes):
+        """Modifica alcuni campi di una prenotazione, restituisce False se non esiste"""
+        try:
+            return booking_database.update_booking(booking_id, changes)
+        finally:
+            self.invalidate("bookings")
+
+    # --- Utenti ------------------------------------------------------------
+
+    def list_users(self):
+        """Utenti registrati: {email: password}"""
+        return self._cached("users", "all", lambda: json_database.get_database_view().get("users", {}))
+
+    # --- Fatture e pulizie (solo database SQL) -----------------------------
+
+    def list_invoices(self, start_date=None, end_date=None, statuses=None, search=None, limit=None, offset=0):
+        """Fatture con prenotazione e immobile, vedi database.get_invoices_with_details"""
+        from utils import database
+        key = (start_date, end_date, _freeze_filter(statuses), search, limit, offset)
+        return self._cached("invoices", key, lambda: database.get_invoices_with_details(
+            start_date, end_date, statuses, search, limit=limit, offset=offset
+        ))
+
+    def count_invoices(self, start_date=None, end_date=None, statuses=None, search=None):
+        from utils import database
+        key = ("count", start_date, end_date, _freeze_filter(statuses), search)
+        return self._cached("invoices", key, lambda: database.count_invoices_with_details(
+            start_date, end_date, statuses, search
+        ))
+
+    def create_invoice_for_booking(self, booking_id):
+        """Crea la fattura di una prenotazione, vedi database.create_invoice_for_booking"""
+        from utils import database
+        try:
+            return database.create_invoice_for_booking(booking_id)
+        finally:
+            self.invalidate("invoices")
+
+    def create_invoices_for_bookings(self, booking_ids):
+        """Crea le fatture di più prenotazioni in una sola transazione"""
+        from utils import database
+        try:
+            return database.create_invoices_for_bookings(booking_ids)
+        finally:
+            self.invalidate("invoices")
+
+    def list_cleaning_tasks(self, start_date=None, end_date=None, statuses=None):
+        """Pulizie con immobile e servizio, vedi database.get_cleaning_tasks"""
+        from utils import database
+        key = (start_date, end_date, _freeze_filter(statuses))
+        return self._cached("cleaning", key, lambda: database.get_cleaning_tasks(start_date, end_date, statuses))
+
+    def has_cleaning_tasks(self):
+        from utils import database
+        return self._cached("cleaning", "any", database.has_cleaning_tasks)
+
+    def schedule_cleaning(self, property_id, scheduled_date, booking_id=None, service_id=None):
+        """Programma una pulizia, vedi database.schedule_cleaning"""
+        from utils import database
+        try:
+            return database.schedule_cleaning(property_id, scheduled_date, booking_id, service_id)
+        finally:
+            self.invalidate("cleaning")
+
+    def schedule_cleanings_bulk(self, tasks):
+        """Programma più pulizie in una sola transazione, vedi database.schedule_cleanings_bulk"""
+        from utils import database
+        try:
+            return database.schedule_cleanings_bulk(tasks)
+        finally:
+            self.invalidate("cleaning")
+
+    # --- Prezzi (calendario mappato in memoria, già condiviso) -------------
+
+    def get_pricing(self, property_id):
+        """Calendario prezzi di un immobile come lista di {date, price, status}, None se vuoto"""
+        return price_calendar.load_pricing_data(property_id)
+
+    def save_pricing(self, property_id, pricing_data):
+        price_calendar.save_pricing_data(property_id, pricing_data)
+
+    def set_price_range(self, property_id, start, end, price, status=None):
+        """Imposta lo stesso prezzo per i giorni da start a end inclusi (vedi PriceCalendar.set_range)"""
+        price_calendar.get_price_calendar().set_range(property_id, start, end, price, status)
+
+class JsonRepository(Repository):
+    """Immobili e prenotazioni letti dai file JSON (viste in cache di json_cache)"""
+
+    def _catalogue_signature(self, entity):
+        if entity == "properties":
+            return json_database.get_database_version()
+        return booking_database.get_bookings_version()
+
+    def _load_properties(self):
+        return [
+            json_database.property_from_json(prop_id, prop_data)
+            for prop_id, prop_data in json_database.get_database_view().get("properties", {}).items()
+        ]
+
+    def _load_bookings(self):
+        return booking_database.get_bookings_view().get("bookings", {})
+
+    def booking_records(self):
+        # Stessa conversione (una per versione del file) usata dagli indici delle prenotazioni
+        return booking_database.get_booking_records()
+
+class SqliteRepository(Repository):
+    """Immobili e prenotazioni letti dal database SQL, allineato ad ogni scrittura"""
+
+    def _catalogue_signature(self, entity):
+        return _sql_signature()
+
+    def _load_properties(self):
+        from utils import database
+        return database.get_all_properties()
+
+    def _load_bookings(self):
+        return booking_database.query_bookings()
+
+def _freeze_filter(values):
+    return tuple(sorted(values)) if values else None
+
+def _sql_signature():
+    """Firma del file SQLite (e del suo WAL), None per database in memoria o non SQLite"""
+    from utils.database import engine
+    path = engine.url.database if engine.url.get_backend_name() == "sqlite" else None
+    if not path or path == ":memory:":
+        return None
+    return (json_cache.file_signature(path), json_cache.file_signature(path + "-wal"))
+
+REPOSITORY_BACKENDS = {
+    "json": JsonRepository,
+    "sqlite": SqliteRepository,
+}
+
+_repository = None
+_repository_lock = threading.Lock()
+
+def get_repository():
+    """
+    Repository del processo, condiviso da tutte le sessioni
+
+    Returns:
+        Repository: Implementazione scelta da CIAOHOST_STORAGE_BACKEND (default "json")
+    """
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            backend = os.environ.get("CIAOHOST_STORAGE_BACKEND", "json")
+            _repository = REPOSITORY_BACKENDS.get(backend, JsonRepository)()
+        return _repository
@@ -0,0 +1,133 @@
+"""
+Cache dei risultati della ricerca immobili, condivisa dalle sessioni del processo.
+
+Streamlit riesegue la pagina ad ogni interazione, anche quando cambia un
+widget che non tocca la ricerca (apertura dei dettagli, pulsanti delle card):
+search_property_ids() restituisce la lista di ID già calcolata per gli stessi
+filtri invece di rivalutarli sugli indici.
+
+La chiave è la tupla normalizzata dei filtri (testo diviso in parole come
+nella ricerca testuale, servizi ordinati, "tutti" come None) più la versione
+delle sole sorgenti da cui il risultato dipende: il database degli immobili
+sempre, quello delle prenotazioni solo se sono indicate le date. Una modifica
+a un immobile o a una prenotazione cambia la versione e rende irraggiungibili
+le voci interessate; le voci vecchie escono dalla cache LRU limitata a
+SEARCH_CACHE_SIZE ricerche.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from utils import booking_database, json_database
+from utils.property_search import search_properties, tokenize
+
+# Numero massimo di ricerche diverse tenute in cache
+SEARCH_CACHE_SIZE = int(os.environ.get("CIAOHOST_SEARCH_CACHE_SIZE", 128))
+
+class SearchResultCache:
+    """Cache LRU limitata: chiave -> risultato"""
+
+    def __init__(self, maxsize=SEARCH_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, compute):
+        """
+        Risultato in cache per la chiave, calcolato con compute() se manca
+
+        Il calcolo avviene fuori dal lock: due sessioni con la stessa ricerca
+        possono calcolarla entrambe, ma nessuna attende le ricerche delle altre.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+_cache = SearchResultCache()
+
+def search_key(text="", property_type=None, location=None, services=(), price_range=None,
+               check_in=None, check_out=None):
+    """Tupla normalizzata dei filtri: filtri equivalenti danno la stessa chiave"""
+    dates = (check_in, check_out) if check_in and check_out and check_out > check_in else None
+    return (
+        " ".join(tokenize(text or "")),
+        property_type,
+        location,
+        tuple(sorted(set(services or ()))),
+        tuple(price_range) if price_range is not None else None,
+        dates,
+    )
+
+def catalogue_version(key):
+    """Versione delle sorgenti da cui dipende il risultato di una ricerca"""
+    if key[5] is None:
+        return (json_database.get_database_version(),)
+    return (json_database.get_database_version(), booking_database.get_bookings_version())
+
+def _compute(key):
+    from utils.availability_matrix import find_free_properties
+    from utils.property_facets import filter_property_ids
+
+    text, property_type, location, services, price_range, dates = key
+    free_property_ids = None
+    if dates is not None:
+        property_ids = list(json_database.get_database_view().get("properties", {}))
+        free_property_ids = set(find_free_properties(property_ids, *dates))
+
+    # Intersezione degli insiemi degli indici, partendo dal più piccolo
+    candidate_sets = [
+        ids for ids in (
+            search_properties(text),
+            filter_property_ids(property_type, location, services, price_range),
+            free_property_ids,
+        )
+        if ids is not None
+    ]
+    if not candidate_sets:
+        return None
+    candidate_sets.sort(key=len)
+    matching_ids = set(candidate_sets[0])
+    for ids in candidate_sets[1:]:
+        matching_ids &= ids
+    return tuple(sorted(matching_ids))
+
+def search_property_ids(text="", property_type=None, location=None, services=(), price_range=None,
+                        check_in=None, check_out=None):
+    """
+    Immobili che soddisfano i filtri della ricerca, dalla cache se già calcolati
+
+    Args:
+        text (str): Testo cercato (vedi property_search.search_properties)
+        property_type (str, optional): Tipo richiesto
+        location (str, optional): Località richiesta
+        services (iterable): Servizi che l'immobile deve avere tutti
+        price_range (tuple, optional): (prezzo minimo, prezzo massimo) inclusi
+        check_in (date, optional): Data di check-in (filtro attivo solo con check_out)
+        check_out (date, optional): Data di check-out
+
+    Returns:
+        tuple: ID degli immobili trovati (in sola lettura), None se non è attivo nessun filtro
+    """
+    key = search_key(text, property_type, location, services, price_range, check_in, check_out)
+    return _cache.get((key, catalogue_version(key)), lambda: _compute(key))
@@ -0,0 +1,138 @@
+"""
+Coda di scrittura in background (write-behind) per i salvataggi avviati dall'interfaccia.
+
+I gestori di Streamlit accodano la scrittura e proseguono: un thread dedicato
+la esegue (fsync compreso) fuori dal ciclo della pagina. Le scritture dello
+stesso documento ancora in coda vengono fuse: resta solo l'ultima, e tutti i
+chiamanti ricevono la stessa conferma. La coda è limitata
+(WRITE_BEHIND_QUEUE_SIZE): se il disco non tiene il passo, submit() attende
+invece di accumulare memoria. All'uscita del processo la coda viene svuotata.
+
+La coda è pensata per i salvataggi che l'utente non attende (impostazioni,
+stagioni dei prezzi, ...): le operazioni che devono essere su disco prima di
+rispondere (es. la conferma di una prenotazione) scrivono direttamente e ne
+controllano l'esito. Chi vuole comunque sapere quando una scrittura accodata
+è terminata può attendere la conferma con un timeout:
+
+    ack = submit(PRICING_SEASONS_FILE, lambda: atomic_write_json(PRICING_SEASONS_FILE, seasons))
+    if ack.wait(timeout=10) and ack.error is None:
+        ...
+"""
+import atexit
+import os
+import queue
+import threading
+
+# Numero massimo di documenti diversi in attesa di scrittura
+WRITE_BEHIND_QUEUE_SIZE = int(os.environ.get("CIAOHOST_WRITE_BEHIND_QUEUE_SIZE", 256))
+
+class WriteAck:
+    """Conferma di una scrittura accodata"""
+
+    def __init__(self):
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Attende che la scrittura sia stata eseguita
+
+        Returns:
+            bool: True se la scrittura è terminata (con successo o con errore,
+                vedi error), False se è scaduto il timeout
+        """
+        return self._done.wait(timeout)
+
+    def _finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self._done.set()
+
+class WriteBehindQueue:
+    """Thread di scrittura con coda limitata e fusione delle scritture sullo stesso documento"""
+
+    def __init__(self, maxsize=WRITE_BEHIND_QUEUE_SIZE):
+        self._keys = queue.Queue(maxsize)
+        # Scrittura più recente e conferma per ogni documento in coda
+        self._pending = {}
+        # Conferma della scrittura in corso nel thread
+        self._writing = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, key, write):
+        """
+        Accoda una scrittura
+
+        Args:
+            key (str): Documento da scrivere (es. il percorso del file); una
+                scrittura dello stesso documento ancora in coda viene sostituita
+            write (callable): Funzione senza argomenti che esegue la scrittura;
+                il suo valore di ritorno finisce in WriteAck.result
+
+        Returns:
+            WriteAck: Conferma della scrittura
+        """
+        with self._lock:
+            self._start()
+            pending = self._pending.get(key)
+            if pending is not None:
+                # Il documento è ancora in coda: basta sostituire la scrittura
+                self._pending[key] = (write, pending[1])
+                return pending[1]
+            ack = WriteAck()
+            self._pending[key] = (write, ack)
+        # Fuori dal lock: con la coda piena si attende il thread di scrittura
+        self._keys.put(key)
+        return ack
+
+    def flush(self, timeout=None):
+        """
+        Attende che tutte le scritture accodate finora siano eseguite
+
+        Returns:
+            bool: True se la coda è stata svuotata entro il timeout
+        """
+        with self._lock:
+            acks = [ack for _, ack in self._pending.values()]
+            if self._writing is not None:
+                acks.append(self._writing)
+        return all(ack.wait(timeout) for ack in acks)
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="ciaohost-write-behind", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            key = self._keys.get()
+            with self._lock:
+                write, ack = self._pending.pop(key)
+                self._writing = ack
+            try:
+                ack._finish(result=write())
+            except Exception as e:
+                print(f"Errore durante la scrittura in background di {key}: {e}")
+                ack._finish(error=e)
+            finally:
+                with self._lock:
+                    self._writing = None
+                self._keys.task_done()
+
+_queue = WriteBehindQueue()
+
+def submit(key, write):
+    """Accoda una scrittura sulla coda del processo (vedi WriteBehindQueue.submit)"""
+    return _queue.submit(key, write)
+
+def flush(timeout=None):
+    """Attende le scritture accodate sulla coda del processo"""
+    return _queue.flush(timeout)
+
+# Nessuna scrittura accodata va persa alla chiusura del processo
+atexit.register(flush)